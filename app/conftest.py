@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The app runs with PYTHONPATH=/app (see Dockerfile), so modules import each
+# other as `garmin.*`. Mirror that when running the tests from the repo root.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
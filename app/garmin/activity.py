@@ -0,0 +1,110 @@
+import sys
+from array import array
+
+import orjson
+
+import garmin.utils as utils
+
+# Athlete zone settings can define up to 10 zones per system
+ZONE_LABELS = tuple(f'Z{i}' for i in range(1, 11))
+
+# Per-activity zone dicts are stored as array('d') vectors, in label order
+ZONE_FIELDS = {
+    'zone_times': 'zone_percentages',
+    'pace_zone_times': 'pace_zone_percentages',
+    'hr_zone_times': 'hr_zone_percentages',
+}
+
+SCALAR_FIELDS = (
+    'avg_power', 'normalized_power', 'intensity_factor', 'tss', 'hr_drift',
+    'avg_heartrate', 'max_heartrate', 'avg_velocity', 'max_velocity', 'avg_cadence',
+    'total_elevation_gain', 'total_elevation_loss', 'training_load', 'distance', 'elevation_gain',
+    'total_time',
+)
+
+TEXT_FIELDS = ('id', 'type', 'date', 'estimate_method', 'status', 'error')
+
+# Detected work intervals are stored as one flat array('d'), INTERVAL_FIELDS per
+# interval, with NaN for values the activity has no stream for
+INTERVAL_FIELDS = ('start', 'end', 'avg_power', 'max_power', 'avg_heartrate', 'avg_velocity')
+
+
+class ActivitySummary:
+    """Compact record of one parsed activity.
+
+    Replaces the free-form metrics dict returned by Intervals.compute_*.
+    Fields the parser didn't produce are left unset, so to_dict() gives back
+    exactly the keys it was built from. Percentages aren't stored; they are
+    derived from the zone/segment times and total_time when serialized.
+    """
+
+    __slots__ = SCALAR_FIELDS + TEXT_FIELDS + tuple(ZONE_FIELDS) + ('segment_names', 'segment_times', 'intervals')
+
+    @classmethod
+    def from_metrics(cls, metrics):
+        summary = cls()
+        for field in SCALAR_FIELDS:
+            if field in metrics:
+                value = metrics[field]
+                setattr(summary, field, None if value is None else float(value))
+        for field in TEXT_FIELDS:
+            if field in metrics:
+                value = metrics[field]
+                setattr(summary, field, sys.intern(value) if isinstance(value, str) else value)
+        for field in ZONE_FIELDS:
+            if field in metrics:
+                zones = metrics[field]
+                setattr(summary, field, array('d', (float(zones[label]) for label in ZONE_LABELS if label in zones)))
+        if 'segment_times' in metrics:
+            segments = metrics['segment_times']
+            summary.segment_names = tuple(sys.intern(name) for name in segments)
+            summary.segment_times = array('d', (float(v) for v in segments.values()))
+        if 'intervals' in metrics:
+            summary.intervals = array('d', (
+                float('nan') if interval.get(field) is None else float(interval[field])
+                for interval in metrics['intervals'] for field in INTERVAL_FIELDS))
+        return summary
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def percentages(self, times):
+        total_time = self.get('total_time')
+        return [(v / total_time * 100.0 if total_time else 0.0) for v in times]
+
+    def to_dict(self):
+        metrics = {}
+        for field in SCALAR_FIELDS + TEXT_FIELDS:
+            if hasattr(self, field):
+                metrics[field] = getattr(self, field)
+        for field, percentage_field in ZONE_FIELDS.items():
+            if hasattr(self, field):
+                zones = getattr(self, field)
+                labels = ZONE_LABELS[:len(zones)]
+                metrics[field] = dict(zip(labels, zones))
+                metrics[percentage_field] = dict(zip(labels, self.percentages(zones)))
+        if hasattr(self, 'segment_times'):
+            metrics['segment_times'] = dict(zip(self.segment_names, self.segment_times))
+            metrics['segment_percentages'] = dict(zip(self.segment_names, self.percentages(self.segment_times)))
+        if hasattr(self, 'intervals'):
+            width = len(INTERVAL_FIELDS)
+            metrics['intervals'] = [
+                {field: value for field, value in zip(INTERVAL_FIELDS, self.intervals[i:i + width]) if value == value}
+                for i in range(0, len(self.intervals), width)]
+        return metrics
+
+
+def default(o):
+    if isinstance(o, ActivitySummary):
+        return o.to_dict()
+    if isinstance(o, array):
+        return o.tolist()
+    return utils.convert(o)
+
+
+def dumps(obj, indent=False):
+    """Serialize activity summaries (or anything holding them) to JSON bytes."""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=default, option=option)
@@ -0,0 +1,156 @@
+import datetime
+import os
+import threading
+
+from prometheus_client.core import GaugeMetricFamily
+
+from garmin.activity import ZONE_LABELS
+
+# Per-activity fields exported for the latest activities, as metric name suffix -> summary field
+SUMMARY_FIELDS = {
+    "Tss": "tss",
+    "TrainingLoad": "training_load",
+    "NormalizedPower": "normalized_power",
+    "AvgPower": "avg_power",
+    "IntensityFactor": "intensity_factor",
+    "AvgHeartrate": "avg_heartrate",
+    "MaxHeartrate": "max_heartrate",
+    "HrDrift": "hr_drift",
+    "Distance": "distance",
+    "TotalTime": "total_time",
+}
+
+# Zone systems in the weekly time-in-zone metric
+ZONE_SYSTEMS = {
+    "power": "zone_times",
+    "pace": "pace_zone_times",
+    "hr": "hr_zone_times",
+}
+
+
+def week_start(date):
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def activity_date(summary):
+    date = summary.get("date")
+    if not date:
+        return None
+    try:
+        return datetime.datetime.strptime(date[:10], "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def activity_tss(summary):
+    tss = summary.get("tss")
+    return tss if tss is not None else summary.get("training_load")
+
+
+class ActivityCollector:
+    """Prometheus collector for parsed activity summaries.
+
+    Series are labelled by position rather than by activity: `slot` 0 is the
+    newest activity and `week` 0 the current week, so the series count per
+    athlete is fixed by `latest` and `weeks` however many activities are
+    stored. Activities older than `weeks` weeks age out of both.
+
+    Samples are built by refresh(), which the background sync calls after
+    storing new activities. collect() only yields the last snapshot.
+    """
+
+    def __init__(self, latest=None, weeks=None):
+        self.latest = latest or int(os.environ.get("ACTIVITY_METRICS_LATEST", 10))
+        self.weeks = weeks or int(os.environ.get("ACTIVITY_METRICS_WEEKS", 8))
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def window_start(self, today=None):
+        today = today or datetime.date.today()
+        return week_start(today) - datetime.timedelta(weeks=self.weeks - 1)
+
+    def refresh(self, athlete, summaries, today=None):
+        """Rebuild the samples for one athlete from their stored summaries."""
+        today = today or datetime.date.today()
+        start = self.window_start(today)
+        current_week = week_start(today)
+        dated = []
+        for summary in summaries:
+            date = activity_date(summary)
+            if date is not None and start <= date <= today:
+                dated.append((date, summary))
+        dated.sort(key=lambda item: item[0], reverse=True)
+
+        latest = []
+        for slot, (date, summary) in enumerate(dated[:self.latest]):
+            labels = {"slot": str(slot), "id": str(summary.get("id") or ""),
+                      "type": summary.get("type") or "", "date": date.isoformat()}
+            values = {suffix: summary.get(field) for suffix, field in SUMMARY_FIELDS.items()}
+            latest.append((labels, values))
+
+        weekly = {}
+        for date, summary in dated:
+            week = (current_week - week_start(date)).days // 7
+            totals = weekly.setdefault(week, {"tss": 0.0, "time": 0.0, "count": 0, "zones": {}})
+            totals["count"] += 1
+            totals["tss"] += activity_tss(summary) or 0.0
+            totals["time"] += summary.get("total_time") or 0.0
+            for system, field in ZONE_SYSTEMS.items():
+                zone_times = summary.get(field)
+                if zone_times is None:
+                    continue
+                for label, seconds in zip(ZONE_LABELS, zone_times):
+                    key = (system, label)
+                    totals["zones"][key] = totals["zones"].get(key, 0.0) + seconds
+
+        with self.lock:
+            self.snapshots[athlete] = {"latest": latest, "weekly": weekly, "start": start}
+
+    def clear(self, athlete=None):
+        with self.lock:
+            if athlete is None:
+                self.snapshots.clear()
+            else:
+                self.snapshots.pop(athlete, None)
+
+    def collect(self):
+        with self.lock:
+            snapshots = dict(self.snapshots)
+
+        info = GaugeMetricFamily("activityInfo", "Latest parsed activities by slot, 0 is the newest",
+                                 labels=["athlete", "slot", "id", "type", "date"])
+        fields = {suffix: GaugeMetricFamily(f"activity{suffix}", f"Activity {field} by slot, 0 is the newest",
+                                            labels=["athlete", "slot"])
+                  for suffix, field in SUMMARY_FIELDS.items()}
+        weekly_tss = GaugeMetricFamily("activityWeeklyTss", "Activity TSS per week, 0 is the current week",
+                                       labels=["athlete", "week", "week_start"])
+        weekly_time = GaugeMetricFamily("activityWeeklySeconds", "Activity time in seconds per week",
+                                        labels=["athlete", "week", "week_start"])
+        weekly_count = GaugeMetricFamily("activityWeeklyCount", "Number of activities per week",
+                                         labels=["athlete", "week", "week_start"])
+        weekly_zones = GaugeMetricFamily("activityWeeklyZoneSeconds", "Time in zone in seconds per week",
+                                         labels=["athlete", "week", "week_start", "system", "zone"])
+
+        for athlete, snapshot in sorted(snapshots.items()):
+            for labels, values in snapshot["latest"]:
+                info.add_metric([athlete, labels["slot"], labels["id"], labels["type"], labels["date"]], 1)
+                for suffix, value in values.items():
+                    if value is not None:
+                        fields[suffix].add_metric([athlete, labels["slot"]], value)
+            for week in range(self.weeks):
+                # Every week in the window is exported, so weeks without activities read 0
+                totals = snapshot["weekly"].get(week, {"tss": 0.0, "time": 0.0, "count": 0, "zones": {}})
+                start = (snapshot["start"] + datetime.timedelta(weeks=self.weeks - 1 - week)).isoformat()
+                labels = [athlete, str(week), start]
+                weekly_tss.add_metric(labels, totals["tss"])
+                weekly_time.add_metric(labels, totals["time"])
+                weekly_count.add_metric(labels, totals["count"])
+                for (system, zone), seconds in sorted(totals["zones"].items()):
+                    weekly_zones.add_metric(labels + [system, zone], seconds)
+
+        yield info
+        yield from fields.values()
+        yield weekly_tss
+        yield weekly_time
+        yield weekly_count
+        yield weekly_zones
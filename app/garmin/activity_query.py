@@ -0,0 +1,102 @@
+import datetime
+import re
+
+import garmin.utils as utils
+from garmin.activity_metrics import week_start
+from garmin.store import INDEXED_FIELDS
+
+CONDITION = re.compile(r"^\s*([a-z_]+)\s*(>=|<=|!=|=|<|>)\s*(-?[0-9]+(?:\.[0-9]+)?)\s*$")
+GROUPS = ("week", "month")
+# Fields answered from the index columns, anything else needs the stored summary decoding
+ROW_FIELDS = ("activity_id", "date", "type") + INDEXED_FIELDS
+DEFAULT_SUMS = ("tss", "total_time")
+
+
+def split(value):
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
+
+def parse_conditions(where):
+    """`tss>80,total_time>=3600` as [(field, op, value)]."""
+    conditions = []
+    for part in split(where):
+        match = CONDITION.match(part)
+        if match is None:
+            raise ValueError(f"Can't parse condition {part}, expected e.g. tss>80")
+        field, op, value = match.groups()
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Can't filter on {field}, expected one of {', '.join(INDEXED_FIELDS)}")
+        conditions.append((field, op, float(value)))
+    return conditions
+
+
+def field_value(row, field):
+    """A row column, or a dotted path into the stored summary such as zone_times.Z2."""
+    if field in ROW_FIELDS:
+        return row[field]
+    value = row["data"]
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def needs_data(fields):
+    return any(field not in ROW_FIELDS for field in fields)
+
+
+def group_key(date, group):
+    if group == "month":
+        return date[:7]
+    return week_start(datetime.date.fromisoformat(date[:10])).isoformat()
+
+
+def aggregate(rows, group, sums):
+    """Count and per-field sums for each week (keyed by its Monday) or month, in date order."""
+    groups = {}
+    for row in rows:
+        if not row["date"]:
+            continue
+        key = group_key(row["date"], group)
+        totals = groups.get(key)
+        if totals is None:
+            totals = {"period": key, "count": 0}
+            totals.update((field, 0.0) for field in sums)
+            groups[key] = totals
+        totals["count"] += 1
+        for field in sums:
+            value = field_value(row, field)
+            if isinstance(value, (int, float)):
+                totals[field] += value
+    return list(groups.values())
+
+
+def run_query(store, args):
+    """Answer an /intervals/query request from the store's indexes. Raises ValueError on bad arguments."""
+    types = split(args.get("type"))
+    start = args.get("from")
+    end = args.get("to")
+    if args.get("weeks"):
+        start = utils.get_date_from_weeks(int(args.get("weeks")))
+    for date in (start, end):
+        if date is not None:
+            datetime.date.fromisoformat(date)
+    conditions = parse_conditions(args.get("where"))
+    fields = split(args.get("fields"))
+    group = args.get("group")
+    descending = args.get("order") == "desc"
+
+    if group:
+        if group not in GROUPS:
+            raise ValueError(f"Unknown group {group}, expected one of {', '.join(GROUPS)}")
+        sums = split(args.get("sum")) or list(DEFAULT_SUMS)
+        rows = store.query(start, end, types, conditions, with_data=needs_data(sums), descending=descending)
+        return {"group": group, "groups": aggregate(rows, group, sums)}
+
+    limit = int(args.get("limit")) if args.get("limit") else None
+    rows = store.query(start, end, types, conditions, with_data=not fields or needs_data(fields),
+                       descending=descending, limit=limit)
+    if fields:
+        activities = [{field: field_value(row, field) for field in fields} for row in rows]
+    else:
+        activities = [row["data"] for row in rows]
+    return {"count": len(activities), "activities": activities}
@@ -0,0 +1,167 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from prometheus_client import make_asgi_app
+
+import garmin.utils as utils
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI http scope, per PEP 3333."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name == "CONTENT_LENGTH":
+            continue
+        else:
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body is already buffered, so its length is known even for chunked uploads
+    environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+class NativeRequest:
+    """What a native route handler sees of the request: its path and query args."""
+
+    def __init__(self, scope):
+        self.path = scope["path"]
+        self.pairs = parse_qsl(scope.get("query_string", b"").decode("latin1"), keep_blank_values=True)
+
+    def get(self, name, default=None):
+        # First value wins, as with Flask's request.args
+        return next((value for key, value in self.pairs if key == name), default)
+
+
+def response_parts(result):
+    """(status, headers, body) from a Flask-style (body, headers) or (body, status, headers) tuple."""
+    if len(result) == 2:
+        body, headers = result
+        status = 200
+    else:
+        body, status, headers = result
+    if isinstance(body, str):
+        body = body.encode("utf8")
+    return status, list(headers.items()), body
+
+
+class WsgiOffload:
+    """Runs a WSGI app on its own bounded thread pool from an ASGI server.
+
+    Blocking handlers only tie up pool threads, never the event loop, so
+    anything served natively on the loop keeps answering while they run.
+    """
+
+    def __init__(self, wsgi_app, workers):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        environ = build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, content = await loop.run_in_executor(self.executor, self.run, environ)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]})
+        await send({"type": "http.response.body", "body": content})
+
+    def run(self, environ):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return response["status"], response["headers"], content
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ScraperAsgi:
+    """ASGI entry point: /metrics and the native `routes` on the event loop, every other route offloaded to WSGI threads.
+
+    `routes` maps a path to a coroutine taking a NativeRequest for GETs. It
+    returns a Flask-style response tuple, or None to hand the request to the
+    WSGI app after all (e.g. for work that runs as a background job).
+    """
+
+    def __init__(self, wsgi_app, workers=None, routes=None):
+        workers = workers or int(os.environ.get("ASGI_WORKERS", 8))
+        self.metrics_app = make_asgi_app()
+        self.wsgi = WsgiOffload(wsgi_app, workers)
+        self.routes = routes or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == "/metrics" or scope["path"].startswith("/metrics/"):
+                await self.metrics_app(scope, receive, send)
+            elif not await self.native(scope, send):
+                await self.wsgi(scope, receive, send)
+
+    async def native(self, scope, send):
+        handler = self.routes.get(scope["path"])
+        if handler is None or scope["method"] != "GET":
+            return False
+        result = await handler(NativeRequest(scope))
+        if result is None:
+            return False
+        status, headers, body = response_parts(result)
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]})
+        await send({"type": "http.response.body", "body": body})
+        return True
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.wsgi.shutdown()
+                await utils.close_async_clients()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def serve(wsgi_app, host, port, routes=None):
+    import uvicorn
+    uvicorn.run(ScraperAsgi(wsgi_app, routes=routes), host=host, port=port)
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import garth
+
+
+class Athlete:
+    """Credentials and storage for one person being scraped.
+
+    The default athlete comes from the GARMIN_USER/GARMIN_PASS/INTERVALS_API_KEY
+    environment variables and uses garth's global client. Athletes loaded from
+    ATHLETES_CONFIG each get their own garth client and token directory.
+    """
+
+    def __init__(self, name, garmin_user=None, garmin_pass=None, garth_folder=None,
+                 intervals_api_key=None, intervals_base=None, slack_user_id=None,
+                 min_interval=0.0, client=None):
+        self.name = name
+        self.garmin_user = garmin_user
+        self.garmin_pass = garmin_pass
+        self.garth_folder = garth_folder
+        self.intervals_api_key = intervals_api_key
+        self.intervals_base = intervals_base
+        self.slack_user_id = slack_user_id
+        self.client = client
+        self.limiter = AthleteLimiter(min_interval)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            name=os.environ.get("ATHLETE_NAME", "default"),
+            garmin_user=os.environ.get("GARMIN_USER"),
+            garmin_pass=os.environ.get("GARMIN_PASS"),
+            garth_folder=os.environ.get("GARTH_FOLDER"),
+            intervals_api_key=os.environ.get("INTERVALS_API_KEY"),
+            intervals_base=os.environ.get("INTERVALS_BASE_URL"),
+            slack_user_id=os.environ.get("SLACK_USER_ID"),
+        )
+
+    @classmethod
+    def from_config(cls, entry, base_folder=None):
+        def value(key):
+            # Secrets can be given inline or as the name of an env var, e.g. "garmin_pass_env"
+            if entry.get(key) is not None:
+                return entry[key]
+            env_name = entry.get(f"{key}_env")
+            return os.environ.get(env_name) if env_name else None
+
+        name = entry["name"]
+        garth_folder = entry.get("garth_folder")
+        if garth_folder is None and base_folder:
+            garth_folder = os.path.join(base_folder, name)
+        return cls(
+            name=name,
+            garmin_user=value("garmin_user"),
+            garmin_pass=value("garmin_pass"),
+            garth_folder=garth_folder,
+            intervals_api_key=value("intervals_api_key"),
+            intervals_base=entry.get("intervals_base", os.environ.get("INTERVALS_BASE_URL")),
+            slack_user_id=entry.get("slack_user_id"),
+            min_interval=float(entry.get("min_interval", 0.0)),
+            client=garth.Client(),
+        )
+
+
+class AthleteLimiter:
+    """Runs one job at a time per athlete, at most once every `min_interval` seconds."""
+
+    def __init__(self, min_interval=0.0):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.last_run = None
+
+    def __enter__(self):
+        self.lock.acquire()
+        if self.last_run is not None:
+            wait = self.min_interval - (time.monotonic() - self.last_run)
+            if wait > 0:
+                time.sleep(wait)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.last_run = time.monotonic()
+        self.lock.release()
+        return False
+
+
+class AthletePool:
+    """Shared worker pool that runs per-athlete jobs concurrently."""
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("ATHLETE_WORKERS", 4))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="athlete")
+
+    def submit(self, athlete, fn, *args, **kwargs):
+        def run():
+            with athlete.limiter:
+                return fn(athlete, *args, **kwargs)
+        return self.executor.submit(run)
+
+    def run_all(self, athletes, fn, *args, **kwargs):
+        """Run fn(athlete, ...) for every athlete, returning {name: result}.
+
+        A failure for one athlete is reported in its entry and doesn't stop the others.
+        """
+        futures = {athlete.name: self.submit(athlete, fn, *args, **kwargs) for athlete in athletes}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"Caught exception {e} for athlete {name}")
+                results[name] = {"error": str(e)}
+        return results
+
+
+def load_athletes(path, base_folder=None):
+    with open(path) as f:
+        config = json.load(f)
+    entries = config["athletes"] if isinstance(config, dict) else config
+    return [Athlete.from_config(entry, base_folder) for entry in entries]
+
+
+_athletes = None
+_pool = None
+_lock = threading.Lock()
+
+
+def is_multi_athlete():
+    return bool(os.environ.get("ATHLETES_CONFIG"))
+
+
+def get_athletes():
+    global _athletes
+    with _lock:
+        if _athletes is None:
+            config_path = os.environ.get("ATHLETES_CONFIG")
+            if config_path:
+                _athletes = load_athletes(config_path, os.environ.get("GARTH_FOLDER"))
+            else:
+                _athletes = [Athlete.from_env()]
+        return _athletes
+
+
+def get_athlete(name=None):
+    athletes = get_athletes()
+    if name is None:
+        return athletes[0]
+    for athlete in athletes:
+        if athlete.name == name:
+            return athlete
+    raise KeyError(f"Unknown athlete {name}")
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = AthletePool()
+        return _pool
@@ -0,0 +1,117 @@
+import datetime
+import os
+
+import requests
+
+from garmin.tsdb import TSDB_METRICS, label_value
+
+
+def day_start(date):
+    # Same local-midnight convention as TsdbGenerator.get_timestamp_from_date
+    return datetime.datetime.strptime(date, "%Y-%m-%d").timestamp()
+
+
+class PrometheusCoverage:
+    """Finds the days a Prometheus-compatible query API already has samples for.
+
+    Each metric is counted over the first half of every day, so a day only
+    counts once it has samples of its own, not its neighbours' midnight ones.
+    Pass `athlete` to only count that athlete's series.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def selector(self, metric, athlete=None):
+        if athlete is None:
+            return metric
+        return f'{metric}{{athlete="{label_value(athlete)}"}}'
+
+    def covered(self, dates, metrics, athlete=None):
+        """Return {date: {metric, ...}} for the (date, metric) pairs with samples.
+
+        Steps are a fixed day apart, so across a DST change they land an hour
+        either side of local noon; each sample is mapped back to its local date.
+        """
+        if not dates:
+            return {}
+        wanted = set(dates)
+        starts = [int(day_start(date) + 12 * 3600) for date in dates]
+        covered = {}
+        for metric in metrics:
+            params = {
+                "query": f"count_over_time({self.selector(metric, athlete)}[12h])",
+                "start": min(starts),
+                "end": max(starts) + 3600,
+                "step": "1d",
+            }
+            try:
+                res = requests.get(f"{self.base_url}/api/v1/query_range", params=params, timeout=self.timeout)
+                res.raise_for_status()
+                result = res.json()["data"]["result"]
+            except Exception as e:
+                print(f"Caught exception {e} querying Prometheus coverage for {metric}")
+                continue
+            for series in result:
+                for timestamp, value in series.get("values", []):
+                    date = datetime.datetime.fromtimestamp(float(timestamp)).strftime("%Y-%m-%d")
+                    if date in wanted and float(value) > 0:
+                        covered.setdefault(date, set()).add(metric)
+        return covered
+
+
+class BackfillPlanner:
+    """Works out which (date, metric) pairs still need backfill blocks.
+
+    Anything in the manifest, or reported by `coverage`, is skipped. Pairs
+    found in Prometheus are added to the manifest so it's only asked once.
+    The manifest is per athlete, so `athlete` scopes the Prometheus lookup
+    to the same one.
+    """
+
+    def __init__(self, manifest, coverage=None, metrics=None, athlete=None):
+        self.manifest = manifest
+        self.coverage = coverage
+        self.metrics = metrics or [name for name, _ in TSDB_METRICS]
+        self.athlete = athlete
+
+    def plan(self, dates):
+        """Return {date: [metric, ...]} of what's missing, in date order."""
+        if not dates:
+            return {}
+        exported = self.manifest.exported(min(dates), max(dates))
+        plan = {}
+        for date in sorted(dates):
+            missing = [metric for metric in self.metrics if metric not in exported.get(date, ())]
+            if missing:
+                plan[date] = missing
+        if self.coverage is not None and plan:
+            covered = self.coverage.covered(list(plan), self.metrics, self.athlete)
+            found = {date: [metric for metric in plan[date] if metric in covered.get(date, ())] for date in plan}
+            found = {date: metrics for date, metrics in found.items() if metrics}
+            if found:
+                self.manifest.mark(found)
+            for date, metrics in found.items():
+                plan[date] = [metric for metric in plan[date] if metric not in metrics]
+            plan = {date: metrics for date, metrics in plan.items() if metrics}
+        return plan
+
+    def run(self, scrape, tsdb, dates, force=False):
+        """Fetch and write only the missing days, then record them. Returns the plan.
+
+        With `force` every date is rewritten regardless of the manifest.
+        """
+        plan = {date: list(self.metrics) for date in sorted(dates)} if force else self.plan(dates)
+        if not plan:
+            return plan
+        dailies = scrape.get_dailies(list(plan))
+        tsdb.create_backfill(dailies, plan)
+        self.manifest.mark(plan)
+        return plan
+
+
+def get_coverage():
+    """PrometheusCoverage for BACKFILL_PROMETHEUS_URL, or None when unset."""
+    url = os.environ.get("BACKFILL_PROMETHEUS_URL")
+    return PrometheusCoverage(url) if url else None
@@ -0,0 +1,223 @@
+"""Headless batch commands, so bulk work can run as a Kubernetes Job instead of through the web server.
+
+    python -m garmin.cli backfill --from 2023-01-01 --to 2024-12-31 --output /data/blocks
+    python -m garmin.cli export --days 30 --output dailies.om
+    python -m garmin.cli parse --from 2024-03-01 --to 2024-10-31 --workers 4 --output activities.jsonl
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import garmin.activity as activity
+import garmin.athletes as athletes
+import garmin.parse_pool as parse_pool
+from garmin.backfill import BackfillPlanner, get_coverage
+from garmin.store import BackfillManifest
+from garmin.tsdb import TSDB_METRICS, TsdbGenerator
+
+# Days fetched per task when --threads is above 1
+CHUNK_DAYS = 30
+
+
+class Progress:
+    """Prints `label: done/total (rate/s, ETA)` to stderr at most every `interval` seconds, and at the end."""
+
+    def __init__(self, label, total, interval=5.0, stream=None):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.done = 0
+        self.started = time.monotonic()
+        self.printed = None
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if self.done >= self.total or self.printed is None or now - self.printed >= self.interval:
+            self.printed = now
+            self.stream.write(self.line(now) + "\n")
+            self.stream.flush()
+
+    def line(self, now):
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.done / elapsed
+        line = f"{self.label}: {self.done}/{self.total} ({rate:.1f}/s"
+        if self.done < self.total and rate > 0:
+            line += f", {(self.total - self.done) / rate:.0f}s left"
+        return line + ")"
+
+
+def date_range(start, end):
+    """Every date from `start` to `end` inclusive, as YYYY-MM-DD strings."""
+    start = datetime.date.fromisoformat(start)
+    end = datetime.date.fromisoformat(end)
+    return [(start + datetime.timedelta(days=day)).isoformat() for day in range((end - start).days + 1)]
+
+
+def resolve_dates(args, today=None):
+    """Dates for --from/--to, or the --days days before today (today's daily isn't final yet)."""
+    today = today or datetime.date.today()
+    end = args.end or (today - datetime.timedelta(days=1)).isoformat()
+    if args.days:
+        start = (datetime.date.fromisoformat(end) - datetime.timedelta(days=args.days - 1)).isoformat()
+    else:
+        start = args.start
+    if start is None:
+        raise ValueError("Give --from or --days")
+    dates = date_range(start, end)
+    if not dates:
+        raise ValueError(f"--from {start} is after --to {end}")
+    return dates
+
+
+def fetch_dailies(scrape, dates, threads, progress):
+    """Dailies for `dates` in date order, fetched `CHUNK_DAYS` at a time over `threads` threads."""
+    chunks = [dates[i:i + CHUNK_DAYS] for i in range(0, len(dates), CHUNK_DAYS)]
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="fetch") as executor:
+        futures = [executor.submit(scrape.get_dailies, chunk) for chunk in chunks]
+        for chunk, future in zip(chunks, futures):
+            results.extend(future.result())
+            progress.advance(len(chunk))
+    return results
+
+
+def garmin_scrape(athlete):
+    from garmin.connector import Connector
+    from garmin.scrape import Scrape
+    Connector(athlete)
+    return Scrape(athlete)
+
+
+def run_backfill(args, athlete):
+    dates = args.dates
+    os.makedirs(args.output, exist_ok=True)
+    manifest = BackfillManifest(athlete.garth_folder) if athlete.garth_folder else None
+    if manifest is None or args.force:
+        plan = {date: [name for name, _ in TSDB_METRICS] for date in dates}
+    else:
+        plan = BackfillPlanner(manifest, get_coverage(), athlete=athlete.name).plan(dates)
+    print(f"Backfilling {len(plan)} of {len(dates)} days into {args.output}")
+    if plan:
+        scrape = garmin_scrape(athlete)
+        dailies = fetch_dailies(scrape, list(plan), args.threads, Progress("days", len(plan), args.progress_interval))
+        TsdbGenerator(args.output, athlete.name).create_backfill(dailies, plan)
+        if manifest is not None:
+            manifest.mark(plan)
+    return 0
+
+
+def run_export(args, athlete):
+    dates = args.dates
+    metrics = args.metrics.split(",") if args.metrics else None
+    scrape = garmin_scrape(athlete)
+    dailies = fetch_dailies(scrape, dates, args.threads, Progress("days", len(dates), args.progress_interval))
+    samples = TsdbGenerator(athlete=athlete.name).write_openmetrics(dailies, args.output, metrics)
+    print(f"Wrote {samples} samples for {len(dailies)} days to {args.output}")
+    return 0
+
+
+def run_parse(args, athlete):
+    from garmin.intervals import Intervals
+    if args.workers:
+        os.environ["PARSE_WORKERS"] = str(args.workers)
+    dates = args.dates
+    intervals = Intervals(athlete)
+    activities = intervals.get_activities_between(dates[0], dates[-1]) or []
+    if args.types:
+        types = set(args.types.split(","))
+        activities = [a for a in activities if a.get("type") in types]
+    ids, duplicates = intervals.get_activity_ids(activities)
+    intervals.delete_duplicates(duplicates)
+    store = intervals.activity_store
+    todo = ids if args.force or store is None else store.missing(ids, intervals.ftp)
+    print(f"Parsing {len(todo)} of {len(ids)} activities between {dates[0]} and {dates[-1]}")
+
+    summaries = {}
+    progress = Progress("activities", len(todo), args.progress_interval)
+    # Batches keep the parse pool busy while the next downloads, and give progress as they finish
+    batch = args.batch or max(1, 2 * (args.workers or 1))
+    try:
+        for i in range(0, len(todo), batch):
+            chunk = todo[i:i + batch]
+            summaries.update(intervals.parse_activities_by_id(chunk))
+            progress.advance(len(chunk))
+    finally:
+        pool = parse_pool.get_parse_pool()
+        if pool is not None:
+            pool.shutdown()
+    failed = len(todo) - len(summaries)
+
+    if args.output:
+        written = 0
+        with open(args.output, "wb") as f:
+            for activity_id in ids:
+                summary = summaries.get(activity_id)
+                if summary is None and store is not None:
+                    summary = store.get(activity_id)
+                if summary is not None:
+                    f.write(activity.dumps(summary) + b"\n")
+                    written += 1
+        print(f"Wrote {written} activities to {args.output}")
+    if failed:
+        print(f"{failed} activities failed to parse")
+    return 1 if failed else 0
+
+
+def add_date_args(parser):
+    parser.add_argument("--from", dest="start", help="First date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="Last date, YYYY-MM-DD (default yesterday)")
+    parser.add_argument("--days", type=int, help="Number of days up to --to, instead of --from")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m garmin.cli", description=__doc__.splitlines()[0])
+    parser.add_argument("--athlete", help="Athlete name in multi-athlete mode (default the first)")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser("backfill", help="Write TSDB backfill blocks for the days not yet exported")
+    add_date_args(backfill)
+    backfill.add_argument("--output", required=True, help="Folder for the block files")
+    backfill.add_argument("--threads", type=int, default=1, help="Concurrent Garmin fetches")
+    backfill.add_argument("--force", action="store_true", help="Rewrite days already in the backfill manifest")
+    backfill.set_defaults(func=run_backfill)
+
+    export = commands.add_parser("export", help="Write dailies to one OpenMetrics file")
+    add_date_args(export)
+    export.add_argument("--output", required=True, help="OpenMetrics file to write")
+    export.add_argument("--threads", type=int, default=1, help="Concurrent Garmin fetches")
+    export.add_argument("--metrics", help="Comma-separated metric names (default all)")
+    export.set_defaults(func=run_export)
+
+    parse = commands.add_parser("parse", help="Parse and store intervals.icu activities")
+    add_date_args(parse)
+    parse.add_argument("--output", help="JSON lines file of the parsed summaries")
+    parse.add_argument("--workers", type=int, default=0, help="Parse worker processes (default PARSE_WORKERS)")
+    parse.add_argument("--batch", type=int, default=0, help="Activities downloaded per batch")
+    parse.add_argument("--types", help="Comma-separated activity types, e.g. Ride,Run")
+    parse.add_argument("--force", action="store_true", help="Re-parse activities that are already stored")
+    parse.set_defaults(func=run_parse)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        athlete = athletes.get_athlete(args.athlete)
+    except KeyError as e:
+        parser.error(str(e))
+    try:
+        args.dates = resolve_dates(args)
+    except ValueError as e:
+        parser.error(str(e))
+    return args.func(args, athlete)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
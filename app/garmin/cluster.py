@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+
+class FileLease:
+    """A leader lease kept in a JSON file on shared storage.
+
+    The file is only read and written while holding an flock on a sibling
+    lock file, so replicas sharing the PVC can't both take the lease.
+    """
+
+    def __init__(self, path, holder, ttl):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.holder = holder
+        self.ttl = ttl
+
+    def acquire(self):
+        """Take or renew the lease. Returns True if we hold it afterwards."""
+        with open(self.lock_path, "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                lease = self.read()
+                if lease and lease["holder"] != self.holder and lease["expires"] > now:
+                    return False
+                self.write({"holder": self.holder, "expires": now + self.ttl})
+                return True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def release(self):
+        with open(self.lock_path, "a+") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                lease = self.read()
+                if lease and lease["holder"] == self.holder:
+                    os.remove(self.path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write(self, lease):
+        tmp_path = f"{self.path}.{self.holder}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(lease, f)
+        os.replace(tmp_path, self.path)
+
+
+class Cluster:
+    """Membership, leader election and work sharding between replicas.
+
+    Every worker touches a heartbeat file under `folder/members`. Work keys
+    (activity ids) are assigned to live workers by rendezvous hashing, so
+    each key has exactly one owner and only the keys of a departed worker
+    move when membership changes.
+    """
+
+    def __init__(self, folder, worker_id=None, ttl=60):
+        self.folder = folder
+        self.members_folder = os.path.join(folder, "members")
+        os.makedirs(self.members_folder, exist_ok=True)
+        self.worker_id = worker_id or os.environ.get("WORKER_ID") or socket.gethostname()
+        self.ttl = ttl
+        self.lease = FileLease(os.path.join(folder, "leader.json"), self.worker_id, ttl)
+
+    def heartbeat(self):
+        path = os.path.join(self.members_folder, self.worker_id)
+        with open(path, "w") as f:
+            f.write(str(time.time()))
+
+    def leave(self):
+        try:
+            os.remove(os.path.join(self.members_folder, self.worker_id))
+        except FileNotFoundError:
+            pass
+        self.lease.release()
+
+    def live_members(self):
+        now = time.time()
+        members = []
+        for name in os.listdir(self.members_folder):
+            try:
+                if now - os.path.getmtime(os.path.join(self.members_folder, name)) <= self.ttl:
+                    members.append(name)
+            except FileNotFoundError:
+                continue
+        if self.worker_id not in members:
+            members.append(self.worker_id)
+        return sorted(members)
+
+    def is_leader(self):
+        return self.lease.acquire()
+
+    def owner(self, key, members=None):
+        members = members or self.live_members()
+        return max(members, key=lambda member: hashlib.sha1(f"{member}:{key}".encode("utf-8")).digest())
+
+    def owns(self, key, members=None):
+        return self.owner(key, members) == self.worker_id
+
+    def shard(self, keys):
+        members = self.live_members()
+        return [key for key in keys if self.owns(key, members)]
+
+
+class Scheduler:
+    """Runs scheduled work every `interval` seconds on a background thread.
+
+    `leader_jobs` only run on the replica holding the lease; `worker_jobs`
+    run everywhere and are expected to use `cluster.shard` to split work.
+    """
+
+    def __init__(self, cluster, interval, leader_jobs=None, worker_jobs=None):
+        self.cluster = cluster
+        self.interval = interval
+        self.leader_jobs = leader_jobs or []
+        self.worker_jobs = worker_jobs or []
+        self.stopped = threading.Event()
+        self.leading = False
+        self.thread = None
+        self.heartbeat_thread = None
+
+    def start(self):
+        self.cluster.heartbeat()
+        self.heartbeat_thread = threading.Thread(target=self.beat, name="scheduler-heartbeat", daemon=True)
+        self.heartbeat_thread.start()
+        self.thread = threading.Thread(target=self.run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def beat(self):
+        # Keeps membership and the lease fresh while long jobs are running
+        while not self.stopped.wait(self.cluster.ttl / 3.0):
+            self.cluster.heartbeat()
+            if self.leading:
+                self.leading = self.cluster.is_leader()
+
+    def stop(self):
+        self.stopped.set()
+        self.cluster.leave()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.tick()
+            self.stopped.wait(self.interval)
+
+    def tick(self):
+        self.cluster.heartbeat()
+        jobs = list(self.worker_jobs)
+        self.leading = self.cluster.is_leader()
+        if self.leading:
+            print(f"{self.cluster.worker_id} is the scheduler leader")
+            jobs = self.leader_jobs + jobs
+        for job in jobs:
+            try:
+                job()
+            except Exception as e:
+                print(f"Caught exception {e} running scheduled job {getattr(job, '__name__', job)}")
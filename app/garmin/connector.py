@@ -4,33 +4,48 @@ import os
 import garth
 from garth.exc import GarthException
 
+from garmin.athletes import Athlete
+
 
 class Connector:
     garth_folder = ""
     garmin_user = ""
     garmin_pass = ""
 
-    def __init__(self):
-        self.garmin_user = os.environ.get("GARMIN_USER")
-        self.garth_folder = os.environ.get("GARTH_FOLDER")
-        self.garmin_pass = os.environ.get("GARMIN_PASS")
+    def __init__(self, athlete=None):
+        self.athlete = athlete or Athlete.from_env()
+        self.garmin_user = self.athlete.garmin_user
+        self.garth_folder = self.athlete.garth_folder
+        self.garmin_pass = self.athlete.garmin_pass
+        # Configured athletes get their own garth client, the default one uses garth's global client
+        self.client = self.athlete.client
 
         if not self.is_logged_in():
             print(f"Logging in with {self.garmin_user} and {self.garmin_pass}")
-            garth.login(self.garmin_user, self.garmin_pass)
-            garth.save(self.garth_folder)
+            if self.client is None:
+                garth.login(self.garmin_user, self.garmin_pass)
+                garth.save(self.garth_folder)
+            else:
+                self.client.login(self.garmin_user, self.garmin_pass)
+                self.client.dump(self.garth_folder)
 
 
 
     def is_logged_in(self):
         self.does_garth_exist()
         try:
-            garth.resume(self.garth_folder)
+            if self.client is None:
+                garth.resume(self.garth_folder)
+            else:
+                self.client.load(self.garth_folder)
         except FileNotFoundError:
             print("OAuth2 tokens don't exist")
             return False
         try:
-            garth.client.username
+            if self.client is None:
+                garth.client.username
+            else:
+                self.client.username
         except GarthException:
             print("Session is expired, new login required")
             return False
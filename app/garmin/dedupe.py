@@ -0,0 +1,128 @@
+import os
+from datetime import datetime
+
+# Start time granularity of the index
+BUCKET_SECONDS = 15 * 60
+# Types recorded by different devices for the same session
+TYPE_FAMILIES = {"VirtualRide": "Ride", "EBikeRide": "Ride", "MountainBikeRide": "Ride", "GravelRide": "Ride",
+                 "TrailRun": "Run", "VirtualRun": "Run"}
+
+
+def bucket_of(timestamp):
+    return int(timestamp // BUCKET_SECONDS)
+
+
+def number(activity, *keys):
+    for key in keys:
+        value = activity.get(key)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+    return None
+
+
+class Fingerprint:
+    """What the activity list says about one recording, enough to spot another device's copy of it."""
+
+    def __init__(self, activity, position=0):
+        self.position = position
+        self.id = activity.get("id")
+        self.family = TYPE_FAMILIES.get(activity.get("type"), activity.get("type"))
+        start = activity.get("start_date_local") or activity.get("start_date") or ""
+        try:
+            self.start = datetime.fromisoformat(start.replace("Z", "")).timestamp()
+        except ValueError:
+            self.start = None
+        self.duration = number(activity, "elapsed_time", "moving_time", "icu_recording_time") or 0.0
+        self.distance = number(activity, "distance", "icu_distance")
+        self.heartrate = number(activity, "average_heartrate", "icu_average_hr")
+        self.power = number(activity, "icu_average_watts", "average_watts")
+        self.has_power = bool(activity.get("device_watts")) or bool(self.power)
+        self.has_heartrate = bool(activity.get("has_heartrate")) or bool(self.heartrate)
+
+    @property
+    def end(self):
+        return self.start + self.duration
+
+    def bucket(self):
+        return bucket_of(self.start)
+
+    def richness(self):
+        """Power beats no power, then heart rate, then the longer recording."""
+        return (self.has_power, self.has_heartrate, self.duration)
+
+    def overlaps(self, other, min_overlap):
+        if self.family != other.family or not self.duration or not other.duration:
+            return False
+        shared = min(self.end, other.end) - max(self.start, other.start)
+        if shared < min_overlap * min(self.duration, other.duration):
+            return False
+        if self.distance and other.distance and abs(self.distance - other.distance) > 0.1 * max(self.distance, other.distance):
+            return False
+        if self.heartrate and other.heartrate and abs(self.heartrate - other.heartrate) > 10:
+            return False
+        return True
+
+
+class DuplicateIndex:
+    """Recordings bucketed by start time, so each new one is only compared with its neighbours."""
+
+    def __init__(self, min_overlap=None):
+        if min_overlap is None:
+            min_overlap = float(os.environ.get("DEDUPE_MIN_OVERLAP", 0.8))
+        self.min_overlap = min_overlap
+        self.buckets = {}
+        self.longest = 0.0
+
+    def find(self, fingerprint):
+        """The indexed recording this one duplicates, or None."""
+        # Only recordings starting between (start - longest) and end can overlap it
+        first = bucket_of(fingerprint.start - self.longest)
+        for bucket in range(first, fingerprint.bucket() + bucket_of(fingerprint.duration) + 1):
+            for other in self.buckets.get(bucket, ()):
+                if fingerprint.overlaps(other, self.min_overlap):
+                    return other
+        return None
+
+    def add(self, fingerprint):
+        self.buckets.setdefault(fingerprint.bucket(), []).append(fingerprint)
+        self.longest = max(self.longest, fingerprint.duration)
+
+    def replace(self, old, new):
+        self.buckets[old.bucket()].remove(old)
+        self.add(new)
+
+
+def drop_duplicates(activities, min_overlap=None):
+    """Split an activity list into the recordings to keep and {skipped id: kept id}.
+
+    Recordings of the same type that overlap for at least `min_overlap` of
+    the shorter one, with similar distance and heart rate, are one session
+    recorded twice. Only the richest of each is kept, see Fingerprint.richness.
+    List order is preserved.
+    """
+    index = DuplicateIndex(min_overlap)
+    kept = set()
+    skipped = {}
+    for position, activity in enumerate(activities):
+        fingerprint = Fingerprint(activity, position)
+        if fingerprint.start is None:
+            kept.add(position)
+            continue
+        other = index.find(fingerprint)
+        if other is None:
+            index.add(fingerprint)
+            kept.add(position)
+        elif fingerprint.richness() > other.richness():
+            index.replace(other, fingerprint)
+            kept.discard(other.position)
+            kept.add(position)
+            skipped[other.id] = fingerprint.id
+        else:
+            # Equally rich recordings keep the one listed first
+            skipped[fingerprint.id] = other.id
+    # Anything skipped for a recording that was later replaced points at the one finally kept
+    for skipped_id, kept_id in skipped.items():
+        while kept_id in skipped:
+            kept_id = skipped[kept_id]
+        skipped[skipped_id] = kept_id
+    return [activity for position, activity in enumerate(activities) if position in kept], skipped
@@ -0,0 +1,123 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Channels that aren't columns of streams.csv, computed from ones that are
+DERIVED_CHANNELS = {"pace": "velocity_smooth"}
+
+
+def lttb(x, y, points):
+    """Indices of `points` samples chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last samples are always kept. The rest are split into
+    points - 2 buckets and from each the sample forming the largest triangle
+    with the previously kept sample and the next bucket's average is kept.
+    Bucket averages come from cumulative sums in one pass.
+    """
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+    edges = np.linspace(1, size - 1, points - 1).astype(np.int64)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    avg_x = (sum_x[edges[1:]] - sum_x[edges[:-1]]) / counts
+    avg_y = (sum_y[edges[1:]] - sum_y[edges[:-1]]) / counts
+    # The last bucket looks ahead to the final sample
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    a = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[a] - next_x[bucket]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[bucket] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def minmax(x, y, points):
+    """Indices of the minimum and maximum sample of each of points / 2 buckets, plus both ends."""
+    size = len(x)
+    if points >= size or points < 4:
+        return np.arange(size)
+    buckets = points // 2
+    bucket = np.arange(size) * buckets // size
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(buckets))
+    ends = np.append(starts[1:], size) - 1
+    return np.unique(np.concatenate((order[starts], order[ends], [0, size - 1])))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def channel_values(streams, channel):
+    if channel == "pace":
+        velocity = streams["velocity_smooth"].astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Seconds per km, standing still isn't a pace
+            return np.where(velocity > 0.5, 1000.0 / velocity, np.nan)
+    return streams[channel].astype(np.float64)
+
+
+def available_channels(streams):
+    channels = [col for col in streams if col != "time"]
+    channels += [name for name, source in DERIVED_CHANNELS.items() if source in streams]
+    return channels
+
+
+def downsample(streams, channel, points, method="lttb"):
+    """(time, values) of one channel reduced to about `points` samples. Gaps (NaN) are dropped first."""
+    x = streams["time"].astype(np.float64)
+    y = channel_values(streams, channel)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    index = METHODS[method](x, y, points)
+    return x[index], y[index]
+
+
+class DownsampleCache:
+    """LRU of downsampled channels, keyed by (athlete, activity, channel, points, method).
+
+    Holds at most `maxsize` entries and `max_bytes` of arrays, whichever is
+    reached first.
+    """
+
+    def __init__(self, maxsize=None, max_bytes=None):
+        self.maxsize = maxsize or int(os.environ.get("DOWNSAMPLE_CACHE_SIZE", 256))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("DOWNSAMPLE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def nbytes(value):
+        parts = value if isinstance(value, tuple) else (value,)
+        return sum(getattr(part, "nbytes", 0) for part in parts)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            size = self.nbytes(value)
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > self.maxsize or (self.size > self.max_bytes and len(self.entries) > 1):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
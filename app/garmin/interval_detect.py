@@ -0,0 +1,128 @@
+import numpy as np
+
+# Power thresholds as fractions of FTP: an interval starts when smoothed power
+# reaches ENTER and lasts until it falls below EXIT
+POWER_ENTER = 0.88
+POWER_EXIT = 0.75
+# Heart rate thresholds as fractions of LTHR, for rides without a power meter
+HR_ENTER = 0.92
+HR_EXIT = 0.85
+# Velocity thresholds as multiples of the activity's median moving velocity
+VELOCITY_ENTER = 1.15
+VELOCITY_EXIT = 1.05
+
+
+def smooth(values, samples):
+    """Centred moving average over `samples` samples, ignoring NaN."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    if samples <= 1:
+        return values
+    total = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    count = np.concatenate(([0], np.cumsum(valid)))
+    half = samples // 2
+    index = np.arange(len(values))
+    lo = np.clip(index - half, 0, len(values))
+    hi = np.clip(index + samples - half, 0, len(values))
+    counts = count[hi] - count[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, (total[hi] - total[lo]) / counts, np.nan)
+
+
+def hysteresis(signal, enter, exit):
+    """True while `signal` is in the work state.
+
+    Work starts at a sample >= enter and carries on until one < exit, so
+    noise between the two levels doesn't split an interval.
+    """
+    event = np.full(len(signal), -1, dtype=np.int8)
+    event[signal < exit] = 0
+    event[signal >= enter] = 1
+    index = np.where(event >= 0, np.arange(len(signal)), -1)
+    last = np.maximum.accumulate(index) if len(index) else index
+    return (last >= 0) & (event[np.maximum(last, 0)] == 1)
+
+
+def runs(mask):
+    """Start and (exclusive) end indices of each run of True."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect(time, signal, enter, exit, dt, channels, smooth_seconds=10, min_duration=30, min_gap=15):
+    """Work intervals in an activity, in one linear pass over its streams.
+
+    `signal` is smoothed and run through a hysteresis state machine. Work
+    bouts separated by less than `min_gap` seconds are merged, and ones
+    shorter than `min_duration` dropped. Each interval reports its start
+    and end (seconds), plus the time-weighted average of each of `channels`
+    ({name: values}) and the maximum power when there's a "power" channel.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    dt = np.asarray(dt, dtype=np.float64)
+    if len(time) == 0:
+        return []
+    step = np.median(dt[dt > 0]) if np.any(dt > 0) else 1.0
+    smoothed = smooth(signal, max(1, int(round(smooth_seconds / step))))
+    starts, ends = runs(hysteresis(smoothed, enter, exit))
+    if len(starts) == 0:
+        return []
+
+    # Merge bouts split by a short dip (a gear change, a traffic light)
+    gaps = time[starts[1:]] - time[ends[:-1] - 1] - dt[ends[:-1] - 1]
+    keep = gaps >= min_gap
+    starts = starts[np.concatenate(([True], keep))]
+    ends = ends[np.concatenate((keep, [True]))]
+
+    elapsed = np.concatenate(([0.0], np.cumsum(dt)))
+    durations = elapsed[ends] - elapsed[starts]
+    long_enough = durations >= min_duration
+    starts, ends = starts[long_enough], ends[long_enough]
+    if len(starts) == 0:
+        return []
+
+    intervals = [{"start": float(time[start]), "end": float(time[end - 1] + dt[end - 1])}
+                 for start, end in zip(starts, ends)]
+    for name, values in channels.items():
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        weighted = np.concatenate(([0.0], np.cumsum(np.where(valid, values * dt, 0.0))))
+        weights = np.concatenate(([0.0], np.cumsum(np.where(valid, dt, 0.0))))
+        totals = weights[ends] - weights[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = (weighted[ends] - weighted[starts]) / totals
+        for interval, average, total in zip(intervals, averages, totals):
+            interval[f"avg_{name}"] = float(average) if total > 0 else None
+        if name == "power":
+            for interval, start, end in zip(intervals, starts, ends):
+                segment = values[start:end]
+                interval["max_power"] = float(np.nanmax(segment)) if valid[start:end].any() else None
+    return intervals
+
+
+def stream_channels(df):
+    channels = {}
+    for name, col in (("power", "watts"), ("heartrate", "heartrate"), ("velocity", "velocity_smooth")):
+        if col in df.columns and df[col].notna().any():
+            channels[name] = df[col].to_numpy()
+    return channels
+
+
+def power_intervals(df, ftp):
+    return detect(df['time'].to_numpy(), df['watts'].fillna(0).to_numpy(), POWER_ENTER * ftp, POWER_EXIT * ftp,
+                  df['dt'].to_numpy(), stream_channels(df))
+
+
+def heartrate_intervals(df, lthr):
+    return detect(df['time'].to_numpy(), df['heartrate'].to_numpy(), HR_ENTER * lthr, HR_EXIT * lthr,
+                  df['dt'].to_numpy(), stream_channels(df), smooth_seconds=30, min_duration=60)
+
+
+def velocity_intervals(df):
+    velocity = df['velocity_smooth']
+    moving = velocity[velocity > 0.5]
+    if moving.empty:
+        return []
+    median = float(moving.median())
+    return detect(df['time'].to_numpy(), velocity.to_numpy(), VELOCITY_ENTER * median, VELOCITY_EXIT * median,
+                  df['dt'].to_numpy(), stream_channels(df), smooth_seconds=15, min_duration=60)
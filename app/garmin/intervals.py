@@ -1,34 +1,55 @@
+import asyncio
 import os
 import garmin.utils as utils
+from garmin.athletes import Athlete
+from garmin.store import ActivityStore
+import garmin.parse_pool as parse_pool
+import garmin.streams as streams
+from garmin.activity import ActivitySummary
+import garmin.zones as zones
+import garmin.interval_detect as interval_detect
+import garmin.dedupe as dedupe
+import garmin.jobs as jobs
+import garmin.profiling as profiling
+from garmin.warmcache import warm_cache
 import pandas as pd
 from datetime import datetime, timedelta
 import csv,json
 import base64
+from concurrent.futures import Future
 
 class Intervals:
 
-    def __init__(self):
+    def __init__(self, athlete=None):
+        self.athlete = athlete or Athlete.from_env()
         self.slack_channel = os.environ.get("SLACK_CHANNEL")
-        self.slack_user_id = os.environ.get("SLACK_USER_ID")
+        self.slack_user_id = self.athlete.slack_user_id
         self.slack_auth_token = os.environ.get("SLACK_BOT_TOKEN")
-        self.intervals_api_key = os.environ.get("INTERVALS_API_KEY")
-        self.intervals_base = os.environ.get("INTERVALS_BASE_URL")
-        self.garth_folder = os.environ.get("GARTH_FOLDER")
+        self.intervals_api_key = self.athlete.intervals_api_key
+        self.intervals_base = self.athlete.intervals_base
+        self.garth_folder = self.athlete.garth_folder
+        self.activity_store = ActivityStore(self.garth_folder) if self.garth_folder else None
         self.ftp = 218
+        self.zone_models = {}
         self.get_athlete_fields()
 
     def get_athlete_fields(self):
-        endpoint = "/api/v1/athlete/0"
-        url = self.intervals_base + endpoint
-        resp = utils.make_request("get", url, self.intervals_api_key)
-        athlete = resp.json()
-        sport_settings = athlete["sportSettings"]
+        # Settings rarely change, so they're kept for ATHLETE_SETTINGS_TTL instead of fetched per request
+        sport_settings = warm_cache.get_settings(self.athlete.name)
+        if sport_settings is None:
+            endpoint = "/api/v1/athlete/0"
+            url = self.intervals_base + endpoint
+            resp = utils.make_request("get", url, self.intervals_api_key)
+            athlete = resp.json()
+            sport_settings = athlete["sportSettings"]
+            warm_cache.put_settings(self.athlete.name, sport_settings)
         for sport_setting in sport_settings:
             if sport_setting["mmp_model"] is not None:
                 mmp_model = sport_setting["mmp_model"]
                 if mmp_model["ftp"] is not None:
                     self.ftp = int(mmp_model["ftp"])
                     break
+        self.zone_models = zones.from_sport_settings(sport_settings, self.ftp)
         
 
     def get_latest_activity(self):
@@ -75,12 +96,71 @@ class Intervals:
             return activities
         return None
     
+    async def get_activities_in_last_x_weeks_async(self, weeks):
+        date = utils.get_date_from_weeks(weeks)
+        url = self.intervals_base + f"/api/v1/athlete/0/activities?oldest={date}"
+        resp = await utils.make_request_async("get", url, self.intervals_api_key)
+        return json.loads(resp.text) if resp is not None else None
+
+    def get_activities_between(self, oldest, newest):
+        endpoint = f"/api/v1/athlete/0/activities?oldest={oldest}&newest={newest}"
+        url = self.intervals_base + endpoint
+        resp = utils.make_request("get", url, self.intervals_api_key)
+        if resp is not None:
+            return json.loads(resp.text)
+        return None
+
+    @staticmethod
+    def dedupe_enabled():
+        return os.environ.get("DEDUPE_ACTIVITIES", "true").lower() not in ("0", "false", "no")
+
+    def find_duplicates(self, activities):
+        """Split activities into (kept, {skipped id: kept id}), see dedupe.drop_duplicates."""
+        if not self.dedupe_enabled():
+            return activities, {}
+        activities, skipped = dedupe.drop_duplicates(activities)
+        for skipped_id, kept_id in skipped.items():
+            print(f"Skipping activity {skipped_id}, a duplicate recording of {kept_id}")
+        return activities, skipped
+
+    def delete_duplicates(self, skipped_ids):
+        """Remove skipped recordings from the store, so ones parsed before they were spotted stop counting twice."""
+        if self.activity_store is None:
+            return
+        for skipped_id in skipped_ids:
+            self.activity_store.delete(skipped_id)
+
+    def drop_duplicates(self, activities):
+        """Activities minus other devices' recordings of the same session, before any streams are fetched."""
+        return self.find_duplicates(activities)[0]
+
+    def kept_recording(self, activity_id):
+        """The id of the recording kept for this activity's session: its own, or another device's richer one.
+
+        Used for single activities, such as webhook events, that don't come
+        from a listing. Activities from the day before to the day after are
+        listed and deduplicated around it.
+        """
+        if not self.dedupe_enabled():
+            return activity_id
+        day = datetime.strptime(self.get_activity_metadata(activity_id)["activity_date"], '%Y-%m-%d')
+        oldest = (day - timedelta(days=1)).strftime('%Y-%m-%d')
+        newest = (day + timedelta(days=1)).strftime('%Y-%m-%d')
+        activities = self.get_activities_between(oldest, newest) or []
+        return self.find_duplicates(activities)[1].get(activity_id, activity_id)
+
     def get_activity_ids(self, activities):
+        """(ids of the kept activities, {skipped id: kept id}) for a listing.
+
+        Skipped recordings aren't removed from the store here, pass them to
+        sync_activities or delete_duplicates.
+        """
+        activities, skipped = self.find_duplicates(activities)
         activity_ids = []
         for activity in activities:
             if activity["id"]:
                 activity_ids.append(activity["id"])
-        return activity_ids
+        return activity_ids, skipped
 
     def get_activities(self):
         url = self.intervals_base + "/api/v1/athlete/0/activities.csv"
@@ -95,14 +175,47 @@ class Intervals:
         metadata = self.get_activity_metadata(activity_id)
         endpoint = f"/api/v1/activity/{activity_id}/streams.csv"
         url = self.intervals_base + endpoint
-        resp = utils.make_request("get", url, self.intervals_api_key)
+        # Streams are large and parsed once, the parsed arrays have their own cache
+        resp = utils.make_request("get", url, self.intervals_api_key, use_cache=False)
         if resp.content is not None:
-            activity = resp.content.decode('utf-8-sig')
-            filepath = self.garth_folder +  os.sep + "activity.csv"
-            with open(filepath, 'w') as f:
-                f.write(activity)
+            filepath = self.write_streams(activity_id, resp.content)
         return filepath, metadata
 
+    async def get_activity_streams_async(self, activity_id):
+        url = self.intervals_base + f"/api/v1/activity/{activity_id}/streams.csv"
+        metadata, resp = await asyncio.gather(
+            self.get_activity_metadata_async(activity_id),
+            utils.make_request_async("get", url, self.intervals_api_key, use_cache=False))
+        filepath = ""
+        if resp.content is not None:
+            filepath = await asyncio.to_thread(self.write_streams, activity_id, resp.content)
+        return filepath, metadata
+
+    def write_streams(self, activity_id, content):
+        activity = content.decode('utf-8-sig')
+        # One file per activity so concurrent parses don't overwrite each other
+        filepath = self.garth_folder +  os.sep + f"activity-{activity_id}.csv"
+        with open(filepath, 'w') as f:
+            f.write(activity)
+        return filepath
+
+    def get_stream_arrays(self, activity_id):
+        """Stream arrays for an activity, downloading them only if they aren't cached."""
+        cache = streams.StreamCache(self.garth_folder) if self.garth_folder else None
+        if cache is not None:
+            cached = cache.load(activity_id)
+            if cached is not None:
+                return cached
+        file_path, metadata = self.get_activity_streams(activity_id)
+        try:
+            activity_streams = streams.read_streams(file_path)
+        finally:
+            if file_path and os.path.isfile(file_path):
+                os.remove(file_path)
+        if cache is not None:
+            cache.save(activity_id, activity_streams)
+        return activity_streams
+
     def get_activity_metadata(self, activity_id):
         activity_metadata = {}
         endpoint = f"/api/v1/activity/{activity_id}"
@@ -110,15 +223,146 @@ class Intervals:
         resp = utils.make_request("get", url, self.intervals_api_key)
         if resp.text is not None:
             activity_metadata = json.loads(resp.text)
+        return self.with_activity_date(activity_metadata)
+
+    async def get_activity_metadata_async(self, activity_id):
+        url = self.intervals_base + f"/api/v1/activity/{activity_id}"
+        resp = await utils.make_request_async("get", url, self.intervals_api_key)
+        return self.with_activity_date(json.loads(resp.text) if resp.text is not None else {})
+
+    @staticmethod
+    def with_activity_date(activity_metadata):
         start_date = activity_metadata["start_date_local"]
         start_date = datetime.strptime(start_date, '%Y-%m-%dT%H:%M:%S').strftime('%Y-%m-%d')
         activity_metadata["activity_date"]=start_date
         return activity_metadata
+
+    def submit_activity(self, activity_id):
+        """Download an activity and hand its streams to the parse pool. Returns a future of its metrics."""
+        profiling.tag_activity(activity_id)
+        file_path, metadata = self.get_activity_streams(activity_id)
+        return self.submit_streams(activity_id, file_path, metadata)
+
+    async def parse_activity_async(self, activity_id):
+        """Download an activity without blocking the event loop and await its metrics from the parse pool."""
+        file_path, metadata = await self.get_activity_streams_async(activity_id)
+        # Reading the CSV, and parsing when there's no pool, run on a worker thread
+        future = await asyncio.to_thread(self.submit_streams, activity_id, file_path, metadata)
+        return await asyncio.wrap_future(future)
+
+    def submit_streams(self, activity_id, file_path, metadata):
+        try:
+            if metadata["type"] == "Walk":
+                future = Future()
+                future.set_result({"status": "Not Implemented", "type": metadata["type"],
+                                   "date": metadata["activity_date"], "id": metadata.get("id", activity_id)})
+                return future
+            activity_streams = streams.read_streams(file_path)
+        finally:
+            if file_path and os.path.isfile(file_path):
+                os.remove(file_path)
+        return parse_pool.submit(activity_streams, metadata, self.ftp, self.zone_models.get(metadata["type"]))
+
+    def parse_activities_by_id(self, activity_ids):
+        """Parse and store activities, returning {id: ActivitySummary}. Failed activities are skipped."""
+        futures = {}
+        for activity_id in activity_ids:
+            jobs.check_cancelled()
+            try:
+                futures[activity_id] = self.submit_activity(activity_id)
+            except Exception as e:
+                print(f"Caught exception {e} loading activity {activity_id}, skipping")
+        parsed = {}
+        for activity_id, future in futures.items():
+            try:
+                summary = ActivitySummary.from_metrics(future.result())
+            except Exception as e:
+                print(f"Caught exception {e} parsing activity {activity_id}, skipping")
+                continue
+            if self.activity_store is not None:
+                self.activity_store.upsert(activity_id, summary, self.ftp)
+            parsed[activity_id] = summary
+        return parsed
+
+    def parse_activity_by_id(self, activity_id):
+        summary = ActivitySummary.from_metrics(self.submit_activity(activity_id).result())
+        if self.activity_store is not None:
+            self.activity_store.upsert(activity_id, summary, self.ftp)
+        return summary
+
+    def get_parsed_activity(self, activity_id):
+        if self.activity_store is not None:
+            summary = self.activity_store.get(activity_id, self.ftp)
+            if summary is not None:
+                return summary
+        return self.parse_activity_by_id(activity_id)
+
+    def get_parsed_activities(self, activity_ids):
+        """ActivitySummary for each activity in order, parsing only the ones that aren't stored."""
+        missing = activity_ids
+        if self.activity_store is not None:
+            missing = self.activity_store.missing(activity_ids, self.ftp)
+        parsed = self.parse_activities_by_id(missing)
+        activities = []
+        for activity_id in activity_ids:
+            if activity_id in parsed:
+                activities.append(parsed[activity_id])
+            elif activity_id not in missing:
+                activities.append(self.activity_store.get(activity_id))
+        return activities
+
+    async def parse_activities_by_id_async(self, activity_ids):
+        """parse_activities_by_id for coroutines: every download is awaited concurrently, within the limiter."""
+        results = await asyncio.gather(*(self.parse_activity_async(activity_id) for activity_id in activity_ids),
+                                       return_exceptions=True)
+        parsed = {}
+        for activity_id, result in zip(activity_ids, results):
+            if isinstance(result, Exception):
+                print(f"Caught exception {result} parsing activity {activity_id}, skipping")
+                continue
+            parsed[activity_id] = ActivitySummary.from_metrics(result)
+        if self.activity_store is not None and parsed:
+            await asyncio.to_thread(self.store_summaries, parsed)
+        return parsed
+
+    def store_summaries(self, parsed):
+        for activity_id, summary in parsed.items():
+            self.activity_store.upsert(activity_id, summary, self.ftp)
+
+    async def get_parsed_activities_async(self, activity_ids):
+        """get_parsed_activities for coroutines."""
+        missing = activity_ids
+        if self.activity_store is not None:
+            missing = await asyncio.to_thread(self.activity_store.missing, activity_ids, self.ftp)
+        parsed = await self.parse_activities_by_id_async(missing)
+        stored = {}
+        if self.activity_store is not None:
+            stored = await asyncio.to_thread(self.stored_summaries, [i for i in activity_ids if i not in missing])
+        activities = []
+        for activity_id in activity_ids:
+            if activity_id in parsed:
+                activities.append(parsed[activity_id])
+            elif activity_id in stored:
+                activities.append(stored[activity_id])
+        return activities
+
+    def stored_summaries(self, activity_ids):
+        return {activity_id: self.activity_store.get(activity_id) for activity_id in activity_ids}
+
+    def sync_activities(self, activity_ids, duplicates=()):
+        """Parse and store the given activities that aren't stored yet, and delete the `duplicates` ids."""
+        self.delete_duplicates(duplicates)
+        if self.activity_store is not None:
+            activity_ids = self.activity_store.missing(activity_ids, self.ftp)
+        return len(self.parse_activities_by_id(activity_ids))
     
     def parse_activity(self, filepath, metadata):
-        # Load CSV into DataFrame
+        activity_streams = streams.read_streams(filepath)
+        return parse_pool.submit(activity_streams, metadata, self.ftp, self.zone_models.get(metadata["type"])).result()
+
+    @staticmethod
+    def compute_metrics(df, metadata, ftp, zone_model=None):
         activity_type = metadata["type"]
-        df = pd.read_csv(filepath)
         # Drop completely empty columns
         df = df.dropna(how='all')
         # Ensure 'time' is numeric seconds, starting at 0
@@ -126,21 +370,36 @@ class Intervals:
         df['time'] = df['time'].astype(int)
         metrics = {}
         if activity_type in ["Ride", "VirtualRide"]:
-            if "watts" and "cadence" in df:
-                metrics = self.compute_bike_metrics(df, self.ftp)
+            if "watts" in df:
+                metrics = Intervals.compute_bike_metrics(df, ftp, zone_model)
             else:
-                metrics = self.compute_rough_guess_bike_metrics(df, self.ftp, metadata)
+                metrics = Intervals.compute_rough_guess_bike_metrics(df, ftp, metadata, zone_model)
         if activity_type == "Run":
-            metrics = self.compute_running_metrics(df, metadata)
+            metrics = Intervals.compute_running_metrics(df, metadata, zone_model)
         if activity_type == "WeightTraining":
-            metrics = self.compute_weightlifting_metrics(df, metadata)
+            metrics = Intervals.compute_weightlifting_metrics(df, metadata, zone_model)
         if activity_type == "Walk":
             metrics["status"]="Not Implemented"
         metrics["type"]=metadata["type"]
         metrics["date"]=metadata["activity_date"]
+        metrics["id"]=metadata.get("id")
         return metrics
+
+    @staticmethod
+    def compute_hr_zones(df, zone_model, metrics):
+        # HR zones from the athlete's sport settings, so they compare across activities
+        if zone_model is None or zone_model.hr is None:
+            return
+        if 'heartrate' not in df.columns or not df['heartrate'].notna().any():
+            return
+        total_time = float(df['dt'].sum())
+        hr_zones = zone_model.hr.histogram(df['heartrate'].to_numpy(), df['dt'].to_numpy())
+        metrics['hr_zone_times'] = hr_zones
+        metrics['hr_zone_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
+                                          for k, v in hr_zones.items()}
         
-    def compute_bike_metrics(self, df, ftp):
+    @staticmethod
+    def compute_bike_metrics(df, ftp, zone_model=None):
         df = df.copy()
 
         # 1) Clean 'time' and drop empty rows
@@ -194,12 +453,13 @@ class Intervals:
 
         # ---- Zones (time-weighted) ----
         if 'watts' in df.columns and ftp:
-            bins = [0, 0.55, 0.75, 0.90, 1.05, 1.20, float('inf')]
-            labels = ['Z1', 'Z2', 'Z3', 'Z4', 'Z5', 'Z6']
-            z = pd.cut(df['watts'] / ftp, bins=bins, labels=labels, right=False)
-            zone_times = df.groupby(z, observed=False)['dt'].sum().to_dict()
-            metrics['zone_times'] = {k: float(v) for k, v in zone_times.items()}
-            metrics['zone_percentages'] = {k: (float(v) / total_time * 100.0) for k, v in zone_times.items()}
+            power_zones = zone_model.power_zones(ftp) if zone_model is not None else zones.ZoneSet(
+                [edge * ftp for edge in zones.DEFAULT_POWER_ZONES])
+            zone_times = power_zones.histogram(df['watts'].to_numpy(), df['dt'].to_numpy())
+            metrics['zone_times'] = zone_times
+            metrics['zone_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
+                                           for k, v in zone_times.items()}
+        Intervals.compute_hr_zones(df, zone_model, metrics)
 
         # ---- HR drift (split by elapsed time, not rows) ----
         if 'heartrate' in df.columns and df['heartrate'].notna().any():
@@ -231,10 +491,15 @@ class Intervals:
         metrics['segment_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
                                         for k, v in seg_times.items()}
 
+        # ---- Work intervals ----
+        if 'watts' in df.columns and df['watts'].notna().any() and ftp:
+            metrics['intervals'] = interval_detect.power_intervals(df, ftp)
+
         metrics['total_time'] = total_time
         return metrics
     
-    def compute_rough_guess_bike_metrics(self, df, ftp, metadata):
+    @staticmethod
+    def compute_rough_guess_bike_metrics(df, ftp, metadata, zone_model=None):
         df = df.copy()
 
         # 1) Clean 'time' and drop empty rows
@@ -326,16 +591,11 @@ class Intervals:
 
         # ----- Zones (best-effort) -----
         if avg_power_est is not None and ftp:
-            bins = [0, 0.55, 0.75, 0.90, 1.05, 1.20, float('inf')]
-            labels = ['Z1', 'Z2', 'Z3', 'Z4', 'Z5', 'Z6']
-            frac = avg_power_est / float(ftp)
+            power_zones = zone_model.power_zones(ftp) if zone_model is not None else zones.ZoneSet(
+                [edge * ftp for edge in zones.DEFAULT_POWER_ZONES])
             # Place the whole activity into the most-appropriate zone
-            zone_label = None
-            for i in range(len(bins)-1):
-                if frac >= bins[i] and frac < bins[i+1]:
-                    zone_label = labels[i]
-                    break
-            zone_times = {z: 0.0 for z in labels}
+            zone_label = power_zones.zone_of(avg_power_est)
+            zone_times = {z: 0.0 for z in power_zones.labels}
             if zone_label:
                 zone_times[zone_label] = total_time
             metrics['zone_times'] = zone_times
@@ -359,10 +619,14 @@ class Intervals:
         if 'heartrate' in df.columns and df['heartrate'].notna().any():
             # Use lactate threshold HR from metadata if available
             lthr = _get_meta_num(['lthr', 'icu_lthr', 'lactate_threshold_hr'])
+            if lthr is None and zone_model is not None:
+                lthr = zone_model.lthr
             hr = df['heartrate'].fillna(0)
             if lthr is not None:
                 rest_mask = hr < (0.6 * lthr)
                 hard_mask = hr > (0.9 * lthr)
+                # No power stream, so work intervals come from heart rate
+                metrics['intervals'] = interval_detect.heartrate_intervals(df, lthr)
             else:
                 # fall back to relative HR percentiles
                 rest_mask = hr < hr.quantile(0.25)
@@ -381,6 +645,7 @@ class Intervals:
                     seg_times['rest'] = float(total_time)
                     seg_times['hard'] = 0.0
 
+        Intervals.compute_hr_zones(df, zone_model, metrics)
         metrics['segment_times'] = seg_times
         metrics['segment_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
                                          for k, v in seg_times.items()}
@@ -389,7 +654,8 @@ class Intervals:
         metrics['estimate_method'] = 'rough_from_metadata_and_hr'
         return metrics
 
-    def compute_running_metrics(self, df, metadata):
+    @staticmethod
+    def compute_running_metrics(df, metadata, zone_model=None):
         # Running metrics: HR zones, HR drift, pace zones, cadence, elevation.
         # My end goal is cycling fitness, so running is complimentary.
         df = df.copy()
@@ -463,18 +729,16 @@ class Intervals:
             vel = df['velocity_smooth'].fillna(0)
             metrics['avg_velocity'] = float((vel * df['dt']).sum() / total_time) if total_time > 0 else None
             metrics['max_velocity'] = float(vel.max())
-            # Pace zones: Z1-Z5 by velocity percentiles
-            q20 = vel.quantile(0.20)
-            q40 = vel.quantile(0.40)
-            q60 = vel.quantile(0.60)
-            q80 = vel.quantile(0.80)
-            bins = [0, q20, q40, q60, q80, float('inf')]
-            labels = ['Z1', 'Z2', 'Z3', 'Z4', 'Z5']
-            z = pd.cut(vel, bins=bins, labels=labels, right=False)
-            pace_zones = df.groupby(z, observed=False)['dt'].sum().to_dict()
-            metrics['pace_zone_times'] = {k: float(v) for k, v in pace_zones.items()}
+            if zone_model is not None and zone_model.pace is not None:
+                pace_zone_set = zone_model.pace
+            else:
+                # No threshold pace set: Z1-Z5 by this activity's velocity percentiles
+                pace_zone_set = zones.ZoneSet([0] + list(vel.quantile([0.20, 0.40, 0.60, 0.80])))
+            pace_zones = pace_zone_set.histogram(vel.to_numpy(), df['dt'].to_numpy())
+            metrics['pace_zone_times'] = pace_zones
             metrics['pace_zone_percentages'] = {k: (float(v) / total_time * 100.0 if total_time > 0 else 0.0)
                                                for k, v in pace_zones.items()}
+            metrics['intervals'] = interval_detect.velocity_intervals(df)
 
         # ----- Cadence metrics -----
         metrics['avg_cadence'] = None
@@ -493,6 +757,8 @@ class Intervals:
         seg_times = {}
         if 'heartrate' in df.columns and df['heartrate'].notna().any():
             lthr = _get_meta_num(['lthr', 'icu_lthr', 'lactate_threshold_hr'])
+            if lthr is None and zone_model is not None:
+                lthr = zone_model.lthr
             hr = df['heartrate'].fillna(0)
             if lthr is not None:
                 # Easy: <75% LTHR, Steady: 75-90%, Hard: >90%
@@ -505,6 +771,7 @@ class Intervals:
                 seg_times['steady'] = float(df.loc[(hr >= hr.quantile(0.40)) & (hr <= hr.quantile(0.75)), 'dt'].sum())
                 seg_times['hard'] = float(df.loc[hr > hr.quantile(0.75), 'dt'].sum())
 
+        Intervals.compute_hr_zones(df, zone_model, metrics)
         metrics['segment_times'] = seg_times
         metrics['segment_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
                                          for k, v in seg_times.items()}
@@ -513,7 +780,8 @@ class Intervals:
         metrics['estimate_method'] = 'running_from_hr_and_velocity'
         return metrics
     
-    def compute_weightlifting_metrics(self, df, metadata):
+    @staticmethod
+    def compute_weightlifting_metrics(df, metadata, zone_model=None):
         # Weightlifting: minimal DF (time + HR only).
         # icu_training_load is the key metric for strength training effort.
         df = df.copy()
@@ -585,6 +853,8 @@ class Intervals:
         seg_times = {}
         if 'heartrate' in df.columns and df['heartrate'].notna().any():
             lthr = _get_meta_num(['lthr', 'icu_lthr', 'lactate_threshold_hr'])
+            if lthr is None and zone_model is not None:
+                lthr = zone_model.lthr
             hr = df['heartrate'].fillna(0)
             if lthr is not None:
                 # Easy: <70% LTHR, Moderate: 70-85%, Intense: >85%
@@ -600,6 +870,7 @@ class Intervals:
             # No HR data; mark as unknown intensity but still track total time
             seg_times['unknown'] = float(total_time)
 
+        Intervals.compute_hr_zones(df, zone_model, metrics)
         metrics['segment_times'] = seg_times
         metrics['segment_percentages'] = {k: (v / total_time * 100.0 if total_time > 0 else 0.0)
                                          for k, v in seg_times.items()}
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import garmin.profiling as profiling
+import garmin.ratelimit as ratelimit
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Job lanes: bulk work, and short jobs such as webhook ingests that shouldn't wait behind it
+BULK = "bulk"
+EXPRESS = "express"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+_local = threading.local()
+
+
+def current_job():
+    """The Job running on this thread, or None outside the job pool."""
+    return getattr(_local, "job", None)
+
+
+def check_cancelled():
+    """Raise JobCancelled if the job running on this thread was cancelled.
+
+    Long loops call this between items so a cancelled job stops at the next
+    activity or day instead of running to the end.
+    """
+    job = current_job()
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled(f"Job {job.id} was cancelled")
+
+
+class Job:
+    def __init__(self, name, fn, args, kwargs, lane=BULK):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+
+    def run(self):
+        if self.cancel_requested.is_set():
+            self.finish(CANCELLED)
+            return
+        self.status = RUNNING
+        self.started_at = time.time()
+        _local.job = self
+        profiling.begin(f"job:{self.name}")
+        try:
+            # Jobs are bulk work, live scrapes go ahead of them for upstream budget
+            with ratelimit.priority(ratelimit.BULK):
+                result = self.fn(*self.args, **self.kwargs)
+        except JobCancelled:
+            self.finish(CANCELLED)
+        except Exception as e:
+            print(f"Caught exception {e} running job {self.name} {self.id}")
+            self.error = str(e)
+            self.finish(FAILED)
+        else:
+            self.result = result
+            self.finish(DONE)
+        finally:
+            profiling.end()
+            _local.job = None
+
+    def finish(self, status):
+        self.status = status
+        self.finished_at = time.time()
+
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "lane": self.lane,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """Bounded executor for bulk work, kept apart from the HTTP server's threads.
+
+    Jobs are queued up to `max_queued` unfinished at a time per lane, further
+    submits raise QueueFull. Finished jobs are kept for `ttl` seconds so their
+    result can be fetched. Short jobs go in the express lane with
+    submit_express, which has its own `express_workers` threads, so they
+    don't wait behind a backfill.
+    """
+
+    def __init__(self, workers=None, max_queued=None, ttl=None, express_workers=None):
+        self.workers = workers or int(os.environ.get("JOB_WORKERS", 2))
+        self.express_workers = express_workers or int(os.environ.get("JOB_EXPRESS_WORKERS", 1))
+        self.max_queued = max_queued or int(os.environ.get("JOB_MAX_QUEUED", 16))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("JOB_RESULT_TTL", 3600))
+        self.executors = {
+            BULK: ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job"),
+            EXPRESS: ThreadPoolExecutor(max_workers=self.express_workers, thread_name_prefix="job-express"),
+        }
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name, fn, *args, **kwargs):
+        return self.enqueue(Job(name, fn, args, kwargs))
+
+    def submit_express(self, name, fn, *args, **kwargs):
+        return self.enqueue(Job(name, fn, args, kwargs, lane=EXPRESS))
+
+    def enqueue(self, job):
+        with self.lock:
+            self.prune()
+            pending = sum(1 for queued in self.jobs.values() if queued.lane == job.lane and not queued.finished())
+            if pending >= self.max_queued:
+                raise QueueFull(f"{pending} {job.lane} jobs are already queued")
+            self.jobs[job.id] = job
+            job.future = self.executors[job.lane].submit(job.run)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            self.prune()
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            self.prune()
+            return sorted(self.jobs.values(), key=lambda job: job.created_at)
+
+    def cancel(self, job_id):
+        """Cancel a job. Queued jobs never start, running ones stop at their next check."""
+        job = self.get(job_id)
+        if job is None or job.finished():
+            return job
+        job.cancel_requested.set()
+        if job.future.cancel():
+            job.finish(CANCELLED)
+        return job
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished() and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        for job in self.list():
+            self.cancel(job.id)
+        for executor in self.executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
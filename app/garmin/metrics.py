@@ -1,6 +1,8 @@
 from prometheus_client.core import Gauge
 from datetime import datetime 
 
+from garmin.rolling import RollingStats
+
 class Metrics(object):
     metrics = {}
     WORK_START = 9
@@ -79,8 +81,30 @@ class Metrics(object):
         "caloriesPerStep|Active calories burned per step"
     ]
 
+    # Daily metrics that also get rolling mean/stddev, EWMA and z-score gauges,
+    # so alert rules don't need avg_over_time over long ranges
+    rolling_metrics = [
+        "restingHeartRate",
+        "lastSevenDaysAvgRestingHeartRate",
+        "heartRateVariability",
+        "averageStressLevel",
+        "bodyBatteryDuringSleep",
+        "sleepingSeconds",
+        "activeSeconds",
+        "highlyActiveSeconds",
+    ]
+    rolling_windows = (3, 7)
+    rolling = {}
+    rolling_gauges = {}
+
     all_metrics = []
 
+    def catalogue(self):
+        """(name, description) of every daily gauge, in the order collect() registers them."""
+        groups = [self.heart_metrics, self.battery_metrics, self.stress_metrics, self.oxygen_metrics,
+                  self.active_metrics, self.misc_metrics, self.derived_metrics]
+        return [tuple(metric.split("|", 1)) for group in groups for metric in group]
+
     def collect(self):
         self.all_metrics.append(self.heart_metrics)
         self.all_metrics.append(self.battery_metrics)
@@ -93,9 +117,48 @@ class Metrics(object):
             for metric in metrics:
                 name = metric.split("|")[0]
                 desc = metric.split("|")[1]
-                self.metrics[name] = Gauge(name, desc, ["period"])
-
-    def populate_metrics(self, dailies):
+                self.metrics[name] = Gauge(name, desc, ["period", "athlete"])
+        for name in self.rolling_metrics:
+            self.rolling_gauges[name] = {
+                "mean": Gauge(f"{name}RollingMean", f"Rolling mean of daily {name}", ["period", "athlete", "window"]),
+                "stddev": Gauge(f"{name}RollingStddev", f"Rolling standard deviation of daily {name}", ["period", "athlete", "window"]),
+                "ewma": Gauge(f"{name}Ewma", f"Exponentially weighted moving average of daily {name}", ["period", "athlete"]),
+                "zscore": Gauge(f"{name}ZScore", f"Z-score of today's {name} against the last {max(self.rolling_windows)} days", ["period", "athlete"]),
+            }
+
+    def update_rolling(self, dailies, period, athlete="default"):
+        date = dailies.get("calendarDate")
+        date = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
+        for name in self.rolling_metrics:
+            val = dailies.get(name)
+            if val is None:
+                continue
+            stats = self.rolling.get((athlete, name))
+            if stats is None:
+                stats = RollingStats(self.rolling_windows)
+                self.rolling[(athlete, name)] = stats
+            stats.update(date, float(val))
+            gauges = self.rolling_gauges.get(name)
+            if gauges is None:
+                continue
+            for days, window in stats.windows.items():
+                labels = {"period": period, "athlete": athlete, "window": f"{days}d"}
+                gauges["mean"].labels(**labels).set(window.mean())
+                stddev = window.stddev()
+                if stddev is not None:
+                    gauges["stddev"].labels(**labels).set(stddev)
+            gauges["ewma"].labels(period=period, athlete=athlete).set(stats.ewma)
+            zscore = stats.zscore()
+            if zscore is not None:
+                gauges["zscore"].labels(period=period, athlete=athlete).set(zscore)
+
+    def seed_rolling(self, history, athlete="default"):
+        # Rebuild rolling state from stored dailies after a restart
+        period = "work" if self.is_work_hours(datetime.now()) else "off_work"
+        for dailies in sorted(history, key=lambda daily: daily.get("calendarDate") or ""):
+            self.update_rolling(dailies, period, athlete)
+
+    def populate_metrics(self, dailies, athlete="default"):
         now = datetime.now()
         period = "work" if self.is_work_hours(now) else "off_work"
         for metrics in self.all_metrics:
@@ -105,60 +168,62 @@ class Metrics(object):
                 if key in self.derived_metrics and  val is None:
                     print(f"Value for {key} is null")
                 if val is not None:
-                    self.metrics[key].labels(period=period).set(val)
+                    self.metrics[key].labels(period=period, athlete=athlete).set(val)
+
+        self.update_rolling(dailies, period, athlete)
 
         # Derived metrics
         active_seconds = dailies.get("activeSeconds", 0)
         sedentary_seconds = dailies.get("sedentarySeconds", 0)
         if active_seconds and sedentary_seconds:
             active_to_sedentary_ratio = active_seconds / sedentary_seconds
-            self.metrics["activeToSedentaryRatio"].labels(period=period).set(active_to_sedentary_ratio)
+            self.metrics["activeToSedentaryRatio"].labels(period=period, athlete=athlete).set(active_to_sedentary_ratio)
 
         highly_active_seconds = dailies.get("highlyActiveSeconds", 0)
         if active_seconds:
             highly_active_to_active_ratio = highly_active_seconds / active_seconds
-            self.metrics["highlyActiveToActiveRatio"].labels(period=period).set(highly_active_to_active_ratio)
+            self.metrics["highlyActiveToActiveRatio"].labels(period=period, athlete=athlete).set(highly_active_to_active_ratio)
 
         max_heart_rate = dailies.get("maxHeartRate", 0)
         min_heart_rate = dailies.get("minHeartRate", 0)
         if max_heart_rate and min_heart_rate:
             heart_rate_range = max_heart_rate - min_heart_rate
-            self.metrics["heartRateRange"].labels(period=period).set(heart_rate_range)
+            self.metrics["heartRateRange"].labels(period=period, athlete=athlete).set(heart_rate_range)
 
         resting_heart_rate = dailies.get("restingHeartRate", 0)
         if max_heart_rate and resting_heart_rate:
             resting_to_max_heart_rate_ratio = resting_heart_rate / max_heart_rate
-            self.metrics["restingToMaxHeartRateRatio"].labels(period=period).set(resting_to_max_heart_rate_ratio)
+            self.metrics["restingToMaxHeartRateRatio"].labels(period=period, athlete=athlete).set(resting_to_max_heart_rate_ratio)
 
         stress_duration = dailies.get("stressDuration", 0)
         if active_seconds:
             stress_to_active_ratio = stress_duration / active_seconds
-            self.metrics["stressToActiveRatio"].labels(period=period).set(stress_to_active_ratio)
+            self.metrics["stressToActiveRatio"].labels(period=period, athlete=athlete).set(stress_to_active_ratio)
 
         rest_stress_duration = dailies.get("restStressDuration", 0)
         if sedentary_seconds:
             stress_to_rest_ratio = rest_stress_duration / sedentary_seconds
-            self.metrics["stressToRestRatio"].labels(period=period).set(stress_to_rest_ratio)
+            self.metrics["stressToRestRatio"].labels(period=period, athlete=athlete).set(stress_to_rest_ratio)
 
         body_battery_high = dailies.get("bodyBatteryHighestValue", 0)
         body_battery_low = dailies.get("bodyBatteryLowestValue", 0)
         if body_battery_high and body_battery_low:
             body_battery_recovery = body_battery_high - body_battery_low
-            self.metrics["bodyBatteryRecovery"].labels(period=period).set(body_battery_recovery)
+            self.metrics["bodyBatteryRecovery"].labels(period=period, athlete=athlete).set(body_battery_recovery)
 
         average_spo2 = dailies.get("averageSpo2", 0)
         spo2_during_sleep = dailies.get("spo2DuringSleep", 0)
         if average_spo2 and spo2_during_sleep:
             spo2_drop_during_sleep = average_spo2 - spo2_during_sleep
-            self.metrics["spo2DropDuringSleep"].labels(period=period).set(spo2_drop_during_sleep)
+            self.metrics["spo2DropDuringSleep"].labels(period=period, athlete=athlete).set(spo2_drop_during_sleep)
 
         total_steps = dailies.get("totalSteps", 0)
         total_distance_meters = dailies.get("totalDistanceMeters", 0)
         if total_steps and total_distance_meters:
             steps_to_distance_ratio = total_steps / total_distance_meters
-            self.metrics["stepsToDistanceRatio"].labels(period=period).set(steps_to_distance_ratio)
+            self.metrics["stepsToDistanceRatio"].labels(period=period, athlete=athlete).set(steps_to_distance_ratio)
 
         active_kilocalories = dailies.get("activeKilocalories", 0)
         if total_steps:
             calories_per_step = active_kilocalories / total_steps
-            self.metrics["caloriesPerStep"].labels(period=period).set(calories_per_step)
\ No newline at end of file
+            self.metrics["caloriesPerStep"].labels(period=period, athlete=athlete).set(calories_per_step)
\ No newline at end of file
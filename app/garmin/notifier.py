@@ -0,0 +1,100 @@
+import os
+import queue
+import threading
+import time
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+
+class Notifier:
+    """Background Slack notifier.
+
+    Messages are put on a queue and posted by a single worker thread that
+    reuses one WebClient. Alerts of the same type are de-duplicated within
+    `dedup_seconds`, and failed posts are retried up to `max_retries` times.
+    """
+
+    def __init__(self, token=None, channel=None, base_url=None,
+                 dedup_seconds=None, max_retries=None, retry_backoff=1.0):
+        self.slack_auth_token = token or os.environ.get("SLACK_BOT_TOKEN")
+        self.slack_channel = channel or os.environ.get("SLACK_CHANNEL")
+        self.base_url = base_url or os.environ.get("SLACK_BASE_URL", "https://slack.com/api/")
+        if dedup_seconds is None:
+            dedup_seconds = float(os.environ.get("SLACK_DEDUP_SECONDS", 6 * 60 * 60))
+        if max_retries is None:
+            max_retries = int(os.environ.get("SLACK_MAX_RETRIES", 3))
+        self.dedup_seconds = dedup_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.client = WebClient(token=self.slack_auth_token, base_url=self.base_url)
+        self.queue = queue.Queue(maxsize=100)
+        self.last_sent = {}
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name="slack-notifier", daemon=True)
+                self.worker.start()
+
+    def notify(self, alert_type, msg):
+        """Queue `msg` unless an alert of the same type was queued recently.
+
+        Returns True if the message was queued.
+        """
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_sent.get(alert_type)
+            if last is not None and now - last < self.dedup_seconds:
+                print(f"Suppressing duplicate {alert_type} alert")
+                return False
+            self.last_sent[alert_type] = now
+        try:
+            self.queue.put_nowait((alert_type, msg))
+        except queue.Full:
+            print(f"Notification queue full, dropping {alert_type} alert")
+            return False
+        self.start()
+        return True
+
+    def run(self):
+        while True:
+            alert_type, msg = self.queue.get()
+            try:
+                self.post(alert_type, msg)
+            finally:
+                self.queue.task_done()
+
+    def post(self, alert_type, msg):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                result = self.client.chat_postMessage(channel=self.slack_channel, text=msg)
+                print(result)
+                return True
+            except SlackApiError as e:
+                print(f"Error: {e}")
+            except Exception as e:
+                print(f"Error posting {alert_type} alert (attempt {attempt}): {e}")
+            if attempt < self.max_retries:
+                time.sleep(self.retry_backoff * attempt)
+        # Let the next occurrence through rather than waiting out the window
+        with self.lock:
+            self.last_sent.pop(alert_type, None)
+        return False
+
+    def flush(self):
+        self.queue.join()
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = Notifier()
+        return _notifier
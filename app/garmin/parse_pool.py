@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from garmin.streams import to_frame
+
+# Metadata keys the compute_* methods read. Only these are sent to workers,
+# the full /api/v1/activity/{id} payload has hundreds of keys.
+METADATA_KEYS = [
+    "id", "type", "activity_date",
+    "icu_weighted_avg_watts", "icu_weighted_avg_power", "average_watts", "weighted_avg_watts", "average_power",
+    "icu_intensity", "icu_power_intensity", "intensity",
+    "icu_training_load", "training_load", "icu_tss", "tss",
+    "lthr", "icu_lthr", "lactate_threshold_hr",
+    "total_elevation_gain", "elevation_gain", "total_elevation_loss", "elevation_loss",
+    "distance", "icu_distance",
+]
+
+
+def compact_metadata(metadata):
+    return {key: metadata[key] for key in METADATA_KEYS if key in metadata}
+
+
+def parse_streams(streams, metadata, ftp, zone_model=None):
+    from garmin.intervals import Intervals
+    return Intervals.compute_metrics(to_frame(streams), metadata, ftp, zone_model)
+
+
+def warmup():
+    # Pay the pandas/NumPy and compute-path import cost once per worker, not on its first activity
+    import pandas
+    import garmin.intervals
+    parse_streams({"time": np.arange(3, dtype=np.float64), "heartrate": np.full(3, 120.0)},
+                  {"type": "WeightTraining", "activity_date": "1970-01-01"}, 200)
+
+
+class ParsePool:
+    """Runs activity parsing in worker processes so it isn't bound by the GIL."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warmup)
+
+    def submit(self, streams, metadata, ftp, zone_model=None):
+        return self.executor.submit(parse_streams, streams, compact_metadata(metadata), ftp, zone_model)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_in_process(streams, metadata, ftp, zone_model=None):
+    future = Future()
+    try:
+        future.set_result(parse_streams(streams, metadata, ftp, zone_model))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """The shared pool, or None when PARSE_WORKERS is unset or 0."""
+    global _pool
+    workers = int(os.environ.get("PARSE_WORKERS", 0))
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ParsePool(workers)
+        return _pool
+
+
+def submit(streams, metadata, ftp, zone_model=None):
+    pool = get_parse_pool()
+    if pool is None:
+        return parse_in_process(streams, metadata, ftp, zone_model)
+    return pool.submit(streams, metadata, ftp, zone_model)
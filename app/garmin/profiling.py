@@ -0,0 +1,154 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+# What each thread is working on, thread ident -> {"route", "activity_ids", "profile"}
+_context = {}
+
+
+def enabled():
+    return os.environ.get("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+
+
+class RequestProfiler:
+    """cProfile the next `count` requests or jobs, optionally only those under a route prefix.
+
+    Only one profile runs at a time. cProfile can't run two profilers at
+    once, and from Python 3.12 it hooks every thread, so a profile covers
+    the whole process: calls made by concurrent requests show up in it too.
+    Requests that arrive while one is running are not profiled and don't
+    use up the count.
+    """
+
+    def __init__(self, keep=None):
+        keep = keep or int(os.environ.get("PROFILE_KEEP", 20))
+        self.remaining = 0
+        self.prefix = None
+        self.profiles = deque(maxlen=keep)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.active = False
+
+    def arm(self, count, prefix=None):
+        with self.lock:
+            self.remaining = count
+            self.prefix = prefix
+
+    def start(self, route):
+        with self.lock:
+            if self.active or self.remaining <= 0 or (self.prefix and not route.startswith(self.prefix)):
+                return None
+            self.active = True
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this process
+            with self.lock:
+                self.active = False
+            return None
+        with self.lock:
+            self.remaining -= 1
+        return profile, time.monotonic()
+
+    def stop(self, handle, route, activity_ids):
+        profile, started = handle
+        try:
+            profile.disable()
+        finally:
+            with self.lock:
+                self.active = False
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+        stats.sort_stats("cumulative").print_stats(int(os.environ.get("PROFILE_TOP", 40)))
+        record = {
+            "id": next(self.ids),
+            "route": route,
+            "activity_ids": activity_ids,
+            "seconds": round(time.monotonic() - started, 4),
+            "pstats": output.getvalue(),
+        }
+        with self.lock:
+            self.profiles.append(record)
+        return record
+
+    def status(self):
+        with self.lock:
+            return {
+                "remaining": self.remaining,
+                "prefix": self.prefix,
+                "profiles": [{key: value for key, value in record.items() if key != "pstats"}
+                             for record in self.profiles],
+            }
+
+    def get(self, profile_id):
+        with self.lock:
+            return next((record for record in self.profiles if record["id"] == profile_id), None)
+
+
+profiler = RequestProfiler()
+
+
+def begin(route):
+    """Mark the current thread as handling `route`, profiling it if the profiler is armed."""
+    context = {"route": route, "activity_ids": [], "profile": None}
+    if enabled():
+        context["profile"] = profiler.start(route)
+    _context[threading.get_ident()] = context
+
+
+def end():
+    context = _context.pop(threading.get_ident(), None)
+    if context is not None and context["profile"] is not None:
+        profiler.stop(context["profile"], context["route"], context["activity_ids"])
+    return context
+
+
+def tag_activity(activity_id):
+    """Note that the current request or job is working on this activity."""
+    context = _context.get(threading.get_ident())
+    if context is not None:
+        context["activity_ids"].append(str(activity_id))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=0.01):
+    """Sample every thread's stack for `seconds`, returning collapsed stacks.
+
+    Each line is `frame;frame;...;frame count`, root first, as read by
+    flamegraph.pl and speedscope. Threads handling a request or job get it
+    as their root frame, with the activity ids they've touched.
+    """
+    own = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+            context = _context.get(ident)
+            if context is not None:
+                root = context["route"]
+                if context["activity_ids"]:
+                    root += f" [{','.join(context['activity_ids'][-5:])}]"
+            else:
+                root = names.get(ident, str(ident))
+            counts[";".join([root] + stack)] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
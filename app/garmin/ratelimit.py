@@ -0,0 +1,263 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LIVE = "live"
+BULK = "bulk"
+
+# Per-upstream defaults: requests per second, bucket size, most concurrent requests
+DEFAULTS = {
+    "garmin": {"rate": 2.0, "burst": 10, "max_concurrency": 4},
+    "intervals": {"rate": 5.0, "burst": 10, "max_concurrency": 8},
+}
+
+_local = threading.local()
+
+
+@contextmanager
+def priority(name):
+    """Run the enclosed upstream calls at `name` priority on this thread."""
+    previous = getattr(_local, "priority", None)
+    _local.priority = name
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    return getattr(_local, "priority", None) or LIVE
+
+
+def status_of(error):
+    """HTTP status carried by a requests or garth exception, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        response = getattr(getattr(error, "error", None), "response", None)
+    return getattr(response, "status_code", None)
+
+
+class Call:
+    def __init__(self):
+        self.status = None
+        self.retry_after = None
+
+
+class UpstreamLimiter:
+    """Shared request budget for one upstream API.
+
+    A token bucket caps the request rate. On top of it an AIMD concurrency
+    limit grows by one per limit's worth of fast successes, and halves on a
+    429, a 5xx or a failed connection; a 429 also pauses the bucket for its
+    Retry-After. Live callers are always let in ahead of waiting bulk ones,
+    and bulk calls only use `bulk_share` of the current limit so a slot is
+    left free for the live scrape.
+    """
+
+    def __init__(self, name, rate, burst, max_concurrency, min_concurrency=1, target_latency=None, bulk_share=0.75):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        if target_latency is None:
+            target_latency = float(os.environ.get("UPSTREAM_TARGET_LATENCY", 2.0))
+        self.target_latency = target_latency
+        self.bulk_share = bulk_share
+        self.limit = float(max(min_concurrency, max_concurrency / 2.0))
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.in_flight = {LIVE: 0, BULK: 0}
+        self.waiting = {LIVE: 0, BULK: 0}
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.cond = threading.Condition()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def concurrency_for(self, prio):
+        if prio == LIVE:
+            return max(1, int(self.limit))
+        return max(1, int(self.limit * self.bulk_share))
+
+    def can_start(self, prio, now):
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        if prio == BULK and self.waiting[LIVE]:
+            return False
+        return sum(self.in_flight.values()) < self.concurrency_for(prio)
+
+    def wait_time(self, now):
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        # Waiting for a slot, release() will notify
+        return 1.0
+
+    def acquire(self, prio):
+        with self.cond:
+            self.waiting[prio] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.refill(now)
+                    if self.can_start(prio, now):
+                        self.tokens -= 1
+                        self.in_flight[prio] += 1
+                        return now
+                    self.cond.wait(self.wait_time(now))
+            finally:
+                self.waiting[prio] -= 1
+
+    def try_acquire(self, prio):
+        """Take a slot if one is free now. Returns the start time, or the seconds to wait before retrying."""
+        with self.cond:
+            now = time.monotonic()
+            self.refill(now)
+            if self.can_start(prio, now):
+                self.tokens -= 1
+                self.in_flight[prio] += 1
+                return now, 0.0
+            return None, self.wait_time(now)
+
+    async def acquire_async(self, prio):
+        # Threads are woken by release(), an event loop can't wait on the condition so it polls
+        with self.cond:
+            self.waiting[prio] += 1
+        try:
+            while True:
+                started, wait = self.try_acquire(prio)
+                if started is not None:
+                    return started
+                await asyncio.sleep(min(wait, 0.05))
+        finally:
+            with self.cond:
+                self.waiting[prio] -= 1
+
+    def release(self, prio, started, status, retry_after=None):
+        now = time.monotonic()
+        latency = now - started
+        with self.cond:
+            self.in_flight[prio] -= 1
+            self.requests += 1
+            if status is None or status == 429 or status >= 500:
+                self.limit = max(self.min_concurrency, self.limit / 2.0)
+                if status == 429:
+                    self.throttled += 1
+                    self.paused_until = max(self.paused_until, now + (retry_after or 1.0))
+                    self.tokens = 0.0
+                else:
+                    self.errors += 1
+            elif latency > self.target_latency:
+                self.limit = max(self.min_concurrency, self.limit * 0.9)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, prio=None):
+        """Hold one request's worth of budget. Set `status` on the yielded Call."""
+        prio = prio or current_priority()
+        call = Call()
+        started = self.acquire(prio)
+        try:
+            yield call
+        except Exception as e:
+            self.release(prio, started, call.status or status_of(e), call.retry_after)
+            raise
+        self.release(prio, started, call.status or 200, call.retry_after)
+
+    @asynccontextmanager
+    async def slot_async(self, prio=None):
+        """slot() for coroutines, waiting without blocking the event loop."""
+        prio = prio or current_priority()
+        call = Call()
+        started = await self.acquire_async(prio)
+        try:
+            yield call
+        except Exception as e:
+            self.release(prio, started, call.status or status_of(e), call.retry_after)
+            raise
+        except asyncio.CancelledError:
+            # The caller went away, which says nothing about the upstream
+            self.release(prio, started, call.status or 200, call.retry_after)
+            raise
+        self.release(prio, started, call.status or 200, call.retry_after)
+
+    def state(self):
+        with self.cond:
+            self.refill(time.monotonic())
+            return {
+                "limit": self.limit,
+                "tokens": self.tokens,
+                "in_flight": dict(self.in_flight),
+                "waiting": dict(self.waiting),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+            }
+
+
+def retry_after(res):
+    value = res.headers.get("Retry-After") if res is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """The process-wide limiter for an upstream, configured from <NAME>_RATE_LIMIT, <NAME>_BURST
+    and <NAME>_MAX_CONCURRENCY."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            defaults = DEFAULTS.get(name, DEFAULTS["intervals"])
+            prefix = name.upper()
+            limiter = UpstreamLimiter(
+                name,
+                rate=float(os.environ.get(f"{prefix}_RATE_LIMIT", defaults["rate"])),
+                burst=int(os.environ.get(f"{prefix}_BURST", defaults["burst"])),
+                max_concurrency=int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", defaults["max_concurrency"])))
+            _limiters[name] = limiter
+        return limiter
+
+
+class LimiterCollector:
+    """Exports every limiter's state on /metrics."""
+
+    def collect(self):
+        with _limiters_lock:
+            limiters = sorted(_limiters.values(), key=lambda limiter: limiter.name)
+        limit = GaugeMetricFamily("upstreamConcurrencyLimit", "Current AIMD concurrency limit", labels=["upstream"])
+        tokens = GaugeMetricFamily("upstreamTokens", "Requests left in the token bucket", labels=["upstream"])
+        in_flight = GaugeMetricFamily("upstreamInFlight", "Upstream requests in flight", labels=["upstream", "priority"])
+        waiting = GaugeMetricFamily("upstreamWaiting", "Callers waiting for upstream budget", labels=["upstream", "priority"])
+        requests = CounterMetricFamily("upstreamRequests", "Upstream requests made", labels=["upstream"])
+        throttled = CounterMetricFamily("upstreamThrottled", "Upstream requests answered with 429", labels=["upstream"])
+        errors = CounterMetricFamily("upstreamErrors", "Upstream requests that failed with a 5xx or no response",
+                                     labels=["upstream"])
+        for limiter in limiters:
+            state = limiter.state()
+            limit.add_metric([limiter.name], state["limit"])
+            tokens.add_metric([limiter.name], state["tokens"])
+            for prio in (LIVE, BULK):
+                in_flight.add_metric([limiter.name, prio], state["in_flight"][prio])
+                waiting.add_metric([limiter.name, prio], state["waiting"][prio])
+            requests.add_metric([limiter.name], state["requests"])
+            throttled.add_metric([limiter.name], state["throttled"])
+            errors.add_metric([limiter.name], state["errors"])
+        yield from (limit, tokens, in_flight, waiting, requests, throttled, errors)
@@ -0,0 +1,113 @@
+"""Prometheus recording rules generated from the gauges defined in Metrics.
+
+    python -m garmin.recording_rules > ../helm/templates/garmin-recording-rules.yaml
+
+The gauges in WINDOW_METRICS get `athlete:<name>:avg_over_time_<window>` for
+each of their windows, and every rolling metric `athlete:<name>:ratio_to_mean_<window>`
+against its in-app rolling mean. Window rules are opt-in: each one is a
+range query Prometheus evaluates every interval, so only add a metric once a
+dashboard or alert uses its trend. The `period` label is aggregated away, so a
+metric keeps one series per athlete when the scrape moves between work and
+off-work hours. Regenerate after adding a metric; test_recording_rules fails
+until the checked-in file matches.
+"""
+import json
+import sys
+
+from garmin.metrics import Metrics
+
+RULE_WINDOWS = ("7d", "30d")
+# Daily gauges whose averages over time are recorded, with their windows
+WINDOW_METRICS = {
+    "restingHeartRate": RULE_WINDOWS,
+    "heartRateVariability": RULE_WINDOWS,
+    "averageStressLevel": RULE_WINDOWS,
+    "bodyBatteryDuringSleep": RULE_WINDOWS,
+    "sleepingSeconds": RULE_WINDOWS,
+    "activeSeconds": ("7d",),
+}
+GROUP_INTERVAL = "5m"
+
+
+def record_name(metric, operation):
+    return f"athlete:{metric}:{operation}"
+
+
+def window_rules(catalogue, window_metrics=WINDOW_METRICS):
+    known = {name for name, _ in catalogue}
+    unknown = sorted(set(window_metrics) - known)
+    if unknown:
+        raise ValueError(f"No daily gauge named {', '.join(unknown)}")
+    rules = []
+    for name, _ in catalogue:
+        for window in window_metrics.get(name, ()):
+            rules.append({"record": record_name(name, f"avg_over_time_{window}"),
+                          "expr": f"avg by (athlete) (avg_over_time({name}[{window}]))"})
+    return rules
+
+
+def rolling_rules(rolling_metrics, rolling_windows):
+    rules = []
+    for name in rolling_metrics:
+        for days in rolling_windows:
+            mean = f'{name}RollingMean{{window="{days}d"}}'
+            rules.append({"record": record_name(name, f"ratio_to_mean_{days}d"),
+                          "expr": f"max by (athlete) ({name}) / max by (athlete) ({mean})"})
+    return rules
+
+
+def build_rules(metrics=None, window_metrics=WINDOW_METRICS):
+    """The PrometheusRule resource, as a dict."""
+    metrics = metrics or Metrics()
+    return {
+        "apiVersion": "monitoring.coreos.com/v1",
+        "kind": "PrometheusRule",
+        "metadata": {
+            "name": "garmin-recording-rules",
+            "namespace": "monitoring",
+            "labels": {"release": "kube-prom-stack"},
+        },
+        "spec": {
+            "groups": [
+                {"name": "garmin-daily-windows", "interval": GROUP_INTERVAL,
+                 "rules": window_rules(metrics.catalogue(), window_metrics)},
+                {"name": "garmin-rolling-ratios", "interval": GROUP_INTERVAL,
+                 "rules": rolling_rules(metrics.rolling_metrics, metrics.rolling_windows)},
+            ],
+        },
+    }
+
+
+def to_yaml(resource):
+    """Render the resource as YAML. Strings are JSON-quoted, which YAML reads as double-quoted scalars."""
+    lines = ["# Generated by `python -m garmin.recording_rules`, do not edit by hand"]
+
+    def scalar(value):
+        return json.dumps(value, ensure_ascii=False)
+
+    def emit(value, indent, prefix=""):
+        pad = " " * indent
+        if isinstance(value, dict):
+            first = True
+            for key, item in value.items():
+                lead = prefix if first else " " * len(prefix)
+                first = False
+                if isinstance(item, (dict, list)):
+                    lines.append(f"{pad}{lead}{key}:")
+                    emit(item, indent + len(prefix) + 2)
+                else:
+                    lines.append(f"{pad}{lead}{key}: {scalar(item)}")
+        else:
+            for item in value:
+                emit(item, indent, "- ")
+
+    emit(resource, 0)
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    sys.stdout.write(to_yaml(build_rules()))
+
+
+if __name__ == "__main__":
+    main()
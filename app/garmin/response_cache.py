@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from flask import request
+
+
+class ResponseCache:
+    """Short-lived cache of route responses with single-flight coalescing.
+
+    Entries are keyed by path plus sorted query args. While a key is being
+    computed, identical requests wait on the same Future instead of starting
+    their own fetch-and-parse. Expired entries are dropped as new ones are
+    stored, and at most `maxsize` are kept, evicting the least recently used.
+    """
+
+    def __init__(self, ttl=None, maxsize=None):
+        if ttl is None:
+            ttl = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+        self.ttl = ttl
+        self.maxsize = maxsize or int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 256))
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def make_key(self, path=None, args=None):
+        """Key for a path and its (name, value) args, by default the current Flask request's."""
+        if path is None:
+            path, args = request.path, request.args.items(multi=True)
+        return path + "?" + "&".join(f"{k}={v}" for k, v in sorted(args))
+
+    def claim(self, key):
+        """(value, None, False) on a hit, else (None, future, leader). The leader computes and settles the future."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(key)
+                    return entry[1], None, False
+                del self.entries[key]
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.inflight[key] = future
+        return None, future, leader
+
+    def settle(self, key, future, value=None, error=None):
+        with self.lock:
+            if error is None:
+                now = time.monotonic()
+                for expired in [k for k, (expires, _) in self.entries.items() if expires <= now]:
+                    del self.entries[expired]
+                self.entries[key] = (now + self.ttl, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+            self.inflight.pop(key, None)
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key, compute):
+        value, future, leader = self.claim(key)
+        if future is None:
+            return value
+        if not leader:
+            return future.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, value)
+        return value
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute for coroutines, sharing entries and in-flight computations with the threads."""
+        value, future, leader = self.claim(key)
+        if future is None:
+            return value
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await compute()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, value)
+        return value
+
+    def purge(self, prefix=None):
+        with self.lock:
+            if prefix is None:
+                count = len(self.entries)
+                self.entries.clear()
+                return count
+            keys = [key for key in self.entries if key.startswith(prefix)]
+            for key in keys:
+                del self.entries[key]
+            return len(keys)
+
+    def cached(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            return self.get_or_compute(self.make_key(), lambda: view(*args, **kwargs))
+        return wrapper
@@ -0,0 +1,83 @@
+import datetime
+import math
+from collections import deque
+
+
+class RollingWindow:
+    """Mean and standard deviation of one value per day over the last `days` days.
+
+    Running sums make every update O(1). Updating the newest day again (the
+    daily scrape runs several times a day) replaces its value rather than
+    adding a new sample.
+    """
+
+    def __init__(self, days):
+        self.days = days
+        self.dates = deque()
+        self.values = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, date, value):
+        if self.dates and date < self.dates[-1]:
+            return
+        if self.dates and date == self.dates[-1]:
+            old = self.values.pop()
+            self.dates.pop()
+            self.total -= old
+            self.total_sq -= old * old
+        self.dates.append(date)
+        self.values.append(value)
+        self.total += value
+        self.total_sq += value * value
+        oldest = date - datetime.timedelta(days=self.days - 1)
+        while self.dates[0] < oldest:
+            self.dates.popleft()
+            old = self.values.popleft()
+            self.total -= old
+            self.total_sq -= old * old
+
+    def count(self):
+        return len(self.values)
+
+    def mean(self):
+        return self.total / len(self.values) if self.values else None
+
+    def stddev(self):
+        n = len(self.values)
+        if n < 2:
+            return None
+        variance = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(variance, 0.0))
+
+
+class RollingStats:
+    """Rolling windows, an EWMA and a z-score for one daily metric."""
+
+    def __init__(self, windows=(3, 7), span=7):
+        self.windows = {days: RollingWindow(days) for days in windows}
+        self.alpha = 2.0 / (span + 1)
+        self.last_date = None
+        self.ewma_before = None
+        self.ewma = None
+        self.value = None
+
+    def update(self, date, value):
+        if self.last_date is not None and date < self.last_date:
+            return
+        if date != self.last_date:
+            # A new day, the current EWMA becomes the base for today's value
+            self.ewma_before = self.ewma
+            self.last_date = date
+        self.ewma = value if self.ewma_before is None else self.ewma_before + self.alpha * (value - self.ewma_before)
+        self.value = value
+        for window in self.windows.values():
+            window.update(date, value)
+
+    def zscore(self):
+        window = self.windows[max(self.windows)]
+        mean = window.mean()
+        stddev = window.stddev()
+        if mean is None or not stddev:
+            return None
+        return (self.value - mean) / stddev
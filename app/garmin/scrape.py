@@ -3,47 +3,88 @@ import os
 from datetime import timedelta
 
 import garth
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+
+from garmin.athletes import Athlete
+import garmin.jobs as jobs
+import garmin.ratelimit as ratelimit
+from garmin.notifier import get_notifier
+from garmin.store import DailyStore
 
 
 class Scrape():
     slack_channel = ""
     slack_user_id = ""
     slack_auth_token = ""
-    def __init__(self):
+    def __init__(self, athlete=None):
+        self.athlete = athlete or Athlete.from_env()
         self.slack_channel = os.environ.get("SLACK_CHANNEL")
-        self.slack_user_id = os.environ.get("SLACK_USER_ID")
+        self.slack_user_id = self.athlete.slack_user_id
         self.slack_auth_token = os.environ.get("SLACK_BOT_TOKEN")
+        self.notifier = get_notifier()
+        garth_folder = self.athlete.garth_folder
+        self.store = DailyStore(garth_folder) if garth_folder else None
+
+    def connectapi(self, path, **kwargs):
+        # Looked up on each call so the default athlete follows garth's global client
+        client = self.athlete.client if self.athlete.client is not None else garth
+        with ratelimit.get_limiter("garmin").slot():
+            return client.connectapi(path, **kwargs)
+
     def get_daily_data(self):
         date = datetime.datetime.now()
         date_str = date.strftime('%Y-%m-%d')
         params = {
             'calendarDate': date_str
         }
-        dailies = garth.connectapi(f"/usersummary-service/usersummary/daily", params=params)
-        devices = garth.connectapi("/device-service/deviceregistration/devices")
+        dailies = self.connectapi(f"/usersummary-service/usersummary/daily", params=params)
+        devices = self.connectapi("/device-service/deviceregistration/devices")
         for device in devices:
             if device["displayName"] == "main-watch":
                 deviceId = device["deviceId"]
-                device_data = garth.connectapi(f"device-service/deviceservice/user-device/{deviceId}")
+                device_data = self.connectapi(f"device-service/deviceservice/user-device/{deviceId}")
                 sync_time = device_data["lastUploadTimestamp"]
                 dailies["lastUploadSyncTime"] = sync_time
+        if self.store is not None:
+            self.store.upsert(dailies, calendar_date=date_str)
         return dailies
 
     def get_historical_data(self, days):
-        historical_data = []
+        return self.get_dailies(self.get_backfill_dates(days))
+
+    def get_backfill_dates(self, days):
         current_date = datetime.datetime.today()
+        dates = []
         for day in [day for day in range(days) if day != 0]:
             backfill_date = current_date - timedelta(days=day)
-            date_str = backfill_date.strftime('%Y-%m-%d')
+            dates.append(backfill_date.strftime('%Y-%m-%d'))
+        return dates
+
+    def get_dailies(self, dates):
+        stored = self.store.get_final(dates) if self.store is not None else {}
+        if stored:
+            print(f"Found {len(stored)} of {len(dates)} days in the local store")
+        historical_data = []
+        fetched = []
+        for date_str in dates:
+            jobs.check_cancelled()
+            if date_str in stored:
+                historical_data.append(stored[date_str])
+                continue
             params = {
                 'calendarDate': date_str
             }
-            daily_summary = garth.connectapi(f"/usersummary-service/usersummary/daily", params=params)
+            daily_summary = self.connectapi(f"/usersummary-service/usersummary/daily", params=params)
             historical_data.append(daily_summary)
+            fetched.append((date_str, daily_summary))
+        if self.store is not None and fetched:
+            self.store.upsert_many(fetched)
         return historical_data
 
+    def get_stored_history(self, start, end):
+        if self.store is None:
+            return []
+        return self.store.get_range(start, end)
+
     def check_last_sync(self, dailies):
         scrape_time = datetime.datetime.now()
         if dailies["lastUploadSyncTime"]:
@@ -53,12 +94,8 @@ class Scrape():
             is_sync_stale = time_difference > datetime.timedelta(hours=4)
             msg = f"@{self.slack_user_id} Stale watch sync. Time difference between scrape & last sync is {time_difference}"
             if is_sync_stale:
-                self.send_message(msg)
-                
-    def send_message(self, msg):
-        client = WebClient(token=self.slack_auth_token)
-        try:
-            result = client.chat_postMessage(channel=self.slack_channel, text=msg)
-            print(result)
-        except SlackApiError as e:
-            print(f"Error: {e}")
\ No newline at end of file
+                self.send_message(msg, alert_type=f"stale_sync:{self.athlete.name}")
+
+    def send_message(self, msg, alert_type="general"):
+        # Only enqueues - the notifier posts from its own thread
+        return self.notifier.notify(alert_type, msg)
@@ -0,0 +1,309 @@
+import datetime
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+import orjson
+
+from garmin.activity import ActivitySummary, dumps
+
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST")
+
+
+def journal_mode():
+    """SQLITE_JOURNAL_MODE, by default WAL unless replicas may share the volume.
+
+    WAL keeps its index in shared memory, which only works between processes
+    on one host. Replicas sharing a ReadWriteMany volume get a rollback
+    journal instead, and even then the volume must not be a network
+    filesystem (NFS, SMB) whose locks SQLite can't rely on.
+    """
+    mode = os.environ.get("SQLITE_JOURNAL_MODE")
+    if mode:
+        mode = mode.upper()
+        if mode not in JOURNAL_MODES:
+            raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {', '.join(JOURNAL_MODES)}, not {mode}")
+        return mode
+    if os.environ.get("CLUSTER_FOLDER") or int(os.environ.get("SCHEDULER_INTERVAL") or 0):
+        return "DELETE"
+    return "WAL"
+
+
+class SqliteStore:
+    """Base for the SQLite stores kept in GARTH_FOLDER."""
+
+    schema = []
+
+    def __init__(self, folder, filename):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, filename)
+        self.journal_mode = journal_mode()
+        with closing(self.connect()) as conn:
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        # NORMAL is only crash-safe with WAL
+        conn.execute("PRAGMA synchronous=NORMAL" if self.journal_mode == "WAL" else "PRAGMA synchronous=FULL")
+        return conn
+
+
+class DailyStore(SqliteStore):
+    """SQLite store of daily summaries, keyed by calendar date.
+
+    Lives in GARTH_FOLDER next to the oauth tokens. A snapshot taken on its
+    own calendar date may still change, so only snapshots fetched after the
+    day ended are treated as final when deciding what needs re-fetching.
+    """
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS dailies ("
+        " calendar_date TEXT PRIMARY KEY,"
+        " data TEXT NOT NULL,"
+        " fetched_at TEXT NOT NULL"
+        ") WITHOUT ROWID",
+    ]
+
+    def __init__(self, folder, filename="dailies.db"):
+        super().__init__(folder, filename)
+
+    def upsert(self, daily, calendar_date=None, fetched_at=None):
+        calendar_date = calendar_date or daily.get("calendarDate")
+        if calendar_date is None:
+            print("Daily summary has no calendarDate, not storing it")
+            return
+        self.upsert_many([(calendar_date, daily)], fetched_at)
+
+    def upsert_many(self, dailies, fetched_at=None):
+        fetched_at = fetched_at or datetime.datetime.now().isoformat(timespec="seconds")
+        rows = [(date, json.dumps(daily), fetched_at) for date, daily in dailies]
+        with closing(self.connect()) as conn:
+            conn.executemany(
+                "INSERT INTO dailies (calendar_date, data, fetched_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(calendar_date) DO UPDATE SET data=excluded.data, fetched_at=excluded.fetched_at",
+                rows)
+            conn.commit()
+
+    def get_range(self, start, end):
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT data FROM dailies WHERE calendar_date BETWEEN ? AND ? ORDER BY calendar_date",
+                (start, end)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_final(self, dates):
+        """Return {date: daily} for the dates that have a final snapshot."""
+        if not dates:
+            return {}
+        found = {}
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT calendar_date, data, fetched_at FROM dailies WHERE calendar_date BETWEEN ? AND ?",
+                (min(dates), max(dates))).fetchall()
+        wanted = set(dates)
+        for calendar_date, data, fetched_at in rows:
+            if calendar_date in wanted and fetched_at[:10] > calendar_date:
+                found[calendar_date] = json.loads(data)
+        return found
+
+    def missing_dates(self, dates):
+        final = self.get_final(dates)
+        return [date for date in dates if date not in final]
+
+
+# Summary fields copied into their own indexed columns, so queries can filter on them without decoding rows
+INDEXED_FIELDS = ("tss", "normalized_power", "training_load", "total_time")
+QUERY_OPS = ("=", "!=", "<", "<=", ">", ">=")
+# Paths already migrated by this process, stores are opened per request
+_migrated = set()
+
+
+class ActivityStore(SqliteStore):
+    """SQLite store of parsed ActivitySummary records, keyed by intervals.icu activity id.
+
+    Metrics depend on the FTP they were parsed with, so a stored activity
+    only counts as a hit when its FTP matches the current one. Date, type
+    and the INDEXED_FIELDS metrics are indexed columns for query().
+    """
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS activities ("
+        " activity_id TEXT PRIMARY KEY,"
+        " activity_date TEXT,"
+        " activity_type TEXT,"
+        " ftp INTEGER,"
+        " data TEXT NOT NULL,"
+        " parsed_at TEXT NOT NULL"
+        ") WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS activities_date ON activities (activity_date)",
+    ]
+
+    def __init__(self, folder, filename="activities.db"):
+        super().__init__(folder, filename)
+        if self.path not in _migrated:
+            self.migrate()
+            _migrated.add(self.path)
+
+    def migrate(self):
+        """Add the indexed metric columns to stores created before them, filled from the stored data."""
+        with closing(self.connect()) as conn:
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(activities)")}
+            added = [field for field in INDEXED_FIELDS if field not in existing]
+            for field in added:
+                conn.execute(f"ALTER TABLE activities ADD COLUMN {field} REAL")
+            if added:
+                rows = conn.execute("SELECT activity_id, data FROM activities").fetchall()
+                values = []
+                for activity_id, data in rows:
+                    metrics = orjson.loads(data)
+                    values.append(tuple(metrics.get(field) for field in INDEXED_FIELDS) + (activity_id,))
+                conn.executemany(
+                    f"UPDATE activities SET {', '.join(f'{field} = ?' for field in INDEXED_FIELDS)} "
+                    "WHERE activity_id = ?", values)
+            conn.execute("CREATE INDEX IF NOT EXISTS activities_type_date ON activities (activity_type, activity_date)")
+            for field in INDEXED_FIELDS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS activities_{field} ON activities ({field})")
+            conn.commit()
+
+    def upsert(self, activity_id, summary, ftp=None):
+        parsed_at = datetime.datetime.now().isoformat(timespec="seconds")
+        columns = ", ".join(INDEXED_FIELDS)
+        updates = ", ".join(f"{field}=excluded.{field}" for field in INDEXED_FIELDS)
+        with closing(self.connect()) as conn:
+            conn.execute(
+                f"INSERT INTO activities (activity_id, activity_date, activity_type, ftp, data, parsed_at, {columns}) "
+                f"VALUES (?, ?, ?, ?, ?, ?{', ?' * len(INDEXED_FIELDS)}) "
+                "ON CONFLICT(activity_id) DO UPDATE SET activity_date=excluded.activity_date, "
+                "activity_type=excluded.activity_type, ftp=excluded.ftp, data=excluded.data, "
+                f"parsed_at=excluded.parsed_at, {updates}",
+                (str(activity_id), summary.get("date"), summary.get("type"), ftp,
+                 dumps(summary), parsed_at) + tuple(summary.get(field) for field in INDEXED_FIELDS))
+            conn.commit()
+
+    def get(self, activity_id, ftp=None):
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT data, ftp FROM activities WHERE activity_id = ?", (str(activity_id),)).fetchone()
+        if row is None or (ftp is not None and row[1] != ftp):
+            return None
+        return ActivitySummary.from_metrics(orjson.loads(row[0]))
+
+    def delete(self, activity_id):
+        with closing(self.connect()) as conn:
+            conn.execute("DELETE FROM activities WHERE activity_id = ?", (str(activity_id),))
+            conn.commit()
+
+    def missing(self, activity_ids, ftp=None):
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT activity_id, ftp FROM activities").fetchall()
+        stored = {activity_id for activity_id, stored_ftp in rows if ftp is None or stored_ftp == ftp}
+        return [activity_id for activity_id in activity_ids if str(activity_id) not in stored]
+
+    def get_range(self, start, end):
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT data FROM activities WHERE activity_date BETWEEN ? AND ? ORDER BY activity_date",
+                (start, end)).fetchall()
+        return [ActivitySummary.from_metrics(orjson.loads(row[0])) for row in rows]
+
+
+    def query(self, start=None, end=None, types=None, conditions=(), with_data=True, descending=False, limit=None):
+        """Rows matching the filters, in date order, using only the indexed columns.
+
+        `conditions` are (field, op, value) on INDEXED_FIELDS. Each row is a
+        dict of activity_id, date, type and the indexed fields, plus the
+        decoded summary under "data" when `with_data` is set.
+        """
+        where = []
+        params = []
+        if start is not None:
+            where.append("activity_date >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("activity_date <= ?")
+            params.append(end)
+        if types:
+            where.append(f"activity_type IN ({', '.join('?' * len(types))})")
+            params.extend(types)
+        for field, op, value in conditions:
+            if field not in INDEXED_FIELDS or op not in QUERY_OPS:
+                raise ValueError(f"Can't filter on {field} {op}")
+            where.append(f"{field} {op} ?")
+            params.append(value)
+        columns = ["activity_id", "activity_date", "activity_type"] + list(INDEXED_FIELDS)
+        sql = f"SELECT {', '.join(columns + (['data'] if with_data else []))} FROM activities"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY activity_date {'DESC' if descending else 'ASC'}, activity_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with closing(self.connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        names = ["activity_id", "date", "type"] + list(INDEXED_FIELDS)
+        results = []
+        for row in rows:
+            result = dict(zip(names, row))
+            if with_data:
+                result["data"] = orjson.loads(row[-1])
+            results.append(result)
+        return results
+
+
+class BackfillManifest(SqliteStore):
+    """SQLite record of the (date, metric) pairs already written as backfill blocks."""
+
+    schema = [
+        "CREATE TABLE IF NOT EXISTS backfill ("
+        " calendar_date TEXT NOT NULL,"
+        " metric TEXT NOT NULL,"
+        " exported_at TEXT NOT NULL,"
+        " PRIMARY KEY (calendar_date, metric)"
+        ") WITHOUT ROWID",
+    ]
+
+    def __init__(self, folder, filename="backfill.db"):
+        super().__init__(folder, filename)
+
+    def mark(self, plan, exported_at=None):
+        """Record {date: [metric, ...]} as exported."""
+        exported_at = exported_at or datetime.datetime.now().isoformat(timespec="seconds")
+        rows = [(date, metric, exported_at) for date, metrics in plan.items() for metric in metrics]
+        with closing(self.connect()) as conn:
+            conn.executemany(
+                "INSERT INTO backfill (calendar_date, metric, exported_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(calendar_date, metric) DO UPDATE SET exported_at=excluded.exported_at",
+                rows)
+            conn.commit()
+
+    def exported(self, start, end):
+        """Return {date: {metric, ...}} for everything exported between start and end."""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT calendar_date, metric FROM backfill WHERE calendar_date BETWEEN ? AND ?",
+                (start, end)).fetchall()
+        exported = {}
+        for date, metric in rows:
+            exported.setdefault(date, set()).add(metric)
+        return exported
+
+    def ranges(self):
+        """Contiguous exported date ranges per metric, as {metric: [(start, end), ...]}."""
+        with closing(self.connect()) as conn:
+            rows = conn.execute(
+                "SELECT metric, calendar_date FROM backfill ORDER BY metric, calendar_date").fetchall()
+        ranges = {}
+        one_day = datetime.timedelta(days=1)
+        for metric, date in rows:
+            day = datetime.date.fromisoformat(date)
+            metric_ranges = ranges.setdefault(metric, [])
+            if metric_ranges and metric_ranges[-1][1] + one_day == day:
+                metric_ranges[-1][1] = day
+            else:
+                metric_ranges.append([day, day])
+        return {metric: [(start.isoformat(), end.isoformat()) for start, end in metric_ranges]
+                for metric, metric_ranges in ranges.items()}
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# The stream columns the parsers use. Anything else in streams.csv (latlng,
+# temp, grade_smooth, ...) is never read. Time stays float64 so long
+# activities keep exact second offsets; the rest fit comfortably in float32.
+STREAM_SCHEMA = {
+    "time": np.float64,
+    "watts": np.float32,
+    "cadence": np.float32,
+    "heartrate": np.float32,
+    "velocity_smooth": np.float32,
+    "fixed_altitude": np.float32,
+    "distance": np.float32,
+}
+
+CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 100000))
+
+
+def read_streams(filepath, chunk_rows=None):
+    """Read the known columns of a streams.csv into {column: array}.
+
+    The file is read `chunk_rows` rows at a time and each chunk is cut down
+    to compact arrays straight away, so a multi-day stream never exists as
+    one wide DataFrame. Values that aren't numbers become NaN.
+    """
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    try:
+        return read_chunks(filepath, chunk_rows, coerce=False)
+    except ValueError:
+        # A stray non-numeric value, parse as text and coerce instead
+        return read_chunks(filepath, chunk_rows, coerce=True)
+
+
+def read_chunks(filepath, chunk_rows, coerce):
+    columns = [col for col in pd.read_csv(filepath, nrows=0).columns if col in STREAM_SCHEMA]
+    if not columns:
+        return {}
+    dtype = str if coerce else {col: STREAM_SCHEMA[col] for col in columns}
+    chunks = {}
+    reader = pd.read_csv(filepath, usecols=columns, dtype=dtype, chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            for col in chunk.columns:
+                values = chunk[col]
+                if coerce:
+                    values = pd.to_numeric(values, errors="coerce")
+                chunks.setdefault(col, []).append(values.to_numpy(dtype=STREAM_SCHEMA[col]))
+    if not chunks:
+        # Header only
+        return {col: np.empty(0, dtype=STREAM_SCHEMA[col]) for col in columns}
+    return {col: np.concatenate(parts) for col, parts in chunks.items()}
+
+
+def to_frame(streams):
+    # Parsers work in float64 so results don't depend on the storage dtype
+    return pd.DataFrame({col: values.astype(np.float64) for col, values in streams.items()})
+
+
+class StreamCache:
+    """Stream arrays kept as .npz files in GARTH_FOLDER/streams, one per activity.
+
+    Streams don't change once recorded, so an activity is only downloaded
+    once however often it's charted. Once the folder grows past `max_bytes`
+    the least recently used files are evicted; every load touches the file's
+    mtime.
+    """
+
+    def __init__(self, folder, max_bytes=None):
+        self.folder = os.path.join(folder, "streams")
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("STREAM_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+        self.max_bytes = max_bytes
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, activity_id):
+        return os.path.join(self.folder, f"activity-{activity_id}.npz")
+
+    def load(self, activity_id):
+        path = self.path(activity_id)
+        try:
+            with np.load(path) as data:
+                streams = {col: data[col] for col in data.files}
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return streams
+
+    def save(self, activity_id, streams):
+        path = self.path(activity_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **streams)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def entries(self):
+        """{path: (last used, bytes)} of every cached activity."""
+        entries = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if not entry.name.endswith(".npz"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries[entry.path] = (stat.st_mtime, stat.st_size)
+        return entries
+
+    def evict(self):
+        # Instances are short-lived and replicas share the folder, so it's recounted
+        # on every save. Trims to 90% so it doesn't evict on every save once full.
+        entries = self.entries()
+        size = sum(nbytes for _, nbytes in entries.values())
+        if size <= self.max_bytes:
+            return
+        for path, (_, nbytes) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= nbytes
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from garmin.activity import ActivitySummary, dumps
+from garmin.intervals import Intervals
+
+
+def ride_frame(seconds=600):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        "time": np.arange(seconds),
+        "watts": rng.integers(100, 350, seconds).astype(float),
+        "cadence": rng.integers(70, 100, seconds).astype(float),
+        "heartrate": rng.integers(120, 170, seconds).astype(float),
+        "velocity_smooth": rng.uniform(2, 12, seconds),
+    })
+
+
+class TestActivitySummary(unittest.TestCase):
+    def assert_round_trip(self, metrics):
+        summary = ActivitySummary.from_metrics(metrics)
+        rebuilt = summary.to_dict()
+        self.assertEqual(set(rebuilt), set(metrics))
+        for key, value in metrics.items():
+            if isinstance(value, dict):
+                self.assertEqual(set(rebuilt[key]), set(value))
+                for label, v in value.items():
+                    self.assertAlmostEqual(rebuilt[key][label], v)
+            else:
+                self.assertEqual(rebuilt[key], value)
+        return summary
+
+    def test_round_trips_parser_output(self):
+        metadata = {"id": "i1", "activity_date": "2024-06-01", "icu_training_load": 40, "lthr": 165}
+        for activity_type in ["Ride", "Run", "WeightTraining"]:
+            metrics = Intervals.compute_metrics(ride_frame(), dict(metadata, type=activity_type), 250)
+            self.assert_round_trip(metrics)
+
+        rough = Intervals.compute_metrics(ride_frame().drop(columns=["watts", "cadence"]),
+                                          dict(metadata, type="Ride", icu_weighted_avg_watts=180), 250)
+        self.assertEqual(rough["estimate_method"], "rough_from_metadata_and_hr")
+        self.assert_round_trip(rough)
+
+    def test_power_without_cadence_uses_power(self):
+        metrics = Intervals.compute_metrics(ride_frame().drop(columns=["cadence"]),
+                                            {"id": "i1", "type": "Ride", "activity_date": "2024-06-01"}, 250)
+
+        self.assertNotIn("estimate_method", metrics)
+        self.assertGreater(metrics["tss"], 0)
+
+    def test_missing_fields_stay_missing(self):
+        summary = ActivitySummary.from_metrics({"status": "Not Implemented", "type": "Walk", "date": "2024-06-01"})
+
+        self.assertEqual(summary.to_dict(), {"status": "Not Implemented", "type": "Walk", "date": "2024-06-01"})
+        self.assertIsNone(summary.get("tss"))
+
+    def test_dumps_matches_json(self):
+        metrics = Intervals.compute_metrics(ride_frame(), {"id": "i1", "type": "Ride", "activity_date": "2024-06-01"}, 250)
+        summary = ActivitySummary.from_metrics(metrics)
+
+        decoded = json.loads(dumps([summary]))
+
+        self.assertEqual(decoded[0]["zone_times"], metrics["zone_times"])
+        self.assertAlmostEqual(decoded[0]["tss"], metrics["tss"])
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(ActivitySummary(), "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import datetime
+import unittest
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from garmin.activity import ActivitySummary
+from garmin.activity_metrics import ActivityCollector
+
+TODAY = datetime.date(2024, 3, 13)  # a Wednesday
+
+
+def summary(n, date, **fields):
+    metrics = {"id": f"i{n}", "type": "Ride", "date": date, "total_time": 3600.0,
+               "zone_times": {"Z1": 600.0, "Z2": 3000.0}}
+    metrics.update(fields)
+    return ActivitySummary.from_metrics(metrics)
+
+
+class TestActivityCollector(unittest.TestCase):
+    def setUp(self):
+        self.collector = ActivityCollector(latest=2, weeks=2)
+        self.registry = CollectorRegistry()
+        self.registry.register(self.collector)
+
+    def value(self, name, **labels):
+        return self.registry.get_sample_value(name, labels)
+
+    def test_latest_slots_newest_first(self):
+        self.collector.refresh("alice", [
+            summary(1, "2024-03-11", tss=50),
+            summary(2, "2024-03-13", tss=80),
+            summary(3, "2024-03-12", tss=60),
+        ], today=TODAY)
+
+        self.assertEqual(self.value("activityTss", athlete="alice", slot="0"), 80)
+        self.assertEqual(self.value("activityTss", athlete="alice", slot="1"), 60)
+        self.assertIsNone(self.value("activityTss", athlete="alice", slot="2"))
+        self.assertEqual(self.value("activityInfo", athlete="alice", slot="0", id="i2", type="Ride",
+                                    date="2024-03-13"), 1)
+
+    def test_weekly_aggregates_and_age_out(self):
+        self.collector.refresh("alice", [
+            summary(1, "2024-03-11", tss=50),
+            summary(2, "2024-03-13", training_load=70),
+            summary(3, "2024-03-06", tss=40),
+            summary(4, "2024-02-20", tss=100),
+        ], today=TODAY)
+
+        current = {"athlete": "alice", "week": "0", "week_start": "2024-03-11"}
+        previous = {"athlete": "alice", "week": "1", "week_start": "2024-03-04"}
+        self.assertEqual(self.value("activityWeeklyTss", **current), 120)
+        self.assertEqual(self.value("activityWeeklyTss", **previous), 40)
+        self.assertEqual(self.value("activityWeeklyCount", **current), 2)
+        self.assertEqual(self.value("activityWeeklySeconds", **previous), 3600)
+        self.assertEqual(self.value("activityWeeklyZoneSeconds", system="power", zone="Z2", **current), 6000)
+        self.assertNotIn(b'week="2"', generate_latest(self.registry))
+
+    def test_series_bounded_by_slots_and_weeks(self):
+        summaries = [summary(n, (TODAY - datetime.timedelta(days=n % 10)).isoformat(), tss=n) for n in range(500)]
+        self.collector.refresh("alice", summaries, today=TODAY)
+
+        lines = [line for line in generate_latest(self.registry).decode().splitlines()
+                 if line.startswith("activityTss{")]
+        self.assertEqual(len(lines), 2)
+
+    def test_clear(self):
+        self.collector.refresh("alice", [summary(1, "2024-03-13", tss=80)], today=TODAY)
+        self.collector.clear()
+
+        self.assertIsNone(self.value("activityTss", athlete="alice", slot="0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+
+import garmin.activity_query as activity_query
+from garmin.activity import ActivitySummary, dumps
+from garmin.store import ActivityStore
+
+ACTIVITIES = [
+    ("i1", {"date": "2024-03-04", "type": "Ride", "tss": 95.0, "normalized_power": 230.0, "total_time": 5400.0,
+            "zone_times": {"Z1": 600.0, "Z2": 3000.0}}),
+    ("i2", {"date": "2024-03-06", "type": "Run", "tss": 60.0, "total_time": 3000.0,
+            "pace_zone_times": {"Z1": 300.0, "Z2": 2400.0}}),
+    ("i3", {"date": "2024-03-12", "type": "Ride", "tss": 70.0, "normalized_power": 200.0, "total_time": 3600.0,
+            "zone_times": {"Z1": 900.0, "Z2": 2000.0}}),
+    ("i4", {"date": "2024-04-02", "type": "Ride", "tss": 120.0, "normalized_power": 245.0, "total_time": 7200.0,
+            "zone_times": {"Z1": 1200.0, "Z2": 4000.0}}),
+]
+
+
+class TestActivityQuery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = ActivityStore(self.temp_dir.name)
+        for activity_id, metrics in ACTIVITIES:
+            self.store.upsert(activity_id, ActivitySummary.from_metrics(dict(metrics, id=activity_id)), ftp=250)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_filters_and_projection(self):
+        result = activity_query.run_query(self.store, {"type": "Ride", "where": "tss>80", "fields": "id,date,tss"})
+        self.assertEqual(result["activities"], [
+            {"id": "i1", "date": "2024-03-04", "tss": 95.0},
+            {"id": "i4", "date": "2024-04-02", "tss": 120.0},
+        ])
+
+    def test_date_range_order_and_limit(self):
+        result = activity_query.run_query(self.store, {"from": "2024-03-05", "to": "2024-03-31", "order": "desc",
+                                                       "fields": "activity_id", "limit": "1"})
+        self.assertEqual(result["activities"], [{"activity_id": "i3"}])
+
+    def test_full_summaries_by_default(self):
+        result = activity_query.run_query(self.store, {"type": "Run"})
+        self.assertEqual(result["count"], 1)
+        self.assertEqual(result["activities"][0]["pace_zone_times"]["Z2"], 2400.0)
+
+    def test_group_by_month(self):
+        result = activity_query.run_query(self.store, {"type": "Ride", "group": "month", "sum": "zone_times.Z2,tss"})
+        self.assertEqual(result["groups"], [
+            {"period": "2024-03", "count": 2, "zone_times.Z2": 5000.0, "tss": 165.0},
+            {"period": "2024-04", "count": 1, "zone_times.Z2": 4000.0, "tss": 120.0},
+        ])
+
+    def test_group_by_week(self):
+        result = activity_query.run_query(self.store, {"group": "week"})
+        self.assertEqual([(group["period"], group["count"], group["tss"]) for group in result["groups"]],
+                         [("2024-03-04", 2, 155.0), ("2024-03-11", 1, 70.0), ("2024-04-01", 1, 120.0)])
+
+    def test_invalid_arguments(self):
+        for args in ({"where": "avg_power>200"}, {"where": "tss>>1"}, {"group": "year"}, {"from": "March"}):
+            with self.assertRaises(ValueError):
+                activity_query.run_query(self.store, args)
+
+    def test_existing_store_migrated(self):
+        folder = os.path.join(self.temp_dir.name, "old")
+        os.makedirs(folder)
+        path = os.path.join(folder, "activities.db")
+        with closing(sqlite3.connect(path)) as conn:
+            conn.execute("CREATE TABLE activities (activity_id TEXT PRIMARY KEY, activity_date TEXT, "
+                         "activity_type TEXT, ftp INTEGER, data TEXT NOT NULL, parsed_at TEXT NOT NULL) WITHOUT ROWID")
+            conn.execute("INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?)",
+                         ("i9", "2024-01-01", "Ride", 250, dumps({"id": "i9", "tss": 88.0}), "2024-01-02T00:00:00"))
+            conn.commit()
+
+        store = ActivityStore(folder)
+        rows = store.query(conditions=[("tss", ">", 80)], with_data=False)
+        self.assertEqual([(row["activity_id"], row["tss"]) for row in rows], [("i9", 88.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import unittest
+
+from flask import Flask, request
+
+from garmin.asgi import ScraperAsgi, build_environ
+
+
+def http_scope(path, query=b"", method="GET", headers=None):
+    return {"type": "http", "method": method, "path": path, "query_string": query,
+            "headers": headers or [], "http_version": "1.1", "scheme": "http",
+            "server": ("testserver", 8080), "client": ("127.0.0.1", 5000)}
+
+
+async def call(app, scope, body=b""):
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    content = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return start["status"], dict(start["headers"]), content
+
+
+class TestScraperAsgi(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        flask_app = Flask(__name__)
+
+        @flask_app.route("/slow")
+        def slow():
+            self.release.wait(5)
+            return "done"
+
+        @flask_app.route("/echo", methods=["POST"])
+        def echo():
+            return f"{request.args.get('x')}:{request.get_data(as_text=True)}", 201, {"X-Test": "yes"}
+
+        @flask_app.route("/native")
+        def native_fallback():
+            return "wsgi"
+
+        async def native(req):
+            if req.get("fallback"):
+                return None
+            await asyncio.sleep(0)
+            return f"native {req.get('x')}", 203, {"Content-Type": "text/plain"}
+
+        self.app = ScraperAsgi(flask_app, workers=1, routes={"/native": native})
+
+    def tearDown(self):
+        self.release.set()
+
+    def test_wsgi_request_and_response(self):
+        status, headers, content = asyncio.run(call(
+            self.app, http_scope("/echo", b"x=1", "POST", [(b"content-type", b"text/plain")]), b"hello"))
+
+        self.assertEqual(status, 201)
+        self.assertEqual(headers[b"x-test"], b"yes")
+        self.assertEqual(content, b"1:hello")
+
+    def test_metrics_served_while_workers_are_busy(self):
+        async def scenario():
+            slow = asyncio.ensure_future(call(self.app, http_scope("/slow")))
+            await asyncio.sleep(0.05)
+            metrics = await asyncio.wait_for(call(self.app, http_scope("/metrics")), 2)
+            self.assertFalse(slow.done())
+            self.release.set()
+            return metrics, await slow
+
+        (status, _, _), (slow_status, _, slow_content) = asyncio.run(scenario())
+
+        self.assertEqual(status, 200)
+        self.assertEqual((slow_status, slow_content), (200, b"done"))
+
+    def test_native_routes_run_on_the_loop(self):
+        async def scenario():
+            slow = asyncio.ensure_future(call(self.app, http_scope("/slow")))
+            await asyncio.sleep(0.05)
+            native = await asyncio.wait_for(call(self.app, http_scope("/native", b"x=1&x=2")), 2)
+            self.release.set()
+            await slow
+            fallback = await call(self.app, http_scope("/native", b"fallback=1"))
+            return native, fallback
+
+        (status, headers, content), (_, _, fallback) = asyncio.run(scenario())
+
+        self.assertEqual((status, content), (203, b"native 1"))
+        self.assertEqual(headers[b"content-type"], b"text/plain")
+        self.assertEqual(fallback, b"wsgi")
+
+    def test_repeated_headers_are_joined(self):
+        environ = build_environ(http_scope("/x", headers=[(b"accept", b"a"), (b"accept", b"b")]), b"")
+
+        self.assertEqual(environ["HTTP_ACCEPT"], "a,b")
+        self.assertEqual(environ["SERVER_PORT"], "8080")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from garmin.athletes import Athlete, AthleteLimiter, AthletePool, load_athletes
+
+
+class TestAthletes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_load_athletes(self):
+        config_path = os.path.join(self.temp_dir.name, "athletes.json")
+        with open(config_path, "w") as f:
+            json.dump({"athletes": [
+                {"name": "ciara", "garmin_user": "ciara@example.com", "garmin_pass_env": "CIARA_PASS",
+                 "intervals_api_key": "key1", "min_interval": 5},
+                {"name": "sam", "garmin_user": "sam@example.com", "garmin_pass": "inline",
+                 "garth_folder": "/tmp/sam"},
+            ]}, f)
+
+        with patch.dict(os.environ, {"CIARA_PASS": "from_env"}):
+            athletes = load_athletes(config_path, base_folder="/opt/garmin-scraper")
+
+        self.assertEqual([a.name for a in athletes], ["ciara", "sam"])
+        self.assertEqual(athletes[0].garmin_pass, "from_env")
+        self.assertEqual(athletes[0].garth_folder, os.path.join("/opt/garmin-scraper", "ciara"))
+        self.assertEqual(athletes[0].limiter.min_interval, 5.0)
+        self.assertEqual(athletes[1].garth_folder, "/tmp/sam")
+        self.assertIsNot(athletes[0].client, athletes[1].client)
+
+    def test_run_all_isolates_failures(self):
+        pool = AthletePool(max_workers=2)
+
+        def job(athlete):
+            if athlete.name == "broken":
+                raise ValueError("boom")
+            return athlete.name.upper()
+
+        results = pool.run_all([Athlete("ok"), Athlete("broken")], job)
+
+        self.assertEqual(results["ok"], "OK")
+        self.assertEqual(results["broken"], {"error": "boom"})
+
+    def test_limiter_spaces_out_runs(self):
+        limiter = AthleteLimiter(min_interval=0.1)
+        start = time.monotonic()
+        with limiter:
+            pass
+        with limiter:
+            pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from garmin.backfill import BackfillPlanner, PrometheusCoverage, day_start
+from garmin.store import BackfillManifest
+
+METRICS = ["restingHeartRate", "averageStressLevel"]
+
+
+class TestBackfillPlanner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.manifest = BackfillManifest(self.temp_dir.name)
+        self.scrape = MagicMock()
+        self.scrape.get_dailies.side_effect = lambda dates: [{"calendarDate": date} for date in dates]
+        self.tsdb = MagicMock()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_second_run_is_a_no_op(self):
+        planner = BackfillPlanner(self.manifest, metrics=METRICS)
+        dates = ["2024-01-03", "2024-01-01", "2024-01-02"]
+
+        first = planner.run(self.scrape, self.tsdb, dates)
+        second = planner.run(self.scrape, self.tsdb, dates)
+
+        self.assertEqual(list(first), ["2024-01-01", "2024-01-02", "2024-01-03"])
+        self.assertEqual(second, {})
+        self.scrape.get_dailies.assert_called_once()
+        self.tsdb.create_backfill.assert_called_once()
+        self.assertEqual(self.manifest.ranges(), {metric: [("2024-01-01", "2024-01-03")] for metric in METRICS})
+
+    def test_only_missing_days_and_metrics_are_planned(self):
+        self.manifest.mark({"2024-01-01": METRICS, "2024-01-02": ["restingHeartRate"]})
+        planner = BackfillPlanner(self.manifest, metrics=METRICS)
+
+        plan = planner.run(self.scrape, self.tsdb, ["2024-01-01", "2024-01-02", "2024-01-03"])
+
+        self.assertEqual(plan, {"2024-01-02": ["averageStressLevel"], "2024-01-03": METRICS})
+        self.scrape.get_dailies.assert_called_once_with(["2024-01-02", "2024-01-03"])
+        self.tsdb.create_backfill.assert_called_once_with(
+            [{"calendarDate": "2024-01-02"}, {"calendarDate": "2024-01-03"}], plan)
+
+    def test_force_rewrites_everything(self):
+        self.manifest.mark({"2024-01-01": METRICS})
+        planner = BackfillPlanner(self.manifest, metrics=METRICS)
+
+        plan = planner.run(self.scrape, self.tsdb, ["2024-01-01"], force=True)
+
+        self.assertEqual(plan, {"2024-01-01": METRICS})
+
+    def test_prometheus_coverage_is_skipped_and_recorded(self):
+        coverage = MagicMock()
+        coverage.covered.return_value = {"2024-01-01": {"restingHeartRate", "averageStressLevel"},
+                                         "2024-01-02": {"restingHeartRate"}}
+        planner = BackfillPlanner(self.manifest, coverage, metrics=METRICS)
+
+        plan = planner.plan(["2024-01-01", "2024-01-02"])
+
+        self.assertEqual(plan, {"2024-01-02": ["averageStressLevel"]})
+        self.assertEqual(self.manifest.exported("2024-01-01", "2024-01-02"),
+                         {"2024-01-01": set(METRICS), "2024-01-02": {"restingHeartRate"}})
+
+    def test_coverage_is_asked_for_the_athlete(self):
+        coverage = MagicMock()
+        coverage.covered.return_value = {}
+        BackfillPlanner(self.manifest, coverage, metrics=METRICS, athlete="alice").plan(["2024-01-01"])
+
+        coverage.covered.assert_called_once_with(["2024-01-01"], METRICS, "alice")
+
+
+class TestPrometheusCoverage(unittest.TestCase):
+    @patch("garmin.backfill.requests.get")
+    def test_covered_days(self, mock_get):
+        first = int(day_start("2024-01-01") + 12 * 3600)
+        second = int(day_start("2024-01-02") + 12 * 3600)
+        mock_get.return_value.json.return_value = {"data": {"result": [
+            {"metric": {}, "values": [[first, "6"], [second, "0"]]}]}}
+
+        covered = PrometheusCoverage("http://prometheus:9090/").covered(["2024-01-01", "2024-01-02"], ["restingHeartRate"])
+
+        self.assertEqual(covered, {"2024-01-01": {"restingHeartRate"}})
+        args, kwargs = mock_get.call_args
+        self.assertEqual(args[0], "http://prometheus:9090/api/v1/query_range")
+        self.assertEqual(kwargs["params"]["start"], first)
+        self.assertEqual(kwargs["params"]["query"], "count_over_time(restingHeartRate[12h])")
+
+    @patch("garmin.backfill.requests.get")
+    def test_steps_across_dst_change(self, mock_get):
+        self.set_timezone("Europe/London")
+        # Clocks go forward on 2024-03-31, so fixed 1d steps land at 13:00 local after it
+        first = int(day_start("2024-03-30") + 12 * 3600)
+        mock_get.return_value.json.return_value = {"data": {"result": [
+            {"metric": {}, "values": [[first + step * 86400, "6"] for step in range(3)]}]}}
+
+        dates = ["2024-03-30", "2024-03-31", "2024-04-01"]
+        covered = PrometheusCoverage("http://prometheus:9090").covered(dates, ["restingHeartRate"])
+
+        self.assertEqual(sorted(covered), dates)
+        self.assertGreaterEqual(mock_get.call_args[1]["params"]["end"], first + 2 * 86400)
+
+    def set_timezone(self, name):
+        if not hasattr(time, "tzset"):
+            self.skipTest("time.tzset is unavailable")
+        original = os.environ.get("TZ")
+
+        def restore():
+            if original is None:
+                os.environ.pop("TZ", None)
+            else:
+                os.environ["TZ"] = original
+            time.tzset()
+        self.addCleanup(restore)
+        os.environ["TZ"] = name
+        time.tzset()
+
+    @patch("garmin.backfill.requests.get")
+    def test_athlete_matcher(self, mock_get):
+        mock_get.return_value.json.return_value = {"data": {"result": []}}
+
+        PrometheusCoverage("http://prometheus:9090").covered(["2024-01-01"], ["restingHeartRate"], athlete='al"ice')
+
+        self.assertEqual(mock_get.call_args[1]["params"]["query"],
+                         'count_over_time(restingHeartRate{athlete="al\\"ice"}[12h])')
+
+    @patch("garmin.backfill.requests.get", side_effect=ConnectionError("down"))
+    def test_unreachable_prometheus_covers_nothing(self, mock_get):
+        self.assertEqual(PrometheusCoverage("http://prometheus:9090").covered(["2024-01-01"], METRICS), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
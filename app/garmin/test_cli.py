@@ -0,0 +1,134 @@
+import argparse
+import datetime
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import orjson
+
+import garmin.cli as cli
+from garmin.activity import ActivitySummary
+from garmin.athletes import Athlete
+from garmin.tsdb import TsdbGenerator
+
+
+def daily(date, resting=50):
+    return {"calendarDate": date, "restingHeartRate": resting, "maxHeartRate": 170, "minHeartRate": None}
+
+
+class TestDates(unittest.TestCase):
+    def args(self, start=None, end=None, days=None):
+        return argparse.Namespace(start=start, end=end, days=days)
+
+    def test_from_to(self):
+        self.assertEqual(cli.resolve_dates(self.args("2024-02-28", "2024-03-01")),
+                         ["2024-02-28", "2024-02-29", "2024-03-01"])
+
+    def test_days_end_yesterday(self):
+        dates = cli.resolve_dates(self.args(days=3), today=datetime.date(2024, 5, 10))
+        self.assertEqual(dates, ["2024-05-07", "2024-05-08", "2024-05-09"])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            cli.resolve_dates(self.args())
+        with self.assertRaises(ValueError):
+            cli.resolve_dates(self.args("2024-03-02", "2024-03-01"))
+
+
+class TestProgress(unittest.TestCase):
+    def test_reports_first_and_last(self):
+        stream = io.StringIO()
+        progress = cli.Progress("days", 3, interval=3600, stream=stream)
+        for _ in range(3):
+            progress.advance()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("days: 1/3 ("))
+        self.assertTrue(lines[-1].startswith("days: 3/3 ("))
+
+
+class TestFetchDailies(unittest.TestCase):
+    def test_chunks_keep_date_order(self):
+        scrape = MagicMock()
+        scrape.get_dailies.side_effect = lambda dates: [daily(date) for date in dates]
+        dates = cli.date_range("2024-01-01", "2024-03-31")
+        progress = cli.Progress("days", len(dates), stream=io.StringIO())
+        dailies = cli.fetch_dailies(scrape, dates, 4, progress)
+        self.assertEqual([d["calendarDate"] for d in dailies], dates)
+        self.assertEqual(scrape.get_dailies.call_count, 4)
+        self.assertEqual(progress.done, len(dates))
+
+
+class TestOpenMetrics(unittest.TestCase):
+    def test_one_family_per_metric(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "dailies.om")
+            samples = TsdbGenerator().write_openmetrics(
+                [daily("2024-01-02", 48), daily("2024-01-01", 50)], path, ["restingHeartRate", "minHeartRate"])
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(samples, 44)
+        self.assertEqual(lines[0], "# HELP minHeartRate Min heart rate")
+        self.assertEqual(sum(1 for line in lines if line.startswith("# TYPE")), 2)
+        resting = [line for line in lines if line.startswith("restingHeartRate ")]
+        self.assertEqual(resting[0].split()[1], "50")
+        self.assertEqual(resting[-1].split()[1], "48")
+        self.assertIn("minHeartRate 0 ", lines[2])
+        self.assertEqual(lines[-1], "# EOF")
+
+    def test_blockfiles_in_folder(self):
+        with tempfile.TemporaryDirectory() as folder:
+            TsdbGenerator(folder).create_backfill([daily("2024-01-01")], {"2024-01-01": ["restingHeartRate"]})
+            self.assertEqual(len(os.listdir(folder)), 11)
+
+    def test_athlete_label_and_folder(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ("alice", "bob"):
+                TsdbGenerator(folder, name).create_backfill([daily("2024-01-01")], {"2024-01-01": ["restingHeartRate"]})
+            self.assertEqual(sorted(os.listdir(folder)), ["alice", "bob"])
+            files = sorted(os.listdir(os.path.join(folder, "bob")))
+            self.assertEqual(len(files), 11)
+            with open(os.path.join(folder, "bob", files[0])) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines[2].startswith('restingHeartRate{athlete="bob"} 50 '))
+
+    def test_openmetrics_athlete_label(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "dailies.om")
+            TsdbGenerator(athlete='a"b').write_openmetrics([daily("2024-01-01")], path, ["restingHeartRate"])
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertTrue(lines[2].startswith('restingHeartRate{athlete="a\\"b"} 50 '))
+
+
+class TestParseCommand(unittest.TestCase):
+    @patch("garmin.intervals.Intervals")
+    @patch("garmin.cli.athletes.get_athlete")
+    def test_parse_writes_summaries(self, mock_athlete, mock_intervals):
+        mock_athlete.return_value = Athlete("default")
+        intervals = mock_intervals.return_value
+        intervals.activity_store = None
+        intervals.get_activities_between.return_value = [
+            {"id": "i1", "type": "Ride"}, {"id": "i2", "type": "Walk"}, {"id": "i3", "type": "Ride"}]
+        intervals.get_activity_ids.side_effect = lambda activities: ([a["id"] for a in activities], {})
+        intervals.parse_activities_by_id.side_effect = lambda ids: {
+            activity_id: ActivitySummary.from_metrics({"id": activity_id, "tss": 50.0}) for activity_id in ids}
+
+        with tempfile.TemporaryDirectory() as folder:
+            output = os.path.join(folder, "activities.jsonl")
+            with patch("sys.stderr", io.StringIO()):
+                code = cli.main(["--progress-interval", "0", "parse", "--from", "2024-01-01", "--to", "2024-01-31",
+                                 "--types", "Ride", "--batch", "1", "--output", output])
+            with open(output, "rb") as f:
+                rows = [orjson.loads(line) for line in f]
+
+        self.assertEqual(code, 0)
+        intervals.get_activities_between.assert_called_once_with("2024-01-01", "2024-01-31")
+        self.assertEqual(intervals.parse_activities_by_id.call_count, 2)
+        self.assertEqual([row["id"] for row in rows], ["i1", "i3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
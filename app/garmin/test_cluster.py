@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+import unittest
+
+from app.garmin.cluster import Cluster, FileLease, Scheduler
+
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_only_one_leader(self):
+        first = FileLease(os.path.join(self.folder, "leader.json"), "pod-a", ttl=60)
+        second = FileLease(os.path.join(self.folder, "leader.json"), "pod-b", ttl=60)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        self.assertTrue(first.acquire())
+
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_expired_lease_is_taken_over(self):
+        first = FileLease(os.path.join(self.folder, "leader.json"), "pod-a", ttl=0.05)
+        second = FileLease(os.path.join(self.folder, "leader.json"), "pod-b", ttl=60)
+
+        self.assertTrue(first.acquire())
+        time.sleep(0.1)
+
+        self.assertTrue(second.acquire())
+
+    def test_shards_partition_keys(self):
+        workers = [Cluster(self.folder, worker_id=name) for name in ["pod-a", "pod-b", "pod-c"]]
+        for worker in workers:
+            worker.heartbeat()
+        keys = [f"i{n}" for n in range(300)]
+
+        shards = [worker.shard(keys) for worker in workers]
+
+        self.assertEqual(sorted(sum(shards, [])), sorted(keys))
+        for shard in shards:
+            self.assertGreater(len(shard), 50)
+
+    def test_leaving_only_moves_its_keys(self):
+        workers = [Cluster(self.folder, worker_id=name) for name in ["pod-a", "pod-b", "pod-c"]]
+        for worker in workers:
+            worker.heartbeat()
+        keys = [f"i{n}" for n in range(100)]
+        before = set(workers[0].shard(keys))
+
+        workers[2].leave()
+
+        self.assertTrue(before.issubset(set(workers[0].shard(keys))))
+
+    def test_leader_jobs_only_run_on_leader(self):
+        runs = []
+        leader = Scheduler(Cluster(self.folder, worker_id="pod-a"), 60,
+                           leader_jobs=[lambda: runs.append("a-leader")], worker_jobs=[lambda: runs.append("a-worker")])
+        follower = Scheduler(Cluster(self.folder, worker_id="pod-b"), 60,
+                             leader_jobs=[lambda: runs.append("b-leader")], worker_jobs=[lambda: runs.append("b-worker")])
+
+        leader.tick()
+        follower.tick()
+
+        self.assertEqual(runs, ["a-leader", "a-worker", "b-worker"])
+
+
+if __name__ == "__main__":
+    unittest.main()
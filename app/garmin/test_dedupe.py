@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import garmin.dedupe as dedupe
+from garmin.activity import ActivitySummary
+from garmin.intervals import Intervals
+from garmin.store import ActivityStore
+
+
+def ride(activity_id, start, elapsed, distance=40000.0, heartrate=140.0, watts=None, activity_type="Ride"):
+    activity = {"id": activity_id, "type": activity_type, "start_date_local": start, "elapsed_time": elapsed,
+                "distance": distance, "average_heartrate": heartrate, "has_heartrate": heartrate is not None}
+    if watts is not None:
+        activity["icu_average_watts"] = watts
+        activity["device_watts"] = True
+    return activity
+
+
+class TestDropDuplicates(unittest.TestCase):
+    def test_keeps_recording_with_power(self):
+        watch = ride("i1", "2024-03-04T07:00:05", 5400, distance=40100.0, heartrate=141.0)
+        computer = ride("i2", "2024-03-04T07:00:40", 5350, watts=190.0)
+        run = ride("i3", "2024-03-04T18:00:00", 3000, distance=10000.0, activity_type="Run")
+
+        kept, skipped = dedupe.drop_duplicates([watch, computer, run])
+
+        self.assertEqual([activity["id"] for activity in kept], ["i2", "i3"])
+        self.assertEqual(skipped, {"i1": "i2"})
+
+    def test_separate_sessions_kept(self):
+        morning = ride("i1", "2024-03-04T07:00:00", 3600)
+        evening = ride("i2", "2024-03-04T18:00:00", 3600)
+        short_overlap = ride("i3", "2024-03-04T07:50:00", 3600)
+        other_distance = ride("i4", "2024-03-04T07:00:00", 3600, distance=20000.0)
+        other_type = ride("i5", "2024-03-04T07:00:00", 3600, activity_type="Run")
+
+        kept, skipped = dedupe.drop_duplicates([morning, evening, short_overlap, other_distance, other_type])
+
+        self.assertEqual(len(kept), 5)
+        self.assertEqual(skipped, {})
+
+    def test_long_ride_started_early_on_one_device(self):
+        watch = ride("i1", "2024-03-04T07:00:00", 4 * 3600 + 2100, watts=200.0)
+        computer = ride("i2", "2024-03-04T07:35:00", 4 * 3600, heartrate=None)
+
+        kept, skipped = dedupe.drop_duplicates([computer, watch])
+
+        self.assertEqual([activity["id"] for activity in kept], ["i1"])
+        self.assertEqual(skipped, {"i2": "i1"})
+
+    def test_virtual_ride_matches_ride(self):
+        trainer = ride("i1", "2024-03-04T07:00:00", 3600, watts=210.0, activity_type="VirtualRide")
+        watch = ride("i2", "2024-03-04T07:00:30", 3580)
+        self.assertEqual(dedupe.drop_duplicates([watch, trainer])[1], {"i2": "i1"})
+
+    def test_three_recordings_point_at_the_kept_one(self):
+        phone = ride("i1", "2024-03-04T07:00:00", 3500, heartrate=None)
+        watch = ride("i2", "2024-03-04T07:00:10", 3600)
+        computer = ride("i3", "2024-03-04T07:00:20", 3590, watts=180.0)
+
+        kept, skipped = dedupe.drop_duplicates([phone, watch, computer])
+
+        self.assertEqual([activity["id"] for activity in kept], ["i3"])
+        self.assertEqual(skipped, {"i1": "i3", "i2": "i3"})
+
+
+class TestIntervalsDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch.object(Intervals, "get_athlete_fields")
+    def test_duplicates_dropped_from_ids_and_store(self, mock_fields):
+        intervals = Intervals()
+        intervals.activity_store = ActivityStore(self.temp_dir.name)
+        intervals.activity_store.upsert("i1", ActivitySummary.from_metrics({"id": "i1", "tss": 60.0}))
+        activities = [ride("i1", "2024-03-04T07:00:00", 3600), ride("i2", "2024-03-04T07:00:30", 3590, watts=200.0)]
+
+        ids, duplicates = intervals.get_activity_ids(activities)
+        self.assertEqual((ids, duplicates), (["i2"], {"i1": "i2"}))
+        self.assertIsNotNone(intervals.activity_store.get("i1"))
+
+        with patch.object(intervals, "parse_activities_by_id", return_value={}) as mock_parse:
+            intervals.sync_activities(ids, duplicates)
+        self.assertIsNone(intervals.activity_store.get("i1"))
+        mock_parse.assert_called_once_with(["i2"])
+
+        with patch.dict(os.environ, {"DEDUPE_ACTIVITIES": "false"}):
+            self.assertEqual(intervals.get_activity_ids(activities), (["i1", "i2"], {}))
+
+    @patch.object(Intervals, "get_activities_between")
+    @patch.object(Intervals, "get_activity_metadata")
+    @patch.object(Intervals, "get_athlete_fields")
+    def test_single_activity_checked_against_its_neighbours(self, mock_fields, mock_metadata, mock_between):
+        mock_metadata.return_value = {"activity_date": "2024-03-04"}
+        mock_between.return_value = [ride("i1", "2024-03-04T07:00:00", 3600),
+                                     ride("i2", "2024-03-04T07:00:30", 3590, watts=200.0),
+                                     ride("i3", "2024-03-04T18:00:00", 3600)]
+        intervals = Intervals()
+
+        self.assertEqual(intervals.kept_recording("i1"), "i2")
+        self.assertEqual(intervals.kept_recording("i2"), "i2")
+        self.assertEqual(intervals.kept_recording("i3"), "i3")
+        mock_between.assert_called_with("2024-03-03", "2024-03-05")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from garmin.downsample import DownsampleCache, downsample, lttb, minmax
+from garmin.intervals import Intervals
+from garmin.streams import StreamCache
+
+
+class TestDownsample(unittest.TestCase):
+    def setUp(self):
+        self.x = np.arange(15000, dtype=np.float64)
+        self.y = np.sin(self.x / 500) * 100 + 200
+        self.y[7000] = 1500  # a sprint
+
+    def test_lttb_keeps_ends_and_peaks(self):
+        index = lttb(self.x, self.y, 500)
+
+        self.assertEqual(len(index), 500)
+        self.assertEqual((index[0], index[-1]), (0, 14999))
+        self.assertTrue(np.all(np.diff(index) > 0))
+        self.assertIn(7000, index)
+
+    def test_minmax_keeps_extremes(self):
+        index = minmax(self.x, self.y, 500)
+
+        self.assertLessEqual(len(index), 502)
+        self.assertIn(7000, index)
+        self.assertIn(int(np.argmin(self.y)), index)
+
+    def test_short_series_returned_whole(self):
+        np.testing.assert_array_equal(lttb(self.x[:10], self.y[:10], 100), np.arange(10))
+
+    def test_gaps_dropped_and_pace_derived(self):
+        streams = {
+            "time": np.arange(6, dtype=np.float64),
+            "heartrate": np.array([120, np.nan, 122, 123, np.nan, 125], dtype=np.float32),
+            "velocity_smooth": np.array([0, 4, 4, 5, 5, 2.5], dtype=np.float32),
+        }
+
+        times, values = downsample(streams, "heartrate", 100)
+        pace_times, pace = downsample(streams, "pace", 100)
+
+        np.testing.assert_array_equal(times, [0, 2, 3, 5])
+        np.testing.assert_array_equal(values, [120, 122, 123, 125])
+        np.testing.assert_array_equal(pace_times, [1, 2, 3, 4, 5])
+        np.testing.assert_allclose(pace, [250, 250, 200, 200, 400])
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = DownsampleCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_cache_bounded_by_bytes(self):
+        cache = DownsampleCache(maxsize=10, max_bytes=2000)
+        for key in ("a", "b", "c"):
+            cache.put(key, (np.zeros(50), np.zeros(50)))
+
+        self.assertEqual(list(cache.entries), ["b", "c"])
+        self.assertEqual(cache.size, 1600)
+
+
+class TestStreamArrays(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch.object(Intervals, "get_athlete_fields")
+    def test_streams_downloaded_once(self, mock_fields):
+        intervals = Intervals()
+        intervals.garth_folder = self.temp_dir.name
+        csv_path = os.path.join(self.temp_dir.name, "activity-i1.csv")
+
+        def fake_download(activity_id):
+            with open(csv_path, "w") as f:
+                f.write("time,watts,latlng\n0,100,x\n1,200,y\n")
+            return csv_path, {"type": "Ride"}
+
+        with patch.object(intervals, "get_activity_streams", side_effect=fake_download) as mock_download:
+            first = intervals.get_stream_arrays("i1")
+            second = intervals.get_stream_arrays("i1")
+
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertFalse(os.path.exists(csv_path))
+        self.assertEqual(set(second), {"time", "watts"})
+        np.testing.assert_array_equal(first["watts"], second["watts"])
+        self.assertEqual(second["watts"].dtype, np.float32)
+        self.assertIsNotNone(StreamCache(self.temp_dir.name).load("i1"))
+
+    def test_stream_cache_evicts_least_recently_used(self):
+        streams = {"time": np.arange(1000, dtype=np.float64)}
+        cache = StreamCache(self.temp_dir.name, max_bytes=10 ** 9)
+        for activity_id in ("i1", "i2", "i3"):
+            cache.save(activity_id, streams)
+        for age, activity_id in enumerate(("i3", "i1", "i2")):
+            os.utime(cache.path(activity_id), (1000 + age, 1000 + age))
+        cache.load("i3")
+
+        cache.max_bytes = 2.5 * os.path.getsize(cache.path("i1"))
+        cache.evict()
+
+        self.assertEqual(sorted(os.listdir(cache.folder)), ["activity-i2.npz", "activity-i3.npz"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from garmin import interval_detect
+from garmin.activity import ActivitySummary
+from garmin.intervals import Intervals
+
+
+def vo2_ride(seed=0):
+    rng = np.random.default_rng(seed)
+    size = 2 * 3600
+    watts = rng.normal(150, 20, size)
+    for k in range(5):
+        start = 1800 + k * 480
+        watts[start:start + 240] = rng.normal(300, 25, 240)
+    # Freewheeling for a few seconds inside the first interval
+    watts[1900:1905] = 0
+    return pd.DataFrame({
+        "time": np.arange(size, dtype=np.float64),
+        "watts": watts,
+        "cadence": np.full(size, 90.0),
+        "heartrate": np.where(watts > 250, 170.0, 135.0),
+    })
+
+
+class TestIntervalDetect(unittest.TestCase):
+    def test_hysteresis_holds_between_levels(self):
+        signal = np.array([100, 260, 230, 210, 230, 190, 230, 260])
+
+        work = interval_detect.hysteresis(signal, enter=250, exit=200)
+
+        self.assertEqual(work.tolist(), [False, True, True, True, True, False, False, True])
+
+    def test_separates_repeated_intervals(self):
+        metrics = Intervals.compute_bike_metrics(vo2_ride(), 250)
+
+        intervals = metrics["intervals"]
+        self.assertEqual(len(intervals), 5)
+        for k, interval in enumerate(intervals):
+            self.assertAlmostEqual(interval["start"], 1800 + k * 480, delta=10)
+            self.assertAlmostEqual(interval["end"] - interval["start"], 240, delta=15)
+            self.assertGreater(interval["avg_power"], 270)
+            self.assertGreater(interval["max_power"], interval["avg_power"])
+            self.assertAlmostEqual(interval["avg_heartrate"], 170, delta=5)
+
+    def test_short_efforts_are_dropped(self):
+        df = vo2_ride()
+        df["watts"] = 150.0
+        df.loc[600:610, "watts"] = 600.0
+
+        self.assertEqual(Intervals.compute_bike_metrics(df, 250)["intervals"], [])
+
+    def test_heart_rate_intervals_without_power(self):
+        df = vo2_ride().drop(columns=["watts", "cadence"])
+
+        metrics = Intervals.compute_rough_guess_bike_metrics(df, 250, {"lthr": 175})
+
+        self.assertEqual(len(metrics["intervals"]), 5)
+        self.assertNotIn("avg_power", metrics["intervals"][0])
+
+    def test_summary_round_trip(self):
+        metrics = Intervals.compute_bike_metrics(vo2_ride(), 250)
+
+        restored = ActivitySummary.from_metrics(metrics).to_dict()["intervals"]
+
+        self.assertEqual(len(restored), 5)
+        self.assertEqual(set(restored[0]), {"start", "end", "avg_power", "max_power", "avg_heartrate"})
+        self.assertAlmostEqual(restored[2]["avg_power"], metrics["intervals"][2]["avg_power"])
+
+
+if __name__ == "__main__":
+    unittest.main()
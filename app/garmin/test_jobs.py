@@ -0,0 +1,97 @@
+import threading
+import time
+import unittest
+
+from garmin import jobs
+from garmin.jobs import JobQueue, QueueFull
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.finished() and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = JobQueue(workers=1, max_queued=2, ttl=60)
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    def block(self):
+        self.release.wait(5)
+        return "blocked"
+
+    def test_result_and_failure(self):
+        done = wait_for(self.queue.submit("add", lambda a, b: a + b, 1, 2))
+        failed = wait_for(self.queue.submit("fail", lambda: 1 / 0))
+
+        self.assertEqual((done.status, done.result), (jobs.DONE, 3))
+        self.assertEqual(failed.status, jobs.FAILED)
+        self.assertIn("division by zero", failed.error)
+        self.assertEqual([job.id for job in self.queue.list()], [done.id, failed.id])
+
+    def test_bounded_queue(self):
+        self.queue.submit("first", self.block)
+        self.queue.submit("second", self.block)
+
+        with self.assertRaises(QueueFull):
+            self.queue.submit("third", self.block)
+
+    def test_express_jobs_skip_the_bulk_lane(self):
+        self.queue.submit("first", self.block)
+        self.queue.submit("second", self.block)
+
+        express = wait_for(self.queue.submit_express("webhook", lambda: "ingested"))
+
+        self.assertEqual((express.status, express.result, express.lane), (jobs.DONE, "ingested", jobs.EXPRESS))
+
+    def test_cancel_queued_job_never_runs(self):
+        ran = []
+        running = self.queue.submit("first", self.block)
+        queued = self.queue.submit("second", lambda: ran.append(1))
+
+        self.queue.cancel(queued.id)
+        self.release.set()
+        wait_for(running)
+
+        self.assertEqual(queued.status, jobs.CANCELLED)
+        self.assertEqual(ran, [])
+
+    def test_cancel_running_job_stops_at_next_check(self):
+        started = threading.Event()
+        processed = []
+
+        def loop():
+            for item in range(100):
+                jobs.check_cancelled()
+                processed.append(item)
+                started.set()
+                time.sleep(0.01)
+            return processed
+
+        job = self.queue.submit("loop", loop)
+        started.wait(5)
+        self.queue.cancel(job.id)
+        wait_for(job)
+
+        self.assertEqual(job.status, jobs.CANCELLED)
+        self.assertLess(len(processed), 100)
+
+    def test_finished_jobs_expire(self):
+        job = wait_for(self.queue.submit("quick", lambda: None))
+        self.queue.ttl = 0
+        job.finished_at -= 1
+
+        self.assertIsNone(self.queue.get(job.id))
+
+    def test_check_cancelled_is_a_no_op_outside_jobs(self):
+        jobs.check_cancelled()
+
+
+if __name__ == "__main__":
+    unittest.main()
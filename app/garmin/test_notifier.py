@@ -0,0 +1,81 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from garmin.notifier import Notifier
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        self.server.requests.append((self.path, body))
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            self.send_response(500)
+            self.end_headers()
+            return
+        payload = json.dumps({"ok": True, "channel": "C123", "ts": "1.0"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestNotifier(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FakeSlackHandler)
+        self.server.requests = []
+        self.server.failures = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        base_url = f"http://127.0.0.1:{self.server.server_port}/api/"
+        self.notifier = Notifier(token="xoxb-test", channel="C123", base_url=base_url,
+                                 dedup_seconds=60, max_retries=3, retry_backoff=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_posts_to_slack(self):
+        self.assertTrue(self.notifier.notify("stale_sync", "sync your watch"))
+        self.notifier.flush()
+
+        self.assertEqual(len(self.server.requests), 1)
+        path, body = self.server.requests[0]
+        self.assertEqual(path, "/api/chat.postMessage")
+        self.assertIn("sync your watch", body)
+
+    def test_deduplicates_by_alert_type(self):
+        self.notifier.notify("stale_sync", "one")
+        self.notifier.notify("stale_sync", "two")
+        self.notifier.notify("other", "three")
+        self.notifier.flush()
+
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_retries_failed_posts(self):
+        self.server.failures = 2
+        self.notifier.notify("stale_sync", "retry me")
+        self.notifier.flush()
+
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.failures = 5
+        self.notifier.notify("stale_sync", "lost")
+        self.notifier.flush()
+
+        self.assertEqual(len(self.server.requests), 3)
+        # A failed alert doesn't hold the de-duplication window
+        self.assertTrue(self.notifier.notify("stale_sync", "again"))
+        self.notifier.flush()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from garmin.parse_pool import ParsePool, compact_metadata, parse_in_process
+from garmin.streams import read_streams
+
+
+def write_ride(path, seconds=600):
+    rng = np.random.default_rng(1)
+    pd.DataFrame({
+        "time": np.arange(seconds),
+        "watts": rng.integers(100, 350, seconds),
+        "cadence": rng.integers(70, 100, seconds),
+        "heartrate": rng.integers(120, 170, seconds),
+        "velocity_smooth": rng.uniform(6, 12, seconds),
+        "latlng": ["53.3,-6.2"] * seconds,
+    }).to_csv(path, index=False)
+
+
+class TestParsePool(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "activity-i1.csv")
+        write_ride(self.path)
+        self.metadata = {"id": "i1", "type": "Ride", "activity_date": "2024-06-01", "name": "Lunch ride",
+                         "icu_training_load": 55}
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_compact_metadata_drops_unused_keys(self):
+        metadata = compact_metadata(self.metadata)
+
+        self.assertNotIn("name", metadata)
+        self.assertEqual(metadata["icu_training_load"], 55)
+
+    def test_process_pool_matches_in_process(self):
+        streams = read_streams(self.path)
+        expected = parse_in_process(streams, self.metadata, 250).result()
+
+        pool = ParsePool(workers=2)
+        try:
+            results = [pool.submit(streams, self.metadata, 250) for _ in range(3)]
+            for future in results:
+                self.assertEqual(future.result(), expected)
+        finally:
+            pool.shutdown()
+
+        self.assertEqual(expected["type"], "Ride")
+        self.assertEqual(expected["id"], "i1")
+        self.assertGreater(expected["tss"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
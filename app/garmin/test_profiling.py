@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from garmin import profiling
+
+
+def busy_parse(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.original = profiling.profiler
+        profiling.profiler = profiling.RequestProfiler(keep=5)
+
+    def tearDown(self):
+        profiling.profiler = self.original
+
+    @patch.dict(os.environ, {"PROFILING_ENABLED": "true"})
+    def test_profiles_next_matching_requests(self):
+        profiling.profiler.arm(1, "/intervals")
+
+        profiling.begin("/daily")
+        profiling.end()
+        profiling.begin("/intervals/activity")
+        profiling.tag_activity("i123")
+        sum(i * i for i in range(1000))
+        profiling.end()
+        profiling.begin("/intervals/activity")
+        profiling.end()
+
+        status = profiling.profiler.status()
+        self.assertEqual(status["remaining"], 0)
+        self.assertEqual(len(status["profiles"]), 1)
+        record = profiling.profiler.get(status["profiles"][0]["id"])
+        self.assertEqual((record["route"], record["activity_ids"]), ("/intervals/activity", ["i123"]))
+        self.assertIn("function calls", record["pstats"])
+
+    @patch.dict(os.environ, {"PROFILING_ENABLED": "true"})
+    def test_one_profile_at_a_time(self):
+        profiling.profiler.arm(2)
+        first = profiling.profiler.start("/daily")
+
+        self.assertIsNone(profiling.profiler.start("/intervals/activity"))
+        self.assertEqual(profiling.profiler.status()["remaining"], 1)
+
+        profiling.profiler.stop(first, "/daily", [])
+        second = profiling.profiler.start("/intervals/activity")
+        self.assertIsNotNone(second)
+        profiling.profiler.stop(second, "/intervals/activity", [])
+        self.assertEqual(len(profiling.profiler.status()["profiles"]), 2)
+
+    def test_disabled_profiler_records_nothing(self):
+        profiling.profiler.arm(1)
+
+        profiling.begin("/daily")
+        profiling.end()
+
+        self.assertEqual(profiling.profiler.status()["profiles"], [])
+
+    def test_sampled_stacks_are_tagged_with_route_and_activity(self):
+        stop = threading.Event()
+
+        def worker():
+            profiling.begin("job:activities")
+            profiling.tag_activity("i42")
+            busy_parse(stop)
+            profiling.end()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.05)
+        try:
+            collapsed = profiling.sample_stacks(0.2, interval=0.005)
+        finally:
+            stop.set()
+            thread.join()
+
+        lines = [line for line in collapsed.splitlines() if line.startswith("job:activities [i42];")]
+        self.assertTrue(lines)
+        self.assertIn("busy_parse", lines[0])
+        self.assertTrue(lines[0].rsplit(" ", 1)[1].isdigit())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from garmin import ratelimit
+from garmin.ratelimit import BULK, LIVE, UpstreamLimiter
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.response = type("Response", (), {"status_code": status})()
+
+
+class TestUpstreamLimiter(unittest.TestCase):
+    def test_token_bucket_caps_rate(self):
+        limiter = UpstreamLimiter("test", rate=20, burst=2, max_concurrency=4)
+        started = time.monotonic()
+        for _ in range(6):
+            with limiter.slot():
+                pass
+
+        # Two from the burst, then four more at 20/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_aimd_limit(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, max_concurrency=8)
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(20):
+            with limiter.slot():
+                pass
+        self.assertGreater(limiter.limit, 6)
+        grown = limiter.limit
+
+        with self.assertRaises(HTTPError):
+            with limiter.slot():
+                raise HTTPError(503)
+        with limiter.slot() as call:
+            call.status = 429
+            call.retry_after = 0.2
+
+        state = limiter.state()
+        self.assertLess(state["limit"], grown / 3)
+        self.assertEqual((state["throttled"], state["errors"], state["requests"]), (1, 1, 22))
+        started = time.monotonic()
+        with limiter.slot():
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_client_errors_are_not_backed_off(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, max_concurrency=8)
+        with self.assertRaises(HTTPError):
+            with limiter.slot():
+                raise HTTPError(404)
+
+        self.assertGreater(limiter.limit, 4)
+
+    def test_live_goes_ahead_of_bulk(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, max_concurrency=1)
+        order = []
+        release = threading.Event()
+
+        def hold():
+            with limiter.slot(BULK):
+                release.wait(5)
+
+        def call(prio, name):
+            with ratelimit.priority(prio):
+                with limiter.slot():
+                    order.append(name)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        time.sleep(0.05)
+        bulk = threading.Thread(target=call, args=(BULK, "bulk"))
+        bulk.start()
+        time.sleep(0.05)
+        live = threading.Thread(target=call, args=(LIVE, "live"))
+        live.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in (holder, bulk, live):
+            thread.join(5)
+
+        self.assertEqual(order, ["live", "bulk"])
+
+    def test_async_slot_waits_without_blocking_the_loop(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, max_concurrency=1)
+        release = threading.Event()
+
+        def hold():
+            with limiter.slot():
+                release.wait(5)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        time.sleep(0.05)
+
+        async def scenario():
+            ticks = 0
+
+            async def call():
+                async with limiter.slot_async() as upstream:
+                    upstream.status = 200
+                    return limiter.state()["in_flight"][LIVE]
+
+            waiter = asyncio.ensure_future(call())
+            while ticks < 5:
+                await asyncio.sleep(0.01)
+                ticks += 1
+            self.assertFalse(waiter.done())
+            self.assertEqual(limiter.state()["waiting"][LIVE], 1)
+            release.set()
+            return await asyncio.wait_for(waiter, 2)
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+        holder.join(5)
+        self.assertEqual(limiter.state()["in_flight"], {LIVE: 0, BULK: 0})
+        self.assertEqual(limiter.state()["waiting"], {LIVE: 0, BULK: 0})
+
+    def test_bulk_leaves_headroom_for_live(self):
+        limiter = UpstreamLimiter("test", rate=1000, burst=1000, max_concurrency=8)
+
+        self.assertEqual(limiter.concurrency_for(LIVE), 4)
+        self.assertEqual(limiter.concurrency_for(BULK), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
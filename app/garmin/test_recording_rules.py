@@ -0,0 +1,40 @@
+import os
+import unittest
+
+import garmin.recording_rules as recording_rules
+from garmin.metrics import Metrics
+
+RULES_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "helm", "templates", "garmin-recording-rules.yaml")
+
+
+class TestRecordingRules(unittest.TestCase):
+    def test_window_rules_are_opt_in(self):
+        rules = recording_rules.build_rules(Metrics())
+        records = {rule["record"] for group in rules["spec"]["groups"] for rule in group["rules"]}
+        windowed = {record for record in records if ":avg_over_time_" in record}
+        expected = {f"athlete:{name}:avg_over_time_{window}"
+                    for name, windows in recording_rules.WINDOW_METRICS.items() for window in windows}
+        self.assertEqual(windowed, expected)
+        self.assertIn("athlete:heartRateVariability:ratio_to_mean_7d", records)
+        self.assertNotIn("athlete:lastUploadSyncTime:avg_over_time_7d", records)
+
+    def test_unknown_window_metric_rejected(self):
+        with self.assertRaises(ValueError):
+            recording_rules.window_rules(Metrics().catalogue(), {"restingHeartRat": ("7d",)})
+
+    def test_rolling_rule_expression(self):
+        rules = recording_rules.rolling_rules(["restingHeartRate"], (7,))
+        self.assertEqual(rules, [{
+            "record": "athlete:restingHeartRate:ratio_to_mean_7d",
+            "expr": 'max by (athlete) (restingHeartRate) / max by (athlete) (restingHeartRateRollingMean{window="7d"})',
+        }])
+
+    def test_checked_in_rules_are_current(self):
+        with open(RULES_PATH, encoding="utf8") as f:
+            checked_in = f.read()
+        self.assertEqual(checked_in, recording_rules.to_yaml(recording_rules.build_rules()),
+                         "Regenerate from app/ with `python -m garmin.recording_rules > ../helm/templates/garmin-recording-rules.yaml`")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from flask import Flask
+
+from garmin.response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.cache = ResponseCache(ttl=60)
+        self.calls = []
+
+        @self.app.route('/intervals/activities')
+        @self.cache.cached
+        def activities():
+            self.calls.append(1)
+            time.sleep(0.2)
+            return f"computed {len(self.calls)}"
+
+        self.client = self.app.test_client()
+
+    def test_concurrent_requests_share_one_computation(self):
+        responses = []
+
+        def fetch():
+            responses.append(self.app.test_client().get('/intervals/activities?weeks=6').data)
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(set(responses), {b"computed 1"})
+
+    def test_keys_are_normalized_by_args(self):
+        self.client.get('/intervals/activities?weeks=6&athlete=ciara')
+        self.client.get('/intervals/activities?athlete=ciara&weeks=6')
+        self.client.get('/intervals/activities?weeks=52')
+
+        self.assertEqual(len(self.calls), 2)
+
+    def test_purge_and_expiry(self):
+        self.client.get('/intervals/activities')
+        self.assertEqual(self.cache.purge('/intervals'), 1)
+        self.client.get('/intervals/activities')
+        self.assertEqual(len(self.calls), 2)
+
+        self.cache.ttl = 0
+        self.cache.purge()
+        self.client.get('/intervals/activities')
+        self.client.get('/intervals/activities')
+        self.assertEqual(len(self.calls), 4)
+
+    def test_expired_and_least_recently_used_entries_are_evicted(self):
+        cache = ResponseCache(ttl=60, maxsize=2)
+        for key in ("a", "b"):
+            cache.get_or_compute(key, lambda: key)
+        cache.get_or_compute("a", lambda: "recomputed")
+        cache.get_or_compute("c", lambda: "c")
+        self.assertEqual(list(cache.entries), ["a", "c"])
+
+        cache = ResponseCache(ttl=0)
+        cache.get_or_compute("a", lambda: "a")
+        cache.get_or_compute("b", lambda: "b")
+        self.assertEqual(list(cache.entries), ["b"])
+
+    def test_coroutines_share_entries_with_requests(self):
+        async def compute():
+            self.calls.append(1)
+            await asyncio.sleep(0.05)
+            return "computed async"
+
+        async def fetch_twice():
+            key = self.cache.make_key('/intervals/activities', [("weeks", "6")])
+            return await asyncio.gather(self.cache.get_or_compute_async(key, compute),
+                                        self.cache.get_or_compute_async(key, compute))
+
+        self.assertEqual(asyncio.run(fetch_twice()), ["computed async", "computed async"])
+        self.assertEqual(self.client.get('/intervals/activities?weeks=6').data, b"computed async")
+        self.assertEqual(len(self.calls), 1)
+
+    def test_errors_are_not_cached(self):
+        attempts = []
+
+        def failing():
+            attempts.append(1)
+            raise ValueError("upstream down")
+
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.get_or_compute("key", failing)
+
+        self.assertEqual(len(attempts), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
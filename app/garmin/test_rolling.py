@@ -0,0 +1,55 @@
+import datetime
+import statistics
+import unittest
+
+from app.garmin.rolling import RollingStats, RollingWindow
+
+
+def day(n):
+    return datetime.date(2024, 1, 1) + datetime.timedelta(days=n)
+
+
+class TestRolling(unittest.TestCase):
+    def test_window_matches_statistics(self):
+        window = RollingWindow(7)
+        values = [52, 50, 55, 60, 48, 51, 53, 57, 49, 62]
+        for n, value in enumerate(values):
+            window.update(day(n), value)
+
+        self.assertEqual(window.count(), 7)
+        self.assertAlmostEqual(window.mean(), statistics.mean(values[-7:]))
+        self.assertAlmostEqual(window.stddev(), statistics.stdev(values[-7:]))
+
+    def test_same_day_replaces_value(self):
+        window = RollingWindow(3)
+        window.update(day(0), 50)
+        window.update(day(1), 60)
+        window.update(day(1), 70)
+
+        self.assertEqual(window.count(), 2)
+        self.assertAlmostEqual(window.mean(), 60)
+
+    def test_gaps_age_out_by_date(self):
+        window = RollingWindow(3)
+        window.update(day(0), 50)
+        window.update(day(1), 60)
+        window.update(day(5), 70)
+
+        self.assertEqual(window.count(), 1)
+
+    def test_ewma_and_zscore(self):
+        stats = RollingStats(windows=(3, 7), span=7)
+        for n, value in enumerate([50, 50, 50, 50, 50, 50]):
+            stats.update(day(n), value)
+        self.assertAlmostEqual(stats.ewma, 50)
+        self.assertIsNone(stats.zscore())
+
+        stats.update(day(6), 64)
+        stats.update(day(6), 57)
+
+        self.assertAlmostEqual(stats.ewma, 50 + 0.25 * 7)
+        self.assertGreater(stats.zscore(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,20 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 import datetime
 from app.garmin.scrape import Scrape
+from garmin.notifier import Notifier
+from garmin import ratelimit
 
 class TestScrape(unittest.TestCase):
     def setUp(self):
         self.scrape = Scrape()
+        self.scrape.notifier = Notifier(token="xoxb-test", channel="C123", retry_backoff=0)
+        limiter = ratelimit.UpstreamLimiter("garmin", rate=1000, burst=1000, max_concurrency=8)
+        limiters = patch.dict(ratelimit._limiters, {"garmin": limiter})
+        limiters.start()
+        self.addCleanup(limiters.stop)
 
     @patch('garth.connectapi')
     def test_get_daily_data(self, mock_connectapi):
@@ -38,6 +47,23 @@ class TestScrape(unittest.TestCase):
             expected_date = (datetime.datetime.today() - datetime.timedelta(days=i + 1)).strftime('%Y-%m-%d')
             self.assertEqual(daily_data['summary'], f"data_for_{expected_date}")
 
+    @patch('garth.connectapi')
+    def test_get_historical_data_reads_store_first(self, mock_connectapi):
+        mock_connectapi.side_effect = lambda endpoint, params=None: {"calendarDate": params['calendarDate']}
+        with tempfile.TemporaryDirectory() as garth_folder:
+            with patch.dict(os.environ, {"GARTH_FOLDER": garth_folder}):
+                scrape = Scrape()
+            scrape.get_historical_data(4)
+            self.assertEqual(mock_connectapi.call_count, 3)
+
+            mock_connectapi.reset_mock()
+            historical_data = scrape.get_historical_data(6)
+
+            self.assertEqual(mock_connectapi.call_count, 2)
+            self.assertEqual(len(historical_data), 5)
+            expected_date = (datetime.datetime.today() - datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+            self.assertEqual(historical_data[0]["calendarDate"], expected_date)
+
     @patch('app.garmin.scrape.Scrape.send_message')
     def test_check_last_sync(self, mock_send_message):
         dailies = {"lastUploadSyncTime": (datetime.datetime.now() - datetime.timedelta(hours=5)).timestamp() * 1000}
@@ -47,15 +73,27 @@ class TestScrape(unittest.TestCase):
         mock_send_message.assert_called_once()
         msg = mock_send_message.call_args[0][0]
         self.assertIn("Stale watch sync", msg)
+        self.assertEqual(mock_send_message.call_args[1]["alert_type"], "stale_sync:default")
 
     @patch('slack_sdk.WebClient.chat_postMessage')
     def test_send_message(self, mock_chat_post_message):
         mock_chat_post_message.return_value = {"ok": True}
         msg = "Test message"
 
-        self.scrape.send_message(msg)
+        self.assertTrue(self.scrape.send_message(msg))
+        self.scrape.notifier.flush()
+
+        mock_chat_post_message.assert_called_once_with(channel="C123", text=msg)
+
+    @patch('slack_sdk.WebClient.chat_postMessage')
+    def test_send_message_deduplicates(self, mock_chat_post_message):
+        mock_chat_post_message.return_value = {"ok": True}
+
+        self.assertTrue(self.scrape.send_message("first", alert_type="stale_sync"))
+        self.assertFalse(self.scrape.send_message("second", alert_type="stale_sync"))
+        self.scrape.notifier.flush()
 
-        mock_chat_post_message.assert_called_once_with(channel=self.scrape.slack_channel, text=msg)
+        mock_chat_post_message.assert_called_once_with(channel="C123", text="first")
 
 if __name__ == "__main__":
     unittest.main()
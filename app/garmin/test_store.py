@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from unittest.mock import patch
+
+from app.garmin.store import DailyStore
+
+
+class TestDailyStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = DailyStore(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_upsert_and_range(self):
+        self.store.upsert({"calendarDate": "2024-01-01", "restingHeartRate": 50}, fetched_at="2024-01-02T08:00:00")
+        self.store.upsert({"calendarDate": "2024-01-02", "restingHeartRate": 52}, fetched_at="2024-01-03T08:00:00")
+        self.store.upsert({"calendarDate": "2024-01-02", "restingHeartRate": 53}, fetched_at="2024-01-03T09:00:00")
+        self.store.upsert({"calendarDate": "2024-01-05", "restingHeartRate": 55}, fetched_at="2024-01-06T08:00:00")
+
+        history = self.store.get_range("2024-01-01", "2024-01-03")
+
+        self.assertEqual([d["restingHeartRate"] for d in history], [50, 53])
+
+    def test_missing_dates_ignores_same_day_snapshots(self):
+        self.store.upsert({"calendarDate": "2024-01-01"}, fetched_at="2024-01-02T08:00:00")
+        self.store.upsert({"calendarDate": "2024-01-02"}, fetched_at="2024-01-02T12:00:00")
+
+        missing = self.store.missing_dates(["2024-01-03", "2024-01-02", "2024-01-01"])
+
+        self.assertEqual(missing, ["2024-01-03", "2024-01-02"])
+
+
+class TestJournalMode(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def journal_mode(self):
+        with closing(sqlite3.connect(os.path.join(self.temp_dir.name, "dailies.db"))) as conn:
+            return conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_single_replica_uses_wal(self):
+        DailyStore(self.temp_dir.name)
+        self.assertEqual(self.journal_mode(), "wal")
+
+    @patch.dict(os.environ, {"SCHEDULER_INTERVAL": "300"}, clear=True)
+    def test_cluster_mode_uses_rollback_journal(self):
+        DailyStore(self.temp_dir.name)
+        self.assertEqual(self.journal_mode(), "delete")
+
+    @patch.dict(os.environ, {"SQLITE_JOURNAL_MODE": "wal;"}, clear=True)
+    def test_unknown_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            DailyStore(self.temp_dir.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
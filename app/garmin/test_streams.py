@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from garmin.streams import read_streams
+
+
+class TestReadStreams(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "activity-i1.csv")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_schema_columns_only(self):
+        pd.DataFrame({
+            "time": [0, 1, 2],
+            "watts": [100, None, 300],
+            "heartrate": [120, 121, 122],
+            "latlng": ["53.3,-6.2"] * 3,
+            "temp": [11, 11, 12],
+        }).to_csv(self.path, index=False)
+
+        streams = read_streams(self.path)
+
+        self.assertEqual(set(streams), {"time", "watts", "heartrate"})
+        self.assertEqual(streams["time"].dtype, np.float64)
+        self.assertEqual(streams["watts"].dtype, np.float32)
+        self.assertTrue(np.isnan(streams["watts"][1]))
+
+    def test_chunked_read_matches_single_read(self):
+        rng = np.random.default_rng(3)
+        pd.DataFrame({
+            "time": np.arange(10001),
+            "watts": rng.integers(0, 400, 10001),
+            "cadence": rng.integers(0, 110, 10001),
+        }).to_csv(self.path, index=False)
+
+        whole = read_streams(self.path, chunk_rows=100000)
+        chunked = read_streams(self.path, chunk_rows=999)
+
+        for col in whole:
+            np.testing.assert_array_equal(whole[col], chunked[col])
+        self.assertEqual(len(chunked["time"]), 10001)
+
+    def test_non_numeric_values_become_nan(self):
+        with open(self.path, "w") as f:
+            f.write("time,watts\n0,100\n1,oops\n2,300\n")
+
+        streams = read_streams(self.path)
+
+        self.assertEqual(streams["watts"][0], 100)
+        self.assertTrue(np.isnan(streams["watts"][1]))
+
+    def test_header_only(self):
+        with open(self.path, "w") as f:
+            f.write("time,watts,latlng\n")
+
+        streams = read_streams(self.path)
+
+        self.assertEqual(set(streams), {"time", "watts"})
+        self.assertEqual(len(streams["time"]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+import requests
+
+from garmin import utils
+
+BODY = b"id,start_date_local,type\n" + b"i1,2024-06-01T10:00:00,Ride\n" * 500
+
+
+class FakeIntervalsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            return
+        payload = BODY
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("ETag", '"v1"')
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(BODY)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestMakeRequest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.server = HTTPServer(("127.0.0.1", 0), FakeIntervalsHandler)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/v1/athlete/0/activities.csv"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.temp_dir.cleanup()
+
+    def test_compressed_transfer(self):
+        with patch.dict(os.environ, {"GARTH_FOLDER": self.temp_dir.name}):
+            res = utils.make_request("get", self.url, "key")
+
+        self.assertIn("gzip", self.server.requests[0]["Accept-Encoding"])
+        self.assertEqual(res.content, BODY)
+
+    def test_not_modified_is_served_from_cache(self):
+        with patch.dict(os.environ, {"GARTH_FOLDER": self.temp_dir.name}):
+            first = utils.make_request("get", self.url, "key")
+            second = utils.make_request("get", self.url, "key")
+
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.text, BODY.decode("utf-8"))
+
+    def test_cache_is_keyed_by_api_key(self):
+        with patch.dict(os.environ, {"GARTH_FOLDER": self.temp_dir.name}):
+            utils.make_request("get", self.url, "key")
+            utils.make_request("get", self.url, "other-key")
+
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+
+    def test_uncached_request_sends_no_validators(self):
+        with patch.dict(os.environ, {"GARTH_FOLDER": self.temp_dir.name}):
+            utils.make_request("get", self.url, "key")
+            res = utils.make_request("get", self.url, "key", use_cache=False)
+
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+        self.assertEqual(res.content, BODY)
+
+    def test_async_request_shares_the_cache(self):
+        async def fetch():
+            try:
+                return await utils.make_request_async("get", self.url, "key")
+            finally:
+                await utils.close_async_clients()
+
+        with patch.dict(os.environ, {"GARTH_FOLDER": self.temp_dir.name}):
+            first = asyncio.run(fetch())
+            utils.make_request("get", self.url, "key")
+            second = asyncio.run(fetch())
+
+        self.assertEqual(first.content, BODY)
+        self.assertFalse(getattr(first, "from_cache", False))
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+        self.assertEqual(self.server.requests[2]["If-None-Match"], '"v1"')
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.text, BODY.decode("utf-8"))
+
+
+class TestHttpCacheEviction(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def response(self, body):
+        res = requests.Response()
+        res.status_code = 200
+        res._content = body
+        res.headers["ETag"] = '"v1"'
+        return res
+
+    def test_least_recently_used_evicted(self):
+        cache = utils.HttpCache(self.temp_dir.name, max_bytes=3500)
+        for index, key in enumerate(["a", "b", "c"]):
+            cache.store(key, self.response(b"x" * 1000))
+            os.utime(os.path.join(self.temp_dir.name, key + ".json"), (1000 + index, 1000 + index))
+        self.assertIsNotNone(cache.load("a"))
+
+        cache.store("d", self.response(b"x" * 1000))
+
+        self.assertIsNone(cache.load("b"))
+        self.assertIsNone(cache.load("c"))
+        self.assertIsNotNone(cache.load("a"))
+        self.assertIsNotNone(cache.load("d"))
+        self.assertLessEqual(sum(size for _, size in cache.entries().values()), 3500)
+
+
+if __name__ == "__main__":
+    unittest.main()
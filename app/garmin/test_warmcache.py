@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import garmin.warmcache as warmcache
+from garmin.activity import ActivitySummary
+from garmin.intervals import Intervals
+from garmin.warmcache import WarmCache
+
+SPORT_SETTINGS = [{"types": ["Ride"], "mmp_model": {"ftp": 250}, "power_zones": None, "hr_zones": None,
+                   "pace_zones": None}]
+
+
+class TestWarmCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "warm-cache.json.gz")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        cache = WarmCache()
+        cache.put_daily("alice", {"calendarDate": "2024-05-01", "restingHeartRate": 48})
+        cache.put_settings("alice", SPORT_SETTINGS)
+        summary = ActivitySummary.from_metrics({"id": "i1", "type": "Ride", "tss": 80.5,
+                                                "zone_times": {"Z1": 60.0, "Z2": 120.0}})
+        cache.put_activities("alice", [summary])
+        self.assertGreater(cache.save(self.path), 0)
+
+        restored = WarmCache()
+        self.assertTrue(restored.load(self.path))
+        self.assertEqual(restored.dailies["alice"]["data"]["restingHeartRate"], 48)
+        self.assertEqual(restored.get_settings("alice"), SPORT_SETTINGS)
+        activity = restored.activities["alice"]["data"][0]
+        self.assertIsInstance(activity, ActivitySummary)
+        self.assertEqual(activity.to_dict(), summary.to_dict())
+
+    def test_old_entries_dropped(self):
+        cache = WarmCache()
+        cache.put_daily("alice", {"restingHeartRate": 48})
+        cache.put_daily("bob", {"restingHeartRate": 52})
+        cache.dailies["bob"]["saved_at"] -= 7200
+        cache.save(self.path)
+
+        restored = WarmCache()
+        restored.load(self.path, max_age=3600)
+        self.assertEqual(list(restored.dailies), ["alice"])
+
+    def test_settings_expire(self):
+        cache = WarmCache(settings_ttl=60)
+        cache.put_settings("alice", SPORT_SETTINGS)
+        self.assertIsNotNone(cache.get_settings("alice"))
+        cache.settings["alice"]["saved_at"] = time.time() - 120
+        self.assertIsNone(cache.get_settings("alice"))
+
+    def test_unreadable_or_missing_file(self):
+        cache = WarmCache()
+        self.assertFalse(cache.load(self.path))
+        with open(self.path, "wb") as f:
+            f.write(b"not gzip")
+        self.assertFalse(cache.load(self.path))
+        self.assertEqual(cache.dailies, {})
+
+    def test_snapshotter_saves_on_stop(self):
+        cache = WarmCache()
+        cache.put_daily("alice", {"restingHeartRate": 48})
+        snapshotter = warmcache.Snapshotter(cache, self.path, interval=3600)
+        snapshotter.start()
+        snapshotter.stop()
+        self.assertTrue(WarmCache().load(self.path))
+
+    def test_only_the_leader_saves(self):
+        leader = WarmCache()
+        leader.put_daily("alice", {"restingHeartRate": 48})
+        leader.save(self.path)
+        leading = [False]
+        snapshotter = warmcache.Snapshotter(WarmCache(), self.path, should_save=lambda: leading[0])
+
+        snapshotter.stop()
+
+        restored = WarmCache()
+        restored.load(self.path)
+        self.assertEqual(restored.dailies["alice"]["data"], {"restingHeartRate": 48})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [os.path.basename(self.path)])
+
+
+class TestCachedSettings(unittest.TestCase):
+    @patch.dict(os.environ, {"INTERVALS_BASE_URL": "https://intervals.example"})
+    @patch("garmin.intervals.warm_cache", new_callable=WarmCache)
+    @patch("garmin.utils.make_request")
+    def test_settings_fetched_once(self, mock_request, mock_cache):
+        response = MagicMock()
+        response.json.return_value = {"sportSettings": SPORT_SETTINGS}
+        mock_request.return_value = response
+
+        first = Intervals()
+        second = Intervals()
+
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(first.ftp, 250)
+        self.assertEqual(second.ftp, 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
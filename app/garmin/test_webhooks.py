@@ -0,0 +1,47 @@
+import unittest
+
+import garmin.webhooks as webhooks
+
+SAMPLE_PAYLOAD = {
+    "secret": "s3cret",
+    "events": [
+        {"athlete_id": "i1", "type": "ACTIVITY_UPLOADED", "activity": {"id": "i100", "type": "Ride"}},
+        {"athlete_id": "i1", "type": "WELLNESS_UPDATED", "records": []},
+        {"athlete_id": "i1", "type": "ACTIVITY_ANALYZED", "activity": {"id": "i100", "type": "Ride"}},
+        {"athlete_id": "i1", "type": "ACTIVITY_DELETED", "activity_id": "i90"},
+        {"athlete_id": "i1", "type": "ACTIVITY_UPDATED", "activity": {}},
+    ],
+}
+
+
+class TestWebhookEvents(unittest.TestCase):
+    def test_activity_events(self):
+        self.assertEqual(webhooks.activity_events(SAMPLE_PAYLOAD),
+                         [("i100", webhooks.PARSE), ("i90", webhooks.DELETE)])
+
+    def test_last_event_wins(self):
+        payload = {"events": [
+            {"type": "ACTIVITY_UPLOADED", "activity": {"id": "i1"}},
+            {"type": "ACTIVITY_DELETED", "activity": {"id": "i1"}},
+        ]}
+        self.assertEqual(webhooks.activity_events(payload), [("i1", webhooks.DELETE)])
+
+    def test_no_events(self):
+        self.assertEqual(webhooks.activity_events({}), [])
+
+    def test_check_secret(self):
+        self.assertTrue(webhooks.check_secret("s3cret", SAMPLE_PAYLOAD, {}))
+        self.assertTrue(webhooks.check_secret("s3cret", {}, {"X-Webhook-Secret": "s3cret"}))
+        self.assertFalse(webhooks.check_secret("s3cret", {"secret": "wrong"}, {}))
+        self.assertFalse(webhooks.check_secret("s3cret", {}, {}))
+
+    def test_pending_activities(self):
+        pending = webhooks.PendingActivities()
+        self.assertTrue(pending.add(("default", "i1", webhooks.PARSE)))
+        self.assertFalse(pending.add(("default", "i1", webhooks.PARSE)))
+        pending.discard(("default", "i1", webhooks.PARSE))
+        self.assertTrue(pending.add(("default", "i1", webhooks.PARSE)))
+
+
+if __name__ == '__main__':
+    unittest.main()
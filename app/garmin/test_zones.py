@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from garmin.intervals import Intervals
+from garmin.zones import ZoneModel, ZoneSet, from_sport_settings
+
+SPORT_SETTINGS = [
+    {"types": ["Ride", "VirtualRide"], "ftp": 200, "lthr": 170,
+     "power_zones": [55, 75, 90, 105, 120, 150, 999],
+     "hr_zones": [140, 150, 160, 170, 180, 190, 200]},
+    {"types": ["Run"], "lthr": 175, "threshold_pace": 4.0,
+     "pace_zones": [77.5, 87.7, 94.3, 100, 103.4, 111.5, 999],
+     "hr_zones": [145, 155, 165, 175, 185, 195, 205]},
+]
+
+
+class TestZones(unittest.TestCase):
+    def test_histogram_boundaries(self):
+        zones = ZoneSet([0, 100, 200])
+        values = np.array([-5, 0, 99.9, 100, 150, 200, 500, np.nan])
+        weights = np.ones(len(values))
+
+        self.assertEqual(zones.histogram(values, weights), {"Z1": 2.0, "Z2": 2.0, "Z3": 2.0})
+
+    def test_from_sport_settings(self):
+        models = from_sport_settings(SPORT_SETTINGS, ftp=218)
+
+        self.assertIs(models["Ride"], models["VirtualRide"])
+        np.testing.assert_allclose(models["Ride"].power.edges, [0, 110, 150, 180, 210, 240, 300])
+        self.assertEqual(models["Ride"].hr.labels, ["Z1", "Z2", "Z3", "Z4", "Z5", "Z6", "Z7"])
+        np.testing.assert_allclose(models["Run"].pace.edges[:2], [0, 3.1])
+        self.assertIsNone(models["Run"].power)
+        self.assertEqual(models["Run"].lthr, 175)
+
+    def test_bike_metrics_use_athlete_zones(self):
+        df = pd.DataFrame({
+            "time": np.arange(400),
+            "watts": np.repeat([100.0, 160.0, 200.0, 320.0], 100),
+            "cadence": np.full(400, 90.0),
+            "heartrate": np.repeat([135.0, 145.0, 165.0, 185.0], 100),
+        })
+        model = from_sport_settings(SPORT_SETTINGS)["Ride"]
+
+        metrics = Intervals.compute_bike_metrics(df, 200, model)
+
+        self.assertEqual(len(metrics["zone_times"]), 7)
+        self.assertEqual(metrics["zone_times"]["Z1"], 100.0)
+        self.assertEqual(metrics["zone_times"]["Z3"], 100.0)
+        self.assertEqual(metrics["zone_times"]["Z7"], 100.0)
+        self.assertEqual(metrics["hr_zone_times"]["Z1"], 100.0)
+        self.assertEqual(metrics["hr_zone_times"]["Z6"], 100.0)
+
+    def test_default_power_zones_without_settings(self):
+        model = ZoneModel()
+
+        self.assertEqual(model.power_zones(200).zone_of(120), "Z2")
+        self.assertEqual(model.power_zones(200).labels, ["Z1", "Z2", "Z3", "Z4", "Z5", "Z6"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,59 @@
 import datetime
+import os
+
+# Metrics written to each backfill block, with their HELP text
+TSDB_METRICS = [
+    ("minHeartRate", "Min heart rate"),
+    ("maxHeartRate", "Max heart rate"),
+    ("restingHeartRate", "Resting heart rate"),
+    ("lastSevenDaysAvgRestingHeartRate", "Sevenday avg heart rate"),
+    ("bodyBatteryHighestValue", "Body battery highest value"),
+    ("bodyBatteryLowestValue", "body battery lowest value"),
+    ("bodyBatteryDuringSleep", "Body battery recovered during sleep"),
+    ("averageStressLevel", "Average stress level"),
+    ("maxStressLevel", "Max daily stress level"),
+    ("averageSpo2", "Average SPO2"),
+    ("lowestSpo2", "Lowest SPO2"),
+    ("sedentarySeconds", "time spend sedentary"),
+    ("sleepingSeconds", "seconds spent sleeping"),
+    ("activeSeconds", "seconds spent highly active"),
+    ("highlyActiveSeconds", "time spent highly active"),
+]
+
+
+def label_value(value):
+    """Escape a label value for the exposition format and PromQL selectors."""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def get_folder():
+    """BACKFILL_FOLDER, or backfill in GARTH_FOLDER. None keeps the hard-coded path."""
+    folder = os.environ.get("BACKFILL_FOLDER")
+    if folder:
+        return folder
+    folder = os.environ.get("GARTH_FOLDER")
+    return os.path.join(folder, "backfill") if folder else None
 
 
 class TsdbGenerator:
-    def create_backfill(self, historical_data):
+    def __init__(self, folder=None, athlete=None):
+        # Where block files are written, the original hard-coded path when unset
+        self.folder = folder
+        # With an athlete, samples carry its `athlete` label like the live
+        # gauges do, and block files go into a subfolder of its own
+        self.athlete = athlete
+
+    def series(self, name):
+        if self.athlete is None:
+            return name
+        return f'{name}{{athlete="{label_value(self.athlete)}"}}'
+
+    def create_backfill(self, historical_data, plan=None):
+        """Write blocks for each daily. `plan` maps dates to the metrics to write, default all."""
         for daily in historical_data:
             daily = self.cleanup_daily(daily)
-            self.generate_tsdb_data(daily)
+            metrics = plan.get(daily['calendarDate']) if plan is not None else None
+            self.generate_tsdb_data(daily, metrics)
 
     def get_timestamp_from_date(self, date):
         timestamps = []
@@ -18,63 +66,53 @@ class TsdbGenerator:
         return timestamps
 
 
-    def generate_tsdb_data(self, daily):
+    def generate_tsdb_data(self, daily, metrics=None):
         timestamps = self.get_timestamp_from_date(daily['calendarDate'])
         for timestamp in timestamps:
-            self.generate_blockfile(timestamp, daily)
+            self.generate_blockfile(timestamp, daily, metrics)
 
-    def generate_blockfile(self, timestamp, daily):
-        filename = f"c:\\Users\\ciara\\RaspberriPi\\K8s\\raw\\backfill_{timestamp}.txt"
+    def generate_blockfile(self, timestamp, daily, metrics=None):
+        if self.folder:
+            folder = os.path.join(self.folder, self.athlete) if self.athlete is not None else self.folder
+            os.makedirs(folder, exist_ok=True)
+            filename = os.path.join(folder, f"backfill_{timestamp}.txt")
+        else:
+            filename = f"c:\\Users\\ciara\\RaspberriPi\\K8s\\raw\\backfill_{timestamp}.txt"
         print(f"Getting TSDB data for {daily['calendarDate']}")
         with open(filename, "w", newline="\n") as f:
-            f.write("# HELP minHeartRate Min heart rate\n")
-            f.write("# TYPE minHeartRate gauge\n")
-            f.write(f"minHeartRate {daily['minHeartRate']} {timestamp}\n")
-            f.write("# HELP maxHeartRate Max heart rate\n")
-            f.write("# TYPE maxHeartRate gauge\n")
-            f.write(f"maxHeartRate {daily['maxHeartRate']} {timestamp}\n")
-            f.write("# HELP restingHeartRate Resting heart rate\n")
-            f.write("# TYPE restingHeartRate gauge\n")
-            f.write(f"restingHeartRate {daily['restingHeartRate']} {timestamp}\n")
-            f.write("# HELP lastSevenDaysAvgRestingHeartRate Sevenday avg heart rate\n")
-            f.write("# TYPE lastSevenDaysAvgRestingHeartRate gauge\n")
-            f.write(f"lastSevenDaysAvgRestingHeartRate {daily['lastSevenDaysAvgRestingHeartRate']} {timestamp}\n")
-            f.write("# HELP bodyBatteryHighestValue Body battery highest value\n")
-            f.write("# TYPE bodyBatteryHighestValue gauge\n")
-            f.write(f"bodyBatteryHighestValue {daily['bodyBatteryHighestValue']} {timestamp}\n")
-            f.write("# HELP bodyBatteryLowestValue body battery lowest value\n")
-            f.write("# TYPE bodyBatteryLowestValue gauge\n")
-            f.write(f"bodyBatteryLowestValue {daily['bodyBatteryLowestValue']} {timestamp}\n")
-            f.write("# HELP bodyBatteryDuringSleep Body battery recovered during sleep\n")
-            f.write("# TYPE bodyBatteryDuringSleep gauge\n")
-            f.write(f"bodyBatteryDuringSleep {daily['bodyBatteryDuringSleep']} {timestamp}\n")
-            f.write("# HELP averageStressLevel Average stress level\n")
-            f.write("# TYPE averageStressLevel gauge\n")
-            f.write(f"averageStressLevel {daily['averageStressLevel']} {timestamp}\n")
-            f.write("# HELP maxStressLevel Max daily stress level\n")
-            f.write("# TYPE maxStressLevel gauge\n")
-            f.write(f"maxStressLevel {daily['maxStressLevel']} {timestamp}\n")
-            f.write("# HELP averageSpo2 Average SPO2\n")
-            f.write("# TYPE averageSpo2 gauge\n")
-            f.write(f"averageSpo2 {daily['averageSpo2']} {timestamp}\n")
-            f.write("# HELP lowestSpo2 Lowest SPO2\n")
-            f.write("# TYPE lowestSpo2 gauge\n")
-            f.write(f"lowestSpo2 {daily['lowestSpo2']} {timestamp}\n")
-            f.write("# HELP sedentarySeconds time spend sedentary\n")
-            f.write("# TYPE sedentarySeconds gauge\n")
-            f.write(f"sedentarySeconds {daily['sedentarySeconds']} {timestamp}\n")
-            f.write("# HELP sleepingSeconds seconds spent sleeping\n")
-            f.write("# TYPE sleepingSeconds gauge\n")
-            f.write(f"sleepingSeconds {daily['sleepingSeconds']} {timestamp}\n")
-            f.write("# HELP activeSeconds seconds spent highly active\n")
-            f.write("# TYPE activeSeconds gauge\n")
-            f.write(f"activeSeconds {daily['activeSeconds']} {timestamp}\n")
-            f.write("# HELP highlyActiveSeconds time spent highly active\n")
-            f.write("# TYPE highlyActiveSeconds gauge\n")
-            f.write(f"highlyActiveSeconds {daily['highlyActiveSeconds']} {timestamp}\n")
+            for name, help_text in TSDB_METRICS:
+                if metrics is not None and name not in metrics:
+                    continue
+                f.write(f"# HELP {name} {help_text}\n")
+                f.write(f"# TYPE {name} gauge\n")
+                f.write(f"{self.series(name)} {daily[name]} {timestamp}\n")
             f.write("# EOF")
             f.close()
 
+    def write_openmetrics(self, historical_data, path, metrics=None):
+        """Write every daily into one OpenMetrics file for `promtool tsdb create-blocks-from openmetrics`.
+
+        Each metric family appears once, with its samples in timestamp order.
+        Returns the number of samples written.
+        """
+        dailies = sorted((self.cleanup_daily(daily) for daily in historical_data),
+                         key=lambda daily: daily['calendarDate'])
+        samples = 0
+        with open(path, "w", newline="\n") as f:
+            for name, help_text in TSDB_METRICS:
+                if metrics is not None and name not in metrics:
+                    continue
+                f.write(f"# HELP {name} {help_text}\n")
+                f.write(f"# TYPE {name} gauge\n")
+                for daily in dailies:
+                    if name not in daily:
+                        continue
+                    for timestamp in self.get_timestamp_from_date(daily['calendarDate']):
+                        f.write(f"{self.series(name)} {daily[name]} {timestamp}\n")
+                        samples += 1
+            f.write("# EOF\n")
+        return samples
+
     def cleanup_daily(self, daily):
         for metric in daily:
             if daily[metric] is None:
@@ -1,6 +1,24 @@
+import asyncio
+import hashlib
+import json as jsonlib
+import os
+import threading
+
+import httpx
 import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.request import ACCEPT_ENCODING
 from datetime import datetime, timedelta
 
+import garmin.ratelimit as ratelimit
+
+# Sessions are kept per API key so connections are reused between requests
+_sessions = {}
+_sessions_lock = threading.Lock()
+_http_caches = {}
+# httpx clients for make_request_async, per API key, on the serving event loop
+_async_clients = {}
+
 def convert(o):
     if hasattr(o, 'item'):
         return o.item()
@@ -9,9 +27,13 @@ def convert(o):
     return str(o)
 
 def get_session(api_key):
-    session = requests.Session()
-    session.auth = ('API_KEY', api_key)
-    return session
+    with _sessions_lock:
+        session = _sessions.get(api_key)
+        if session is None:
+            session = requests.Session()
+            session.auth = ('API_KEY', api_key)
+            _sessions[api_key] = session
+        return session
 
 def get_date_from_weeks(weeks):
     today = datetime.now().date()
@@ -20,21 +42,204 @@ def get_date_from_weeks(weeks):
     return monday.strftime('%Y-%m-%d')
 
 
-def make_request(method, url, api_key, params=None, json=None, headers=None):
+class HttpCache:
+    """Response bodies stored on disk alongside their ETag/Last-Modified validators.
+
+    Cached GETs are revalidated with If-None-Match/If-Modified-Since and a
+    304 is answered from the stored body, so unchanged data isn't re-sent.
+    Once the folder grows past `max_bytes` the least recently used entries
+    are evicted; every lookup touches the entry's mtime.
+    """
+
+    def __init__(self, folder, max_bytes=None):
+        self.folder = folder
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        self.max_bytes = max_bytes
+        # Bytes on disk, counted on the first store and kept up to date from there
+        self.size = None
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, url, params, api_key):
+        raw = jsonlib.dumps([api_key, url, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def load(self, key):
+        path = os.path.join(self.folder, key + ".json")
+        try:
+            with open(path) as f:
+                meta = jsonlib.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta
+
+    def validators(self, meta):
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, key, res):
+        etag = res.headers.get("ETag")
+        last_modified = res.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        meta = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": res.encoding,
+            "content_type": res.headers.get("Content-Type"),
+        }
+        body_path = os.path.join(self.folder, key + ".body")
+        with open(body_path + ".tmp", "wb") as f:
+            f.write(res.content)
+        os.replace(body_path + ".tmp", body_path)
+        with open(os.path.join(self.folder, key + ".json.tmp"), "w") as f:
+            jsonlib.dump(meta, f)
+        os.replace(os.path.join(self.folder, key + ".json.tmp"), os.path.join(self.folder, key + ".json"))
+        self.added(len(res.content))
+
+    def entries(self):
+        """{key: (last used, bytes)} of every cached response."""
+        sizes = {}
+        used = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                key, ext = os.path.splitext(entry.name)
+                if ext not in (".json", ".body"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                sizes[key] = sizes.get(key, 0) + stat.st_size
+                if ext == ".json":
+                    used[key] = stat.st_mtime
+        return {key: (used.get(key, 0), size) for key, size in sizes.items()}
+
+    def added(self, nbytes):
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size in self.entries().values())
+            else:
+                self.size += nbytes
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        # Recount, other processes share the folder, then trim to 90% so it doesn't run every store
+        entries = self.entries()
+        self.size = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            for ext in (".json", ".body"):
+                try:
+                    os.remove(os.path.join(self.folder, key + ext))
+                except FileNotFoundError:
+                    pass
+            self.size -= size
+
+    def body(self, key):
+        try:
+            with open(os.path.join(self.folder, key + ".body"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def response(self, key, meta, not_modified):
+        """Build a 200 response from the stored body for a 304."""
+        body = self.body(key)
+        if body is None:
+            return None
+        res = requests.Response()
+        res.status_code = 200
+        res._content = body
+        res.encoding = meta.get("encoding")
+        res.headers = CaseInsensitiveDict(not_modified.headers)
+        if meta.get("content_type"):
+            res.headers["Content-Type"] = meta["content_type"]
+        res.url = not_modified.url
+        res.request = not_modified.request
+        res.from_cache = True
+        return res
+
+
+def get_http_cache():
+    garth_folder = os.environ.get("GARTH_FOLDER")
+    if not garth_folder:
+        return None
+    folder = os.path.join(garth_folder, "http-cache")
+    with _sessions_lock:
+        cache = _http_caches.get(folder)
+        if cache is None:
+            cache = HttpCache(folder)
+            _http_caches[folder] = cache
+        return cache
+
+
+def read_streaming(res, chunk_size=64 * 1024):
+    # iter_content decompresses gzip/br as it goes
+    res._content = b"".join(res.iter_content(chunk_size=chunk_size))
+    res._content_consumed = True
+    return res
+
+
+def make_request(method, url, api_key, params=None, json=None, headers=None, use_cache=True):
     session = get_session(api_key)
+    headers = dict(headers) if headers is not None else {}
     if json is not None:
-        if headers is None:
-            headers = {}
         headers['Content-Type'] = '*/*'
         headers['authorization'] = f"Basic {api_key}"
+    headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+    cache = get_http_cache() if use_cache and method.lower() == "get" else None
+    cached = None
+    if cache is not None:
+        key = cache.key(url, params, api_key)
+        cached = cache.load(key)
+        if cached is not None:
+            headers.update(cache.validators(cached))
 
-    res = session.request(
-        method,
-        url,
-        params=params,
-        json=json,
-        headers=headers)
-    
+    limiter = ratelimit.get_limiter("intervals")
+    with limiter.slot() as call:
+        res = session.request(
+            method,
+            url,
+            params=params,
+            json=json,
+            headers=headers,
+            stream=True)
+        call.status = res.status_code
+        call.retry_after = ratelimit.retry_after(res)
+        # The body is part of the call, so the slot stays held until it's read
+        if res.status_code != 304 or cached is None:
+            read_streaming(res)
+
+    if res.status_code == 304 and cached is not None:
+        cached_res = cache.response(key, cached, res)
+        res.close()
+        if cached_res is not None:
+            return cached_res
+        # Body went missing, fetch it again without validators
+        for header in ("If-None-Match", "If-Modified-Since"):
+            headers.pop(header, None)
+        with limiter.slot() as call:
+            res = session.request(method, url, params=params, json=json, headers=headers, stream=True)
+            call.status = res.status_code
+            call.retry_after = ratelimit.retry_after(res)
+            read_streaming(res)
+
+    if cache is not None and res.status_code == 200:
+        cache.store(key, res)
+    return check_response(res, method, url)
+
+
+def check_response(res, method, url):
     if res.status_code == 401:
         raise Exception("Invalid Credentials")
     if res.status_code == 403:
@@ -44,4 +249,79 @@ def make_request(method, url, api_key, params=None, json=None, headers=None):
     if res.status_code == 422:
         print(f"Can't process request for {url}")
         raise Exception("Could not process request")
-    return res
\ No newline at end of file
+    return res
+
+
+def get_async_client(api_key):
+    client = _async_clients.get(api_key)
+    if client is None:
+        client = httpx.AsyncClient(auth=('API_KEY', api_key), follow_redirects=True,
+                                   timeout=httpx.Timeout(30.0, connect=10.0))
+        _async_clients[api_key] = client
+    return client
+
+
+async def close_async_clients():
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def cached_async_response(body, meta, not_modified):
+    """make_request_async's counterpart of HttpCache.response."""
+    # The stored body is already decoded, so the 304's transfer headers don't apply to it
+    headers = [(name, value) for name, value in not_modified.headers.items()
+               if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+    if meta.get("content_type"):
+        headers = [(name, value) for name, value in headers if name.lower() != "content-type"]
+        headers.append(("Content-Type", meta["content_type"]))
+    res = httpx.Response(200, headers=headers, content=body, request=not_modified.request)
+    if meta.get("encoding"):
+        res.encoding = meta["encoding"]
+    res.from_cache = True
+    return res
+
+
+async def make_request_async(method, url, api_key, params=None, json=None, headers=None, use_cache=True):
+    """make_request for coroutines: same HTTP cache, limiter and errors, on an httpx.AsyncClient.
+
+    Disk access for the cache runs on a worker thread so the event loop
+    never waits on it.
+    """
+    client = get_async_client(api_key)
+    headers = dict(headers) if headers is not None else {}
+    if json is not None:
+        headers['Content-Type'] = '*/*'
+        headers['authorization'] = f"Basic {api_key}"
+    headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+
+    cache = get_http_cache() if use_cache and method.lower() == "get" else None
+    cached = None
+    if cache is not None:
+        key = cache.key(url, params, api_key)
+        cached = await asyncio.to_thread(cache.load, key)
+        if cached is not None:
+            headers.update(cache.validators(cached))
+
+    limiter = ratelimit.get_limiter("intervals")
+    async with limiter.slot_async() as call:
+        res = await client.request(method, url, params=params, json=json, headers=headers)
+        call.status = res.status_code
+        call.retry_after = ratelimit.retry_after(res)
+
+    if res.status_code == 304 and cached is not None:
+        body = await asyncio.to_thread(cache.body, key)
+        if body is not None:
+            return cached_async_response(body, cached, res)
+        # Body went missing, fetch it again without validators
+        for header in ("If-None-Match", "If-Modified-Since"):
+            headers.pop(header, None)
+        async with limiter.slot_async() as call:
+            res = await client.request(method, url, params=params, json=json, headers=headers)
+            call.status = res.status_code
+            call.retry_after = ratelimit.retry_after(res)
+
+    if cache is not None and res.status_code == 200:
+        await asyncio.to_thread(cache.store, key, res)
+    return check_response(res, method, url)
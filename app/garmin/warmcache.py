@@ -0,0 +1,151 @@
+import gzip
+import os
+import tempfile
+import threading
+import time
+
+import orjson
+
+from garmin.activity import ActivitySummary, dumps
+
+VERSION = 1
+
+
+class WarmCache:
+    """In-memory state worth carrying across a restart, per athlete.
+
+    Holds the last daily summary scraped from Garmin, the intervals.icu
+    athlete settings (FTP and zones) and the recent parsed activity
+    summaries. save() writes it all to one gzipped JSON file on the volume
+    and load() reads it back at startup, so gauges and settings are there
+    before the first request rather than after the first upstream round trip.
+    """
+
+    def __init__(self, settings_ttl=None):
+        if settings_ttl is None:
+            settings_ttl = float(os.environ.get("ATHLETE_SETTINGS_TTL", 3600))
+        self.settings_ttl = settings_ttl
+        self.dailies = {}
+        self.settings = {}
+        self.activities = {}
+        self.lock = threading.Lock()
+
+    def put_daily(self, athlete, dailies):
+        with self.lock:
+            self.dailies[athlete] = {"saved_at": time.time(), "data": dailies}
+
+    def put_settings(self, athlete, settings):
+        with self.lock:
+            self.settings[athlete] = {"saved_at": time.time(), "data": settings}
+
+    def get_settings(self, athlete):
+        """The athlete's cached settings, or None once they're older than `settings_ttl`."""
+        with self.lock:
+            entry = self.settings.get(athlete)
+        if entry is None or time.time() - entry["saved_at"] > self.settings_ttl:
+            return None
+        return entry["data"]
+
+    def put_activities(self, athlete, summaries):
+        with self.lock:
+            self.activities[athlete] = {"saved_at": time.time(), "data": list(summaries)}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "version": VERSION,
+                "saved_at": time.time(),
+                "dailies": dict(self.dailies),
+                "settings": dict(self.settings),
+                "activities": dict(self.activities),
+            }
+
+    def restore(self, snapshot, max_age=None):
+        """Load a snapshot, dropping entries saved more than `max_age` seconds ago."""
+        if snapshot.get("version") != VERSION:
+            return False
+        cutoff = time.time() - max_age if max_age else 0
+
+        def fresh(entries):
+            return {athlete: entry for athlete, entry in entries.items() if entry["saved_at"] >= cutoff}
+
+        activities = {athlete: {"saved_at": entry["saved_at"],
+                                "data": [ActivitySummary.from_metrics(summary) for summary in entry["data"]]}
+                      for athlete, entry in fresh(snapshot.get("activities", {})).items()}
+        with self.lock:
+            self.dailies.update(fresh(snapshot.get("dailies", {})))
+            self.settings.update(fresh(snapshot.get("settings", {})))
+            self.activities.update(activities)
+        return True
+
+    def save(self, path):
+        data = gzip.compress(dumps(self.snapshot()), compresslevel=6)
+        # Unique per writer, so replicas sharing the volume never write the same temp file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return len(data)
+
+    def load(self, path, max_age=None):
+        if not os.path.isfile(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                snapshot = orjson.loads(gzip.decompress(f.read()))
+        except (OSError, EOFError, orjson.JSONDecodeError) as e:
+            print(f"Ignoring unreadable warm cache {path}: {e}")
+            return False
+        return self.restore(snapshot, max_age)
+
+
+warm_cache = WarmCache()
+
+
+def get_path():
+    """WARM_CACHE_PATH, or warm-cache.json.gz in GARTH_FOLDER. None disables snapshots."""
+    path = os.environ.get("WARM_CACHE_PATH")
+    if path:
+        return path
+    folder = os.environ.get("GARTH_FOLDER")
+    return os.path.join(folder, "warm-cache.json.gz") if folder else None
+
+
+class Snapshotter:
+    """Saves the warm cache every `interval` seconds on a background thread.
+
+    With `should_save`, a save is skipped while it returns False, so only the
+    leader of several replicas sharing the file writes it.
+    """
+
+    def __init__(self, cache, path, interval=None, should_save=None):
+        self.cache = cache
+        self.path = path
+        self.should_save = should_save
+        self.interval = interval or float(os.environ.get("WARM_CACHE_INTERVAL", 300))
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="warm-cache", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.save()
+
+    def save(self):
+        if self.should_save is not None and not self.should_save():
+            return
+        try:
+            self.cache.save(self.path)
+        except OSError as e:
+            print(f"Caught exception {e} saving warm cache to {self.path}")
+
+    def stop(self):
+        self.stopped.set()
+        self.save()
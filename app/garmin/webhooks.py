@@ -0,0 +1,80 @@
+import hmac
+import os
+import threading
+
+# intervals.icu event types that mean an activity should be (re)parsed or dropped
+PARSE_EVENTS = ("ACTIVITY_UPLOADED", "ACTIVITY_ANALYZED", "ACTIVITY_UPDATED")
+DELETE_EVENTS = ("ACTIVITY_DELETED",)
+PARSE = "parse"
+DELETE = "delete"
+
+
+def get_secret():
+    """INTERVALS_WEBHOOK_SECRET, the webhook endpoint is disabled without it."""
+    return os.environ.get("INTERVALS_WEBHOOK_SECRET") or None
+
+
+def check_secret(expected, payload, headers):
+    """intervals.icu sends the secret in the body, other senders can use an X-Webhook-Secret header."""
+    provided = payload.get("secret") if isinstance(payload, dict) else None
+    provided = provided or headers.get("X-Webhook-Secret") or ""
+    return hmac.compare_digest(str(provided).encode("utf8"), expected.encode("utf8"))
+
+
+def event_activity_id(event):
+    activity = event.get("activity")
+    if isinstance(activity, dict) and activity.get("id"):
+        return str(activity["id"])
+    if event.get("activity_id"):
+        return str(event["activity_id"])
+    return None
+
+
+def activity_events(payload):
+    """[(activity_id, action)] for the activity events in a webhook payload.
+
+    Other event types are ignored. An activity mentioned more than once
+    gets one entry, with the action of its last event.
+    """
+    actions = {}
+    for event in payload.get("events") or []:
+        if not isinstance(event, dict):
+            continue
+        event_type = event.get("type")
+        if event_type in PARSE_EVENTS:
+            action = PARSE
+        elif event_type in DELETE_EVENTS:
+            action = DELETE
+        else:
+            continue
+        activity_id = event_activity_id(event)
+        if activity_id is None:
+            print(f"Ignoring {event_type} webhook event without an activity id")
+            continue
+        actions.pop(activity_id, None)
+        actions[activity_id] = action
+    return list(actions.items())
+
+
+class PendingActivities:
+    """Activities queued for ingestion but not yet started.
+
+    intervals.icu sends several events per upload (uploaded, analyzed,
+    updated), so an activity already waiting in the queue isn't queued again.
+    Once its job starts, a new event queues it afresh.
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self.lock = threading.Lock()
+
+    def add(self, key):
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            return True
+
+    def discard(self, key):
+        with self.lock:
+            self.keys.discard(key)
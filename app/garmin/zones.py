@@ -0,0 +1,77 @@
+import numpy as np
+
+# Power zone lower bounds as fractions of FTP, used when the athlete has no power zones set
+DEFAULT_POWER_ZONES = [0, 0.55, 0.75, 0.90, 1.05, 1.20]
+
+
+class ZoneSet:
+    """Zones for one stream, as ascending lower bounds in the stream's units.
+
+    A sample falls in the last zone whose lower bound it reaches, so zone i
+    covers [edges[i], edges[i+1]). Samples below the first bound or NaN
+    aren't counted.
+    """
+
+    def __init__(self, edges, labels=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.labels = labels or [f"Z{i + 1}" for i in range(len(self.edges))]
+
+    @classmethod
+    def from_upper_bounds(cls, bounds, scale=1.0):
+        """Zones given the way intervals.icu stores them: each zone's upper bound."""
+        edges = [0.0] + [float(bound) * scale for bound in bounds[:-1]]
+        return cls(edges)
+
+    def histogram(self, values, weights):
+        """Total weight (time) in each zone, in one bincount pass."""
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        index = np.searchsorted(self.edges, values, side="right") - 1
+        valid = (index >= 0) & ~np.isnan(values)
+        times = np.bincount(index[valid], weights=weights[valid], minlength=len(self.edges))
+        return {label: float(t) for label, t in zip(self.labels, times)}
+
+    def zone_of(self, value):
+        index = int(np.searchsorted(self.edges, value, side="right")) - 1
+        return self.labels[index] if index >= 0 else None
+
+
+class ZoneModel:
+    """Power, heart rate and pace zones for one sport, from intervals.icu sport settings."""
+
+    def __init__(self, power=None, hr=None, pace=None, lthr=None):
+        self.power = power
+        self.hr = hr
+        self.pace = pace
+        self.lthr = lthr
+
+    @classmethod
+    def from_sport_setting(cls, sport_setting, ftp=None):
+        ftp = sport_setting.get("ftp") or ftp
+        power = None
+        if sport_setting.get("power_zones") and ftp:
+            power = ZoneSet.from_upper_bounds(sport_setting["power_zones"], ftp / 100.0)
+        hr = None
+        if sport_setting.get("hr_zones"):
+            hr = ZoneSet.from_upper_bounds(sport_setting["hr_zones"])
+        pace = None
+        threshold_pace = sport_setting.get("threshold_pace")
+        if sport_setting.get("pace_zones") and threshold_pace:
+            # Pace zones are percentages of threshold speed (m/s), faster is higher
+            pace = ZoneSet.from_upper_bounds(sport_setting["pace_zones"], threshold_pace / 100.0)
+        return cls(power=power, hr=hr, pace=pace, lthr=sport_setting.get("lthr"))
+
+    def power_zones(self, ftp):
+        if self.power is not None:
+            return self.power
+        return ZoneSet([edge * ftp for edge in DEFAULT_POWER_ZONES])
+
+
+def from_sport_settings(sport_settings, ftp=None):
+    """Map each activity type to its ZoneModel."""
+    models = {}
+    for sport_setting in sport_settings or []:
+        model = ZoneModel.from_sport_setting(sport_setting, ftp)
+        for activity_type in sport_setting.get("types") or []:
+            models.setdefault(activity_type, model)
+    return models
@@ -1,5 +1,7 @@
 from flask import Flask
+from flask import abort
 from flask import request
+from flask import Response
 
 from garmin.connector import Connector
 from waitress import serve
@@ -9,10 +11,31 @@ from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
 from garmin.metrics import Metrics
 from garmin.scrape import Scrape
-from garmin.tsdb import TsdbGenerator
+import garmin.tsdb as tsdb
 from garmin.intervals import Intervals
-import garmin.utils as utils
+import garmin.athletes as athletes
+from garmin.cluster import Cluster, Scheduler
+from garmin.response_cache import ResponseCache
+from garmin.activity_metrics import ActivityCollector
+from garmin.store import ActivityStore, BackfillManifest
+from garmin.backfill import BackfillPlanner, get_coverage
+from garmin.jobs import JobQueue, QueueFull, DONE, FAILED, CANCELLED
+import garmin.activity as activity
+import garmin.profiling as profiling
+import garmin.downsample as downsample
+import garmin.ratelimit as ratelimit
+from garmin.streams import StreamCache
+import garmin.warmcache as warmcache
+import garmin.webhooks as webhooks
+import garmin.activity_query as activity_query
+import asyncio
+import atexit
+import datetime
 import json
+import os
+import signal
+import sys
+import time
 
 app = Flask(__name__)
 app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
@@ -23,58 +46,421 @@ prometheus_client.REGISTRY.unregister(prometheus_client.GC_COLLECTOR)
 prometheus_client.REGISTRY.unregister(prometheus_client.PLATFORM_COLLECTOR)
 prometheus_client.REGISTRY.unregister(prometheus_client.PROCESS_COLLECTOR)
 metrics = Metrics()
-@app.route('/daily')
-def get_dailies():
-    scrape = Scrape()
+response_cache = ResponseCache()
+activity_collector = ActivityCollector()
+job_queue = JobQueue()
+downsample_cache = downsample.DownsampleCache()
+webhook_pending = webhooks.PendingActivities()
+scheduler = None
+# /intervals/activities requests for more weeks than this run as background jobs
+JOB_INLINE_WEEKS = int(os.environ.get("JOB_INLINE_WEEKS", 6))
+
+@app.before_request
+def begin_request_context():
+    profiling.begin(request.path)
+    if request.args.get('id'):
+        profiling.tag_activity(request.args.get('id'))
+
+@app.teardown_request
+def end_request_context(exc):
+    profiling.end()
+
+def get_request_athlete():
+    name = request.args.get('athlete')
+    try:
+        return athletes.get_athlete(name)
+    except KeyError:
+        abort(404, f"Unknown athlete {name}")
+
+def scrape_dailies(athlete):
+    scrape = Scrape(athlete)
     dailies = scrape.get_daily_data()
     scrape.check_last_sync(dailies)
-    metrics.populate_metrics(dailies)
+    metrics.populate_metrics(dailies, athlete.name)
+    warmcache.warm_cache.put_daily(athlete.name, dailies)
     return dailies
 
+@app.route('/daily')
+def get_dailies():
+    pool = athletes.get_pool()
+    if request.args.get('athlete') is None and athletes.is_multi_athlete():
+        return pool.run_all(athletes.get_athletes(), scrape_dailies)
+    return pool.submit(get_request_athlete(), scrape_dailies).result()
+
+
+@app.route('/athletes')
+def list_athletes():
+    return json.dumps([athlete.name for athlete in athletes.get_athletes()])
+
+
+def submit_job(name, fn, *args):
+    try:
+        job = job_queue.submit(name, fn, *args)
+    except QueueFull as e:
+        abort(429, str(e))
+    body = dict(job.to_dict(), status_url=f"/jobs/{job.id}", result_url=f"/jobs/{job.id}/result")
+    return json.dumps(body), 202, {"Content-Type": "application/json", "Location": f"/jobs/{job.id}"}
+
+
+def run_backfill(athlete, days, force):
+    scrape = Scrape(athlete)
+    generator = tsdb.TsdbGenerator(tsdb.get_folder(), athlete.name)
+    if not athlete.garth_folder:
+        backfill = scrape.get_historical_data(days)
+        generator.create_backfill(backfill)
+        response_cache.purge('/garmin/history')
+        return f"Successfully found records for {len(backfill)} days"
+    dates = scrape.get_backfill_dates(days)
+    planner = BackfillPlanner(BackfillManifest(athlete.garth_folder), get_coverage(), athlete=athlete.name)
+    plan = planner.run(scrape, generator, dates, force=force)
+    if plan:
+        response_cache.purge('/garmin/history')
+    return f"Successfully found records for {len(plan)} days, {len(dates) - len(plan)} already backfilled"
+
 
 @app.route('/garmin/backfill')
 def generate_backfill():
-    scrape = Scrape()
-    tsdb = TsdbGenerator()
-    days = request.args.get('days', default=1)
-    backfill = scrape.get_historical_data(int(days))
-    tsdb.create_backfill(backfill)
-    return f"Successfully found records for {len(backfill)} days"
+    athlete = get_request_athlete()
+    days = int(request.args.get('days', default=1))
+    force = request.args.get('force', '').lower() in ('1', 'true', 'yes')
+    return submit_job("backfill", run_backfill, athlete, days, force)
+
+
+@app.route('/garmin/history')
+@response_cache.cached
+def get_history():
+    scrape = Scrape(get_request_athlete())
+    today = datetime.date.today()
+    end = request.args.get('to', default=today.strftime('%Y-%m-%d'))
+    start = request.args.get('from', default=(today - datetime.timedelta(days=7)).strftime('%Y-%m-%d'))
+    history = scrape.get_stored_history(start, end)
+    return json.dumps(history)
 
 
 @app.route('/intervals/activity')
+@response_cache.cached
 def get_activity_stream():
-    intervals = Intervals()
+    intervals = Intervals(get_request_athlete())
     activity_id = request.args.get('id')
-    file_path, metadata = intervals.get_activity_streams(activity_id)
-    metrics = intervals.parse_activity(file_path, metadata)
-    resp = json.dumps(metrics, indent=4, default=utils.convert)
-    return resp
+    summary = intervals.parse_activity_by_id(activity_id)
+    refresh_activity_metrics_if_leading(intervals.athlete)
+    return activity.dumps(summary, indent=True), {"Content-Type": "application/json"}
+
+@app.route('/intervals/activity/stream')
+def get_downsampled_stream():
+    athlete = get_request_athlete()
+    activity_id = request.args.get('id')
+    if not activity_id:
+        abort(400, "id is required")
+    channels = request.args.get('channels', default='watts,heartrate').split(',')
+    try:
+        points = int(request.args.get('points', default=1000))
+    except ValueError:
+        abort(400, "points must be an integer")
+    if not 3 <= points <= 10000:
+        abort(400, "points must be between 3 and 10000")
+    method = request.args.get('method', default='lttb')
+    if method not in downsample.METHODS:
+        abort(400, f"Unknown method {method}, expected one of {', '.join(downsample.METHODS)}")
+    result = {}
+    activity_streams = None
+    for channel in channels:
+        key = (athlete.name, activity_id, channel, points, method)
+        series = downsample_cache.get(key)
+        if series is None:
+            if activity_streams is None:
+                cache = StreamCache(athlete.garth_folder) if athlete.garth_folder else None
+                activity_streams = cache.load(activity_id) if cache is not None else None
+                if activity_streams is None:
+                    activity_streams = Intervals(athlete).get_stream_arrays(activity_id)
+            if channel not in downsample.available_channels(activity_streams):
+                continue
+            series = downsample.downsample(activity_streams, channel, points, method)
+            downsample_cache.put(key, series)
+        times, values = series
+        result[channel] = {"time": times, "values": values}
+    body = {"id": activity_id, "points": points, "method": method, "channels": result}
+    return activity.dumps(body), {"Content-Type": "application/json"}
+
+def parse_recent_activities(athlete, weeks):
+    intervals = Intervals(athlete)
+    activities = intervals.get_activities_in_last_x_weeks(weeks)
+    ids, duplicates = intervals.get_activity_ids(activities)
+    intervals.delete_duplicates(duplicates)
+    summaries = [summary for summary in intervals.get_parsed_activities(ids)
+                 if summary.get("type") != "Walk"]
+    refresh_activity_metrics_if_leading(athlete)
+    return activity.dumps(summaries), {"Content-Type": "application/json"}
 
 @app.route('/intervals/activities')
+@response_cache.cached
 def get_activities():
-    weeks =  request.args.get('weeks', default="6")
-    intervals = Intervals()
-    activities = intervals.get_activities_in_last_x_weeks(int(weeks))
-    ids = intervals.get_activity_ids(activities)
-    all_metrics = []
-    for activity_id in ids:
-        try:
-            file_path, metadata = intervals.get_activity_streams(activity_id)
-            if metadata["type"] == "Walk":
-                continue
-            activity_metrics = intervals.parse_activity(file_path, metadata)
-            all_metrics.append(activity_metrics)
-        except Exception as e:
-            print(f"Caught exception {e} loading activity {activity_id}, skipping")
-    result = json.dumps(all_metrics)
-    return result
+    weeks = int(request.args.get('weeks', default="6"))
+    athlete = get_request_athlete()
+    if weeks > JOB_INLINE_WEEKS or request.args.get('async'):
+        return submit_job("activities", parse_recent_activities, athlete, weeks)
+    return parse_recent_activities(athlete, weeks)
+
+async def parse_recent_activities_async(athlete, weeks):
+    # Settings come from the warm cache, so building this rarely makes a request
+    intervals = await asyncio.to_thread(Intervals, athlete)
+    activities = await intervals.get_activities_in_last_x_weeks_async(weeks)
+    ids, duplicates = await asyncio.to_thread(intervals.get_activity_ids, activities)
+    await asyncio.to_thread(intervals.delete_duplicates, duplicates)
+    summaries = [summary for summary in await intervals.get_parsed_activities_async(ids)
+                 if summary.get("type") != "Walk"]
+    await asyncio.to_thread(refresh_activity_metrics_if_leading, athlete)
+    return activity.dumps(summaries), {"Content-Type": "application/json"}
+
+async def get_activities_native(req):
+    # SERVER_MODE=asgi serves inline /intervals/activities on the event loop, awaiting intervals.icu
+    weeks = int(req.get('weeks', default="6"))
+    if weeks > JOB_INLINE_WEEKS or req.get('async'):
+        return None
+    try:
+        athlete = athletes.get_athlete(req.get('athlete'))
+    except KeyError:
+        return None
+    key = response_cache.make_key(req.path, req.pairs)
+    return await response_cache.get_or_compute_async(key, lambda: parse_recent_activities_async(athlete, weeks))
    
+@app.route('/intervals/query')
+def query_activities():
+    athlete = get_request_athlete()
+    if not athlete.garth_folder:
+        abort(404, f"No activity store for athlete {athlete.name}")
+    try:
+        result = activity_query.run_query(ActivityStore(athlete.garth_folder), request.args)
+    except ValueError as e:
+        abort(400, str(e))
+    return activity.dumps(result), {"Content-Type": "application/json"}
+
+def ingest_activity(athlete, activity_id, action):
+    # A new event for this activity queues another job from here on
+    webhook_pending.discard((athlete.name, activity_id, action))
+    if action == webhooks.DELETE:
+        if athlete.garth_folder:
+            ActivityStore(athlete.garth_folder).delete(activity_id)
+        result = f"Deleted activity {activity_id}"
+    else:
+        intervals = Intervals(athlete)
+        kept_id = intervals.kept_recording(activity_id)
+        if kept_id != activity_id:
+            # Another device's recording of the session is kept, parse it if it isn't stored yet
+            intervals.delete_duplicates([activity_id])
+            intervals.get_parsed_activities([kept_id])
+            result = f"Skipped activity {activity_id}, a duplicate recording of {kept_id}"
+        else:
+            parsed = intervals.parse_activities_by_id([activity_id])
+            if activity_id not in parsed:
+                raise RuntimeError(f"Could not parse activity {activity_id}")
+            result = f"Parsed activity {activity_id}"
+    response_cache.purge('/intervals/activity')
+    refresh_activity_metrics_if_leading(athlete)
+    return result
+
+@app.route('/intervals/webhook', methods=['POST'])
+def intervals_webhook():
+    secret = webhooks.get_secret()
+    if secret is None:
+        abort(404)
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        abort(400, "Expected a JSON object")
+    if not webhooks.check_secret(secret, payload, request.headers):
+        abort(403)
+    athlete = get_request_athlete()
+    queued = []
+    for activity_id, action in webhooks.activity_events(payload):
+        key = (athlete.name, activity_id, action)
+        if not webhook_pending.add(key):
+            continue
+        try:
+            job = job_queue.submit_express("webhook", ingest_activity, athlete, activity_id, action)
+        except QueueFull as e:
+            webhook_pending.discard(key)
+            abort(429, str(e))
+        queued.append(dict(job.to_dict(), activity_id=activity_id, action=action))
+    return json.dumps({"queued": queued}), 202, {"Content-Type": "application/json"}
+
+@app.route('/jobs')
+def list_jobs():
+    return json.dumps([job.to_dict() for job in job_queue.list()]), {"Content-Type": "application/json"}
+
+def get_job_or_404(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404, f"Unknown job {job_id}")
+    return job
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    return json.dumps(get_job_or_404(job_id).to_dict()), {"Content-Type": "application/json"}
+
+@app.route('/jobs/<job_id>/result')
+def get_job_result(job_id):
+    job = get_job_or_404(job_id)
+    if job.status == DONE:
+        return job.result
+    if job.status == FAILED:
+        abort(500, job.error)
+    if job.status == CANCELLED:
+        abort(410, f"Job {job_id} was cancelled")
+    return json.dumps(job.to_dict()), 202, {"Content-Type": "application/json"}
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    get_job_or_404(job_id)
+    return json.dumps(job_queue.cancel(job_id).to_dict()), {"Content-Type": "application/json"}
+
+def require_profiling():
+    if not profiling.enabled():
+        abort(404)
+
+@app.route('/admin/profile/requests', methods=['GET', 'POST'])
+def profile_requests():
+    require_profiling()
+    if request.method == 'POST':
+        profiling.profiler.arm(int(request.args.get('count', default=1)), request.args.get('route'))
+    return json.dumps(profiling.profiler.status()), {"Content-Type": "application/json"}
+
+@app.route('/admin/profile/requests/<int:profile_id>')
+def get_request_profile(profile_id):
+    require_profiling()
+    record = profiling.profiler.get(profile_id)
+    if record is None:
+        abort(404, f"Unknown profile {profile_id}")
+    header = f"# {record['route']} activities={','.join(record['activity_ids'])} seconds={record['seconds']}\n"
+    return Response(header + record['pstats'], mimetype='text/plain')
+
+@app.route('/admin/profile/sample')
+def sample_profile():
+    require_profiling()
+    seconds = min(float(request.args.get('seconds', default=10)), 120)
+    interval = float(request.args.get('interval', default=0.01))
+    return Response(profiling.sample_stacks(seconds, interval), mimetype='text/plain')
+
+@app.route('/admin/cache/purge', methods=['POST'])
+def purge_response_cache():
+    require_profiling()
+    purged = response_cache.purge(request.args.get('prefix'))
+    return f"Purged {purged} cached responses"
+
 def register_prom_metrics():
     metrics.collect()
+    prometheus_client.REGISTRY.register(activity_collector)
+    prometheus_client.REGISTRY.register(ratelimit.LimiterCollector())
+
+def refresh_activity_metrics(athlete):
+    # Reads the shared activity store, so the leader exports every replica's parses
+    if not athlete.garth_folder:
+        return
+    start = activity_collector.window_start().strftime('%Y-%m-%d')
+    end = datetime.date.today().strftime('%Y-%m-%d')
+    summaries = ActivityStore(athlete.garth_folder).get_range(start, end)
+    activity_collector.refresh(athlete.name, summaries)
+    warmcache.warm_cache.put_activities(athlete.name, summaries)
+
+def leading():
+    return scheduler is None or scheduler.leading
+
+def refresh_activity_metrics_if_leading(athlete):
+    # Only the leader exports activity metrics, the others leave it to its next scheduled refresh
+    if leading():
+        refresh_activity_metrics(athlete)
+
+def refresh_all_activity_metrics():
+    for athlete in athletes.get_athletes():
+        refresh_activity_metrics(athlete)
+
+def seed_rolling_metrics():
+    start = (datetime.date.today() - datetime.timedelta(days=max(metrics.rolling_windows))).strftime('%Y-%m-%d')
+    end = datetime.date.today().strftime('%Y-%m-%d')
+    for athlete in athletes.get_athletes():
+        history = Scrape(athlete).get_stored_history(start, end)
+        metrics.seed_rolling(history, athlete.name)
+
+def restore_warm_cache():
+    # Runs after seed_rolling_metrics, a restored daily is newer than anything it replays
+    path = warmcache.get_path()
+    if path is None:
+        return None
+    cache = warmcache.warm_cache
+    if cache.load(path, max_age=float(os.environ.get("WARM_CACHE_MAX_AGE", 86400))):
+        # With a scheduler, leadership isn't known yet: the leader publishes gauges on its first tick,
+        # and the others must never export them, so only the athlete settings are used
+        if not int(os.environ.get("SCHEDULER_INTERVAL", 0)):
+            for name, entry in cache.dailies.items():
+                metrics.populate_metrics(entry["data"], name)
+            for name, entry in cache.activities.items():
+                activity_collector.refresh(name, entry["data"])
+        print(f"Restored warm cache for {len(cache.dailies)} dailies, {len(cache.settings)} athlete settings "
+              f"and {len(cache.activities)} activity lists from {path}")
+    # Replicas share the file, and only the leader's cache holds the exported state
+    snapshotter = warmcache.Snapshotter(cache, path, should_save=leading)
+    snapshotter.start()
+    atexit.register(snapshotter.stop)
+    return snapshotter
+
+def scrape_all_dailies():
+    athletes.get_pool().run_all(athletes.get_athletes(), scrape_dailies)
+
+def sync_owned_activities(athlete, cluster, weeks):
+    with ratelimit.priority(ratelimit.BULK):
+        intervals = Intervals(athlete)
+        activities = intervals.get_activities_in_last_x_weeks(weeks)
+        ids, duplicates = intervals.get_activity_ids(activities)
+        ids = cluster.shard(ids)
+        parsed = intervals.sync_activities(ids, cluster.shard(list(duplicates)))
+    print(f"{cluster.worker_id} parsed {parsed} of {len(ids)} owned activities for {athlete.name}")
+    return parsed
+
+def start_scheduler():
+    interval = int(os.environ.get("SCHEDULER_INTERVAL", 0))
+    if not interval:
+        return None
+    weeks = int(os.environ.get("SCHEDULER_ACTIVITY_WEEKS", 2))
+    # With webhooks delivering new activities, listing them is only a safety net
+    poll_interval = float(os.environ.get("ACTIVITY_POLL_INTERVAL", 21600 if webhooks.get_secret() else interval))
+    last_poll = [None]
+    folder = os.environ.get("CLUSTER_FOLDER") or os.path.join(os.environ.get("GARTH_FOLDER"), "cluster")
+    cluster = Cluster(folder, ttl=max(60, 3 * interval))
+
+    def sync_all_activities():
+        now = time.monotonic()
+        if last_poll[0] is None or now - last_poll[0] >= poll_interval:
+            last_poll[0] = now
+            # Not on the athlete pool: holding an athlete's limiter for a whole sync
+            # would queue their /daily scrapes behind it, and the BULK priority
+            # already paces these requests against intervals.icu
+            for athlete in athletes.get_athletes():
+                try:
+                    sync_owned_activities(athlete, cluster, weeks)
+                except Exception as e:
+                    print(f"Caught exception {e} syncing activities for {athlete.name}")
+        # Only the leader exports activity metrics, so replicas don't publish duplicate series
+        if scheduler.leading:
+            refresh_all_activity_metrics()
+        else:
+            activity_collector.clear()
+
+    scheduler = Scheduler(cluster, interval, leader_jobs=[scrape_all_dailies], worker_jobs=[sync_all_activities])
+    scheduler.start()
+    return scheduler
 
 if __name__ == "__main__":
     register_prom_metrics()
-    connector = Connector()
+    seed_rolling_metrics()
+    restore_warm_cache()
+    refresh_all_activity_metrics()
+    for athlete in athletes.get_athletes():
+        connector = Connector(athlete)
+    scheduler = start_scheduler()
 
-    serve(app, host="0.0.0.0", port=8080)
+    if os.environ.get("SERVER_MODE") == "asgi":
+        import garmin.asgi as asgi
+        asgi.serve(app, host="0.0.0.0", port=8080, routes={'/intervals/activities': get_activities_native})
+    else:
+        # Exit cleanly on SIGTERM so the warm cache is saved on a rolling update
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        serve(app, host="0.0.0.0", port=8080)